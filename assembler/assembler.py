@@ -1,5 +1,11 @@
+import os
+import re
+from array import array
+
 from simulator import specifications as specs
-from simulator.utilities import bitmask, to_int
+from simulator.image import map_image
+from simulator.sourcemap import SourceMap
+from simulator.utilities import bitmask
 
 class Tokens:
     COMMENT = ";"
@@ -8,63 +14,321 @@ class Tokens:
     VALUE_REF_OPEN = "["
     VALUE_REF_CLOSE = "]"
     ADD = "+"
+    STRING = '"'
+
+class Directives:
+    DATA = "DAT"
+    INCLUDE_BINARY = ".incbin"
+
+# Optional label, operation and up to two operands, anything after is ignored
+LINE_PATTERN = re.compile(r'\s*(?:%s(\S*)\s+)?(\S+)(?:\s+(\S+))?(?:\s+(\S+))?' % Tokens.LABEL)
+
+# A number, label or quoted string followed by a separator, a comment or the end of the line
+DATA_ITEM_PATTERN = re.compile(r'\s*("(?:[^"\\]|\\.)*"|[^\s,;"]+)\s*(?:,|(?=;)|$)')
+
+DECIMAL_PATTERN = re.compile(r'[+-]?\d+$')
+HEX_PATTERN = re.compile(r'[+-]?(0[xX])?[0-9a-fA-F]+$')
+
+MAX_WORD = bitmask(specs.WORD_SIZE)
+MAX_SHORT_LITERAL = 0x1f
+
+def get_operations():
+    operations = {}
+
+    for (operations_class, is_basic) in [(specs.BasicOperations, True), (specs.NonBasicOperations, False)]:
+        for (name, op_code) in vars(operations_class).iteritems():
+            if not name.startswith('_'):
+                operations[name] = (op_code, is_basic)
+
+    return operations
+
+def get_value_codes():
+    '''
+    Maps every operand that can be looked up directly to its value code
+    '''
+
+    value_codes = dict(specs.REGISTER_NAMES)
+    value_codes.update(specs.SPECIAL_REGISTER_NAMES)
+    value_codes.update(specs.STACK_CODE_NAMES)
+
+    for (name, code) in specs.REGISTER_NAMES.iteritems():
+        value_codes[Tokens.VALUE_REF_OPEN + name + Tokens.VALUE_REF_CLOSE] = code + 0x08
+
+    return value_codes
+
+# Lookup tables built once, the specifications module is never modified
+OPERATIONS = get_operations()
+REGISTER_CODES = dict(specs.REGISTER_NAMES)
+SPECIAL_VALUE_CODES = dict(specs.SPECIAL_REGISTER_NAMES, **specs.STACK_CODE_NAMES)
+VALUE_CODES = get_value_codes()
+
+def assemble(program, relax=False, path=None):
+    return assemble_with_symbols(program, relax, path)[0]
+
+def assemble_with_symbols(program, relax=False, path=None):
+    '''
+    Assembles the given program, returning the machine code as hex strings
+    along with a dictionary mapping each label to its address
+    '''
+
+    (words, labels) = assemble_words(program, relax, path)
+    return ([hex(word) for word in words], labels)
+
+def assemble_binary(program, relax=False, path=None):
+    '''
+    Assembles the given program into an array of 16-bit words
+    '''
+
+    words = assemble_words(program, relax, path)[0]
+
+    if len(words) > specs.MAX_RAM_ADDRESS + 1:
+        raise ProgramTooLarge(len(words))
+
+    return array('H', words)
+
+def assemble_words(program, relax=False, path=None):
+    '''
+    Assembles the given program, returning the machine code as a list of
+    integers along with a dictionary mapping each label to its address
+
+    With relax, label literals are encoded as short literals wherever
+    the label's address allows it. path is the file the program was read
+    from, binary files it includes are looked up next to it
+    '''
+
+    instructions = read_instructions(program, path)
+
+    if relax:
+        labels = relax_instructions(instructions)[0]
+    else:
+        labels = get_labels(instructions)
+
+    return (get_words(instructions, labels), labels)
+
+def assemble_with_source_map(program, path=None, relax=False):
+    '''
+    Assembles the given program, returning the machine code as a list of
+    integers along with a SourceMap from addresses to the lines of path
+    '''
+
+    instructions = read_instructions(program, path)
+
+    if relax:
+        labels = relax_instructions(instructions)[0]
+    else:
+        labels = get_labels(instructions)
+
+    return (get_words(instructions, labels), get_source_map(instructions, labels, path))
+
+def read_instructions(program, path=None):
+    '''
+    Parses the lines of program, read from path if given, into
+    instructions, each recording its line number
+    '''
 
-def assemble(program):
-    current_address = 0x0
     instructions = []
-    labels = {}
 
-    # Generate list of instructions
-    for line in program:
-        try:
-            instruction = parse_line(line)
-        except Exception, e:
-            raise AssemblerSyntaxError(line, e.message)
+    for (number, line) in enumerate(program, 1):
+        instruction = read_line(line, path)
 
-        if instruction is None:
-            continue
+        if instruction is not None:
+            instruction.line = number
+            instructions.append(instruction)
+
+    return instructions
+
+def get_words(instructions, labels):
+    words = []
+
+    for instruction in instructions:
+        words.extend(instruction.get_words(labels))
+
+    return words
+
+def get_source_map(instructions, labels, path=None):
+    '''
+    Returns a SourceMap of the instructions from read_instructions
+    '''
+
+    source_map = SourceMap()
+    current_address = 0x0
+
+    for instruction in instructions:
+        if instruction.word_length:
+            source_map.add_line(current_address, path, instruction.line)
+
+        current_address += instruction.word_length
+
+    source_map.size = current_address
+    source_map.set_labels(labels)
+
+    return source_map
+
+def get_labels(instructions):
+    '''
+    Returns the address of each label defined by the instructions
+    '''
+
+    current_address = 0x0
+    labels = {}
 
+    for instruction in instructions:
         if instruction.label:
             labels[instruction.label] = current_address
 
         current_address += instruction.word_length
 
-        instructions.append(instruction)
+    return labels
+
+def relax_instructions(instructions):
+    '''
+    Shortens label literals to short literals until no more fit
+
+    Shortening an instruction only moves the labels after it to lower
+    addresses, so each pass can only shorten more operands and the
+    passes stop at a fixed point. Returns the label addresses and the
+    number of operands shortened, each saving a word and a cycle
+    whenever its instruction is executed.
+    '''
+
+    shortened = 0
+
+    while True:
+        labels = get_labels(instructions)
+        removed = sum(instruction.shorten_labels(labels) for instruction in instructions)
+
+        if not removed:
+            return (labels, shortened)
+
+        shortened += removed
+
+def get_line_addresses(program):
+    '''
+    Returns the address each line of the program is assembled to,
+    None for lines that don't produce an instruction
+    '''
+
+    current_address = 0x0
+    addresses = []
+
+    for line in program:
+        instruction = read_line(line)
+
+        if instruction is None:
+            addresses.append(None)
+        else:
+            addresses.append(current_address)
+            current_address += instruction.word_length
+
+    return addresses
+
+def read_line(line, path=None):
+    '''
+    Parses a line of a program, reporting any problem as a syntax error on that line
+    '''
 
-    return [word for ins in instructions for word in ins.get_hex(labels)]
+    try:
+        return parse_line(line, path)
+    except Exception, e:
+        raise AssemblerSyntaxError(line, e.message)
 
-def parse_line(line):
-    tokens = line.strip().split()
-    tokens.reverse()
+def parse_line(line, path=None):
+    match = LINE_PATTERN.match(line)
 
-    if not tokens:
+    if match is None:
         return None
 
-    token = tokens.pop()
-    if is_comment(token):
+    (label, op, a, b) = match.groups()
+
+    if label is None and is_comment(op):
         return None
-    else:
-        tokens.append(token)
 
-    token = tokens.pop()
-    label = parse_label(token)
-    if not label:
-        tokens.append(token)
+    if op in DIRECTIVES:
+        return DIRECTIVES[op](line[match.end(2):], label or None, path)
+
+    (op_code, is_basic) = parse_op(op)
 
-    (op_code, is_basic) = parse_op(tokens.pop())
-    (value_code_a, word_a) = parse_value_code(tokens.pop(), is_basic)
-    (value_code_b, word_b) = parse_value_code(tokens.pop()) if is_basic else (None, None)
+    if a is None or (is_basic and b is None):
+        raise MissingOperand(op)
 
-    ins = Instruction(op_code, is_basic, value_code_a, value_code_b, label)
+    (value_code_a, word_a) = parse_value_code(a, is_basic)
+    (value_code_b, word_b) = parse_value_code(b) if is_basic else (None, None)
 
-    if word_a:
+    ins = Instruction(op_code, is_basic, value_code_a, value_code_b, label or None)
+
+    if word_a is not None:
         ins.add_word(word_a)
 
-    if word_b:
+    if word_b is not None:
         ins.add_word(word_b)
 
     return ins
 
+def parse_data(operands, label=None, path=None):
+    '''
+    DAT followed by comma separated numbers, label references and
+    quoted strings, each character of a string taking a word
+    '''
+
+    words = []
+    position = 0
+
+    while True:
+        match = DATA_ITEM_PATTERN.match(operands, position)
+
+        if match is None:
+            rest = operands[position:].strip()
+
+            if rest and not is_comment(rest):
+                raise InvalidData(rest)
+
+            break
+
+        item = match.group(1)
+        position = match.end()
+
+        if item.startswith(Tokens.STRING):
+            words.extend(ord(character) for character in item[1:-1].decode('string_escape'))
+            continue
+
+        number = parse_number(item)
+
+        if number is None:
+            words.append(item)
+        elif number < 0x0 or number > MAX_WORD:
+            raise ValueOutOfRange(number)
+        else:
+            words.append(number)
+
+    if not words:
+        raise MissingOperand(Directives.DATA)
+
+    return Data(words, label)
+
+def parse_include_binary(operands, label=None, path=None):
+    '''
+    .incbin followed by the path of a file of big-endian 16-bit words,
+    which are placed in the program as they are
+
+    Relative paths are taken from the directory of path, the file the
+    line was read from, or the working directory if it isn't known
+    '''
+
+    included = operands.split(Tokens.COMMENT)[0].strip().strip(Tokens.STRING)
+
+    if not included:
+        raise MissingOperand(Directives.INCLUDE_BINARY)
+
+    if path is not None:
+        included = os.path.join(os.path.dirname(path), included)
+
+    return Data(map_image(included), label)
+
+DIRECTIVES = {
+    Directives.DATA: parse_data,
+    Directives.INCLUDE_BINARY: parse_include_binary,
+}
+
 def is_comment(token):
     return token.startswith(Tokens.COMMENT)
 
@@ -75,24 +339,30 @@ def parse_label(token):
         return None
 
 def parse_op(token):
-    if token in dir(specs.BasicOperations):
-        return (getattr(specs.BasicOperations, token), True)
-    elif token in dir(specs.NonBasicOperations):
-        return (getattr(specs.NonBasicOperations, token), False)
+    if token in OPERATIONS:
+        return OPERATIONS[token]
     else:
         raise InvalidOperation(token)
 
 def parse_register(token, allow_special_values=True):
-    code_mapping = specs.REGISTER_NAMES
+    if token in REGISTER_CODES:
+        return REGISTER_CODES[token]
+    elif allow_special_values and token in SPECIAL_VALUE_CODES:
+        return SPECIAL_VALUE_CODES[token]
+    else:
+        raise InvalidValueReference(token)
 
-    if allow_special_values:
-        code_mapping.update(specs.SPECIAL_REGISTER_NAMES)
-        code_mapping.update(specs.STACK_CODE_NAMES)
+def parse_number(token):
+    '''
+    Returns the value of a decimal or hexadecimal token, None if it isn't a number
+    '''
 
-    if token in code_mapping:
-        return code_mapping[token]
+    if DECIMAL_PATTERN.match(token):
+        return int(token, 10)
+    elif HEX_PATTERN.match(token):
+        return int(token, 16)
     else:
-        raise InvalidValueReference(token)
+        return None
 
 def parse_value_code(token, is_basic=False):
     '''
@@ -108,58 +378,59 @@ def parse_value_code(token, is_basic=False):
          0x1e: [next word]
          0x1f: next word (literal)
     0x20-0x3f: literal value 0x00-0x1f (literal)
+
+    Next words that aren't numbers are label references
     '''
 
-    word = None
     token = token.strip(Tokens.ARG_SEPARATOR)
 
-    # [register], [next word + register], or [next word]
+    # register, [register]
+    if token in VALUE_CODES:
+        return (VALUE_CODES[token], None)
+
+    # [next word + register] or [next word]
     if token.startswith(Tokens.VALUE_REF_OPEN):
 
-        if token.find(Tokens.VALUE_REF_CLOSE) < 0:
+        close_loc = token.find(Tokens.VALUE_REF_CLOSE)
+        if close_loc < 0:
             raise AssemblerSyntaxError(token, "No closing bracket")
 
-        token = token[token.find(Tokens.VALUE_REF_OPEN)+1:token.find(Tokens.VALUE_REF_CLOSE)]
+        token = token[len(Tokens.VALUE_REF_OPEN):close_loc]
 
         add_loc = token.find(Tokens.ADD)
 
         # [next word + register]
         if add_loc > 0:
-            word = to_int(token[:add_loc], bases_to_try=[10, 16])
-            value_code = parse_register(token[add_loc+1:], allow_special_values=False)
-            value_code += 0x10
+            word = token[:add_loc]
+            value_code = parse_register(token[add_loc+1:], allow_special_values=False) + 0x10
+
+        # [register]
+        elif token in REGISTER_CODES:
+            return (REGISTER_CODES[token] + 0x08, None)
+
+        # [next word]
         else:
-            # [register]
-            try:
-                value_code = parse_register(token, allow_special_values=False)
-                value_code += 0x08
-            # [next word]
-            except:
-                word = to_int(token, bases_to_try=[10, 16])
-                value_code = 0x1e
+            word = token
+            value_code = 0x1e
+
+    # next word (literal)
     else:
-        # register
-        try:
-            value_code = parse_register(token)
-        except:
-            # next word (literal)
-            try:
-                word = to_int(token, bases_to_try=[10, 16])
-
-                if word <= 0x1f:
-                    value_code = word + 0x20
-                    word = None
-                else:
-                    value_code = 0x1f
-            except:
-                # label reference
-                value_code = 0x1f
-                word = token
-
-    if isinstance(word, int) and (word < 0x0 or word > bitmask(specs.WORD_SIZE)):
-        raise ValueOutOfRange(word)
-
-    return (value_code, word)
+        word = token
+        value_code = 0x1f
+
+    number = parse_number(word)
+
+    if number is None:
+        return (value_code, word)
+
+    if number < 0x0 or number > MAX_WORD:
+        raise ValueOutOfRange(number)
+
+    # literal value 0x00-0x1f
+    if value_code == 0x1f and number <= MAX_SHORT_LITERAL:
+        return (number + 0x20, None)
+
+    return (value_code, number)
 
 class ValueOutOfRange(Exception):
     def __init__(self, value):
@@ -182,6 +453,27 @@ class InvalidOperation(Exception):
     def __str__(self):
         return "Unrecognized operation: %s" % self.op
 
+class ProgramTooLarge(Exception):
+    def __init__(self, length):
+        self.length = length
+
+    def __str__(self):
+        return "Program of %d words does not fit in RAM" % self.length
+
+class MissingOperand(Exception):
+    def __init__(self, op):
+        self.op = op
+
+    def __str__(self):
+        return "Missing operand for: %s" % self.op
+
+class InvalidData(Exception):
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return "Invalid data: %s" % self.data
+
 class AssemblerSyntaxError(Exception):
     def __init__(self, line, exception):
         self.line = line
@@ -191,6 +483,8 @@ class AssemblerSyntaxError(Exception):
         return "Syntax error on line:\n\t%s\nError: %s" % (self.line, self.exception)
 
 class Instruction(object):
+    __slots__ = ['op_code', 'is_basic', 'value_code_a', 'value_code_b', 'label', 'additional_words', 'short_labels', 'line']
+
     def __init__(self, op_code, is_basic, value_code_a, value_code_b = None, label = None):
         self.op_code = op_code
         self.is_basic = is_basic
@@ -198,11 +492,14 @@ class Instruction(object):
         self.value_code_b = value_code_b
         self.label = label
         self.additional_words = []
+        self.short_labels = None
+        self.line = None
 
     def add_word(self, word):
         self.additional_words.append(word)
 
-    def get_hex(self, labels=None):
+    @property
+    def code(self):
         '''
         Basic: bbbbbbaaaaaaoooo
         Non-basic: aaaaaaoooooo0000
@@ -212,25 +509,101 @@ class Instruction(object):
         if self.is_basic:
             b = self.value_code_b
 
-            code = ((b << (specs.VALUE_LENGTH + specs.BASIC_OP_CODE_LENGTH))
+            return ((b << (specs.VALUE_LENGTH + specs.BASIC_OP_CODE_LENGTH))
                     + (a << (specs.BASIC_OP_CODE_LENGTH))
                     + (self.op_code))
 
         else:
-            code = ((a << (specs.VALUE_LENGTH + specs.BASIC_OP_CODE_LENGTH))
+            return ((a << (specs.VALUE_LENGTH + specs.BASIC_OP_CODE_LENGTH))
                     + (self.op_code << (specs.BASIC_OP_CODE_LENGTH)))
 
-        return [hex(code)] + [self.get_value(word, labels) for word in self.additional_words]
+    @property
+    def words(self):
+        '''
+        The instruction's words with label references left as label names
+        '''
+
+        return [self.code] + self.additional_words
+
+    def get_words(self, labels=None):
+        return [self.code] + [self.get_value(word, labels) for word in self.additional_words]
+
+    def get_hex(self, labels=None):
+        return [hex(word) for word in self.get_words(labels)]
+
+    def shorten_labels(self, labels):
+        '''
+        Encodes label literals as short literals when the label's address
+        is at most 0x1f, updating those shortened by an earlier call.
+        Returns the number of words removed
+        '''
+
+        short_labels = self.short_labels or {}
+
+        for (operand, label) in short_labels.iteritems():
+            setattr(self, operand, labels[label] + 0x20)
+
+        removed = 0
+        index = 0
+
+        for operand in ('value_code_a', 'value_code_b'):
+            value_code = getattr(self, operand)
+
+            if value_code not in specs.GET_WORD_VALUE_CODES:
+                continue
+
+            word = self.additional_words[index]
+
+            if value_code == 0x1f and word in labels and labels[word] <= MAX_SHORT_LITERAL:
+                setattr(self, operand, labels[word] + 0x20)
+                short_labels[operand] = word
+                del self.additional_words[index]
+                removed += 1
+            else:
+                index += 1
+
+        if removed:
+            self.short_labels = short_labels
+
+        return removed
 
     @property
     def word_length(self):
         return (1 + len(self.additional_words))
 
     def get_value(self, value, labels):
-        try:
-            if not isinstance(value, int):
-                value = labels[value]
+        if isinstance(value, int):
+            return value
 
-            return hex(value)
-        except:
+        if labels is None or value not in labels:
             raise InvalidValueReference(value)
+
+        return labels[value]
+
+class Data(Instruction):
+    '''
+    Words placed in the program as they are, from DAT or .incbin
+    '''
+
+    __slots__ = ['data']
+
+    def __init__(self, data, label=None):
+        Instruction.__init__(self, None, False, None, label=label)
+        self.data = data
+
+    @property
+    def words(self):
+        return self.data
+
+    def get_words(self, labels=None):
+        if isinstance(self.data, array):
+            return self.data
+
+        return [self.get_value(word, labels) for word in self.data]
+
+    def shorten_labels(self, labels):
+        return 0
+
+    @property
+    def word_length(self):
+        return len(self.data)
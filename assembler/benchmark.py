@@ -0,0 +1,266 @@
+import cProfile
+import json
+import multiprocessing
+import os
+import pstats
+import random
+import resource
+import sys
+import time
+
+from simulator import specifications as specs
+from assembler import assemble, OPERATIONS
+
+BENCHMARK_FORMAT_VERSION = 1
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+LABEL_EVERY = 8
+COMMENT_EVERY = 6
+BLANK_EVERY = 20
+DATA_EVERY = 50
+
+OPERATIONS = sorted(name for name in OPERATIONS if name != 'JSR')
+REGISTERS = sorted(specs.REGISTER_NAMES)
+
+# Where the own time of a function of the assembler module goes, functions
+# not listed count as other
+ASSEMBLER_FILE = 'assembler.py'
+
+PROFILE_CATEGORIES = dict(((ASSEMBLER_FILE, function), category) for (function, category) in [
+    ('read_instructions', "line parsing"),
+    ('parse_line', "line parsing"),
+    ('parse_data', "line parsing"),
+    ('parse_op', "table lookups"),
+    ('parse_register', "table lookups"),
+    ('parse_value_code', "table lookups"),
+    ('is_comment', "table lookups"),
+    ('parse_number', "number parsing"),
+    # read_line only calls parse_line, adding the line number to any error
+    ('read_line', "per-line call overhead"),
+    ('__init__', "instruction building"),
+    ('add_word', "instruction building"),
+    ('code', "instruction encoding"),
+    ('word_length', "instruction encoding"),
+    ('get_labels', "label resolution"),
+    ('get_value', "label resolution"),
+    ('get_words', "label resolution"),
+    ('assemble_with_symbols', "string building"),
+])
+
+# Built-in functions count towards the category of the assembler function
+# calling them, apart from these
+BUILTIN_CATEGORIES = {
+    "<method 'match' of '_sre.SRE_Pattern' objects>": "regular expressions",
+    "<method 'groups' of '_sre.SRE_Match' objects>": "regular expressions",
+}
+
+BUILTIN_FILE = '~'
+
+class SourceGenerator(object):
+    '''
+    Generates a synthetic program with a realistic mix of labels, references
+    to labels both before and after them, [next word + register] operands,
+    comments, blank lines and data
+    '''
+
+    def __init__(self, seed=0x10c):
+        self.random = random.Random(seed)
+
+    def get_operand(self, labels, total_labels):
+        choice = self.random.random()
+
+        if choice < 0.35:
+            return self.random.choice(REGISTERS)
+        elif choice < 0.5:
+            return "%#x" % self.random.randint(0x0, 0xffff)
+        elif choice < 0.6:
+            return "%d" % self.random.randint(0, 0x1f)
+        elif choice < 0.75:
+            return "[%#x+%s]" % (self.random.randint(0x0, 0xffff), self.random.choice(REGISTERS))
+        elif choice < 0.8:
+            return "[%s]" % self.random.choice(REGISTERS)
+        else:
+            # Mostly backward references with some forward ones
+            if labels == total_labels or (labels and self.random.random() < 0.7):
+                return "label%d" % self.random.randint(0, labels - 1)
+
+            return "label%d" % self.random.randint(labels, total_labels - 1)
+
+    def generate(self, line_count):
+        '''
+        Generates line_count lines of assembler
+        '''
+
+        total_labels = line_count / LABEL_EVERY + 1
+        labels = 0
+
+        for number in xrange(line_count):
+            if number % BLANK_EVERY == BLANK_EVERY - 1:
+                yield "\n"
+                continue
+
+            if number % COMMENT_EVERY == COMMENT_EVERY - 1:
+                yield "; comment on the code below\n"
+                continue
+
+            prefix = " " * 12
+
+            if number % LABEL_EVERY == 0 and labels < total_labels:
+                prefix = (":label%d" % labels).ljust(12)
+                labels += 1
+
+            if number % DATA_EVERY == DATA_EVERY - 1:
+                yield "%sDAT %#x, \"text\", label0\n" % (prefix, self.random.randint(0x0, 0xffff))
+                continue
+
+            if self.random.random() < 0.05:
+                line = "JSR %s" % self.get_operand(labels, total_labels)
+            else:
+                line = "%s %s, %s" % (self.random.choice(OPERATIONS), self.random.choice(REGISTERS),
+                                      self.get_operand(labels, total_labels))
+
+            if self.random.random() < 0.3:
+                line = line.ljust(32) + "; what this does"
+
+            yield prefix + line + "\n"
+
+        # Define any label that was referenced but not reached
+        for label in xrange(labels, total_labels):
+            yield ":label%d SET A, B\n" % label
+
+def generate_source(line_count, seed=0x10c):
+    return list(SourceGenerator(seed).generate(line_count))
+
+def get_peak_memory():
+    '''
+    Returns the peak resident memory of this process in kilobytes
+    '''
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure(line_count, repeats=3, seed=0x10c):
+    '''
+    Assembles a generated program of line_count lines repeats times,
+    returning the best time with its throughput, the memory assembling
+    took on top of the source and the size of the output
+    '''
+
+    source = generate_source(line_count, seed)
+    memory_before = get_peak_memory()
+
+    best = None
+    for _ in xrange(repeats):
+        start = time.time()
+        code = assemble(source)
+        elapsed = time.time() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {
+        'lines': len(source),
+        'seconds': best,
+        'lines_per_second': len(source) / best if best else None,
+        'peak_memory_kb': get_peak_memory() - memory_before,
+        'words': len(code),
+        'output_bytes': sum(len(word) + 1 for word in code),
+    }
+
+def measure_in_process(line_count, repeats=3, seed=0x10c):
+    '''
+    Measures in a fresh process so the peak memory of one size doesn't
+    hide that of the next
+    '''
+
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(measure, (line_count, repeats, seed))
+    finally:
+        pool.close()
+        pool.join()
+
+def get_category(filename, function):
+    return PROFILE_CATEGORIES.get((os.path.basename(filename), function), "other")
+
+def profile(line_count, seed=0x10c):
+    '''
+    Returns the share of assembling time spent in each PROFILE_CATEGORIES
+    category, from the time spent in each function itself. The time of a
+    built-in function is split between the functions that called it
+    '''
+
+    source = generate_source(line_count, seed)
+
+    profiler = cProfile.Profile()
+    profiler.runcall(assemble, source)
+
+    stats = pstats.Stats(profiler).stats
+    totals = {}
+
+    for ((filename, _, function), (_, _, own_time, _, callers)) in stats.iteritems():
+        if filename != BUILTIN_FILE:
+            category = get_category(filename, function)
+            totals[category] = totals.get(category, 0.0) + own_time
+            continue
+
+        for ((caller_filename, _, caller), (_, _, caller_own_time, _)) in callers.iteritems():
+            category = get_category(caller_filename, caller)
+
+            if category != "other":
+                category = BUILTIN_CATEGORIES.get(function, category)
+
+            totals[category] = totals.get(category, 0.0) + caller_own_time
+
+    total = sum(totals.itervalues()) or 1.0
+
+    return dict((category, own_time / total) for (category, own_time) in totals.iteritems())
+
+def run(sizes=DEFAULT_SIZES, repeats=3, seed=0x10c):
+    '''
+    Returns the benchmark results for each program size, along with a
+    profile of the smallest
+    '''
+
+    return {
+        'version': BENCHMARK_FORMAT_VERSION,
+        'python': sys.version.split()[0],
+        'results': [measure_in_process(size, repeats, seed) for size in sizes],
+        'profile': profile(min(sizes), seed),
+    }
+
+def save(results, path):
+    f = open(path, 'w')
+    json.dump(results, f, indent=2, sort_keys=True)
+    f.close()
+
+def load(path):
+    f = open(path)
+    try:
+        results = json.load(f)
+    except ValueError:
+        raise InvalidBenchmarkFile(path)
+    finally:
+        f.close()
+
+    if results.get('version') != BENCHMARK_FORMAT_VERSION:
+        raise InvalidBenchmarkFile(path)
+
+    return results
+
+def compare(results, baseline):
+    '''
+    Returns (lines, change) for each program size in both results, where
+    change is the relative change in lines per second from baseline
+    '''
+
+    baseline_speeds = dict((result['lines'], result['lines_per_second']) for result in baseline['results'])
+
+    return [(result['lines'], result['lines_per_second'] / baseline_speeds[result['lines']] - 1)
+            for result in results['results'] if baseline_speeds.get(result['lines'])]
+
+class InvalidBenchmarkFile(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Not a benchmark results file: %s" % self.path
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import tempfile
+from array import array
+
+import assembler
+
+from simulator import specifications as specs, utilities
+from simulator.image import to_big_endian
+from assembler import assemble_words, Directives, ProgramTooLarge
+
+CACHE_FORMAT_VERSION = 1
+CACHE_FILE_EXT = 'json'
+
+DEFAULT_CACHE_DIR = os.environ.get('DCPU_CACHE_DIR') or \
+    os.path.join(os.path.expanduser('~'), '.cache', 'dcpu')
+
+DEFAULT_MAX_SIZE = 16 * 1024 * 1024
+
+# The modules whose source decides what a program assembles to: the
+# assembler and the opcode and value code tables it is built on
+ASSEMBLER_MODULES = [assembler, specs, utilities]
+
+_assembler_version = None
+
+def get_assembler_version():
+    '''
+    Returns a hash of the source of the ASSEMBLER_MODULES, so that changing
+    the assembler or its tables in any way invalidates what it assembled
+    before
+    '''
+
+    global _assembler_version
+
+    if _assembler_version is None:
+        version = hashlib.sha1()
+
+        for module in ASSEMBLER_MODULES:
+            f = open(os.path.splitext(module.__file__)[0] + '.py', 'rb')
+            version.update(f.read())
+            f.close()
+
+        _assembler_version = version.hexdigest()
+
+    return _assembler_version
+
+class AssemblyCache(object):
+    '''
+    Assembled programs kept on disk between runs, like .pyc files, each
+    under a hash of its source, the assembler version and the options it
+    was assembled with
+
+    Every use of an entry touches it, and once the directory outgrows
+    max_size bytes the entries used least recently are removed
+    '''
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_key(self, program, relax=False):
+        key = hashlib.sha1()
+        key.update("%d %s %s %d\n" % (CACHE_FORMAT_VERSION, specs.DCPU_VERSION, get_assembler_version(), relax))
+
+        for line in program:
+            key.update(line)
+
+        return key.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + '.' + CACHE_FILE_EXT)
+
+    def assemble(self, program, relax=False, path=None):
+        '''
+        Returns the program assembled into an array of 16-bit words along
+        with a dictionary mapping each label to its address, from the
+        cache if it was assembled before
+
+        Programs including binary files are always assembled, the cache
+        can't tell when those files change. They are looked up next to
+        path, the file the program was read from, when given
+        '''
+
+        program = list(program)
+
+        if any(Directives.INCLUDE_BINARY in line for line in program):
+            return assemble_program(program, relax, path)
+
+        key = self.get_key(program, relax)
+        cached = self.load(key)
+
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+
+        (words, symbols) = assemble_program(program, relax)
+        self.save(key, words, symbols)
+
+        return (words, symbols)
+
+    def load(self, key):
+        '''
+        Returns the (words, symbols) cached under key, None if there are
+        none or they can't be read, e.g. a truncated or hand edited entry
+        '''
+
+        path = self.get_path(key)
+
+        try:
+            f = open(path)
+        except IOError:
+            return None
+
+        try:
+            data = json.load(f)
+        except ValueError:
+            return None
+        finally:
+            f.close()
+
+        try:
+            if data.get('version') != CACHE_FORMAT_VERSION:
+                return None
+
+            words = array('H')
+            words.fromstring(data['words'].decode('hex'))
+
+            symbols = dict((str(label), address) for (label, address) in data['symbols'].iteritems())
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return (to_big_endian(words), symbols)
+
+    def save(self, key, words, symbols):
+        '''
+        Writes an entry in one rename, so that other processes sharing the
+        cache never read it half written, then evicts if needed
+        '''
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        (handle, temporary_path) = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        f = os.fdopen(handle, 'w')
+        json.dump({
+            'version': CACHE_FORMAT_VERSION,
+            'words': to_big_endian(words).tostring().encode('hex'),
+            'symbols': symbols,
+        }, f)
+        f.close()
+
+        os.rename(temporary_path, self.get_path(key))
+
+        self.evict()
+
+    def evict(self):
+        '''
+        Removes the least recently used entries until the cache takes at
+        most max_size bytes
+        '''
+
+        entries = []
+
+        for name in os.listdir(self.directory):
+            if not name.endswith('.' + CACHE_FILE_EXT):
+                continue
+
+            path = os.path.join(self.directory, name)
+
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry_size for (_, entry_size, _) in entries)
+
+        for (_, entry_size, path) in sorted(entries):
+            if size <= self.max_size:
+                break
+
+            # Another process may have removed it already
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+
+            size -= entry_size
+
+def assemble_program(program, relax=False, path=None):
+    (words, symbols) = assemble_words(program, relax, path)
+
+    if len(words) > specs.MAX_RAM_ADDRESS + 1:
+        raise ProgramTooLarge(len(words))
+
+    return (array('H', words), symbols)
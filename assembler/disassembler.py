@@ -0,0 +1,197 @@
+from simulator import specifications as specs
+from simulator.dcpu import parse_instruction, get_word_length
+from simulator.image import read_image
+
+OPERATION_NAMES = dict((getattr(specs.BasicOperations, name), name)
+                        for name in dir(specs.BasicOperations) if not name.startswith('_'))
+
+NON_BASIC_OPERATION_NAMES = dict((getattr(specs.NonBasicOperations, name), name)
+                        for name in dir(specs.NonBasicOperations) if not name.startswith('_'))
+
+LITERAL_FORMAT = "%#x"
+LABEL_FORMAT = "loc_%04x"
+SUBROUTINE_LABEL_FORMAT = "sub_%04x"
+LABEL_COLUMN_WIDTH = 14
+
+NEXT_WORD_LITERAL = 0x1f
+MAX_SHORT_LITERAL = 0x1f
+PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+
+def get_operand_format(value_code):
+    '''
+    Returns the assembler syntax for value_code, with a %s in place
+    of the next word for value codes that read one
+    '''
+
+    if value_code in specs.REGISTERS:
+        return specs.REGISTERS[value_code]
+    elif value_code <= 0x0f:
+        return "[%s]" % specs.REGISTERS[value_code - 0x08]
+    elif value_code <= 0x17:
+        return "[%%s+%s]" % specs.REGISTERS[value_code - 0x10]
+    elif value_code in specs.STACK_CODES:
+        return specs.STACK_CODES[value_code]
+    elif value_code in specs.SPECIAL_REGISTERS:
+        return specs.SPECIAL_REGISTERS[value_code]
+    elif value_code == 0x1e:
+        return "[%s]"
+    elif value_code == NEXT_WORD_LITERAL:
+        return "%s"
+    else:
+        return LITERAL_FORMAT % (value_code - 0x20)
+
+OPERAND_FORMATS = [get_operand_format(code) for code in range(0x40)]
+
+class Decoded(object):
+    '''
+    A decoded instruction word: its mnemonic, value codes, the number of
+    words the whole instruction takes and which of those are literals
+    '''
+
+    __slots__ = ['name', 'a', 'b', 'word_length', 'is_jump', 'is_call', 'literals']
+
+    def __init__(self, word):
+        (op_code, a, b) = parse_instruction(word)
+
+        if b is None:
+            self.name = NON_BASIC_OPERATION_NAMES.get(op_code)
+        else:
+            self.name = OPERATION_NAMES.get(op_code)
+
+        self.a = a
+        self.b = b
+        self.word_length = get_word_length(word)
+
+        self.is_call = (op_code == specs.NonBasicOperations.JSR and b is None
+                        and a == NEXT_WORD_LITERAL)
+        self.is_jump = (op_code == specs.BasicOperations.SET and a == PC_CODE
+                        and b == NEXT_WORD_LITERAL)
+
+        # Positions of next word literals among the additional words
+        word_codes = [code for code in (a, b) if code in specs.GET_WORD_VALUE_CODES]
+        self.literals = [i for (i, code) in enumerate(word_codes) if code == NEXT_WORD_LITERAL]
+
+class Disassembler(object):
+    '''
+    Turns machine code words back into assembler instructions
+
+    Decoding is shared across identical words through a per-word cache, and
+    targets of JSR and SET PC get synthesized labels so the output can be
+    reassembled
+    '''
+
+    def __init__(self):
+        self.cache = {}
+
+    def decode(self, word):
+        decoded = self.cache.get(word)
+
+        if decoded is None:
+            decoded = self.cache[word] = Decoded(word)
+
+        return decoded
+
+    def find_labels(self, words):
+        '''
+        Returns a mapping of label names for the addresses that are
+        referenced by literals and start an instruction
+        '''
+
+        decode = self.decode
+        size = len(words)
+        starts = bytearray(size)
+        targets = {}
+
+        address = 0
+        while address < size:
+            decoded = decode(words[address])
+
+            if decoded.name is None or address + decoded.word_length > size:
+                address += 1
+                continue
+
+            starts[address] = 1
+
+            for index in decoded.literals:
+                target = words[address + 1 + index]
+
+                if decoded.is_call:
+                    targets[target] = SUBROUTINE_LABEL_FORMAT % target
+
+                # The assembler only emits small next word literals for labels
+                elif (decoded.is_jump or target <= MAX_SHORT_LITERAL) and target not in targets:
+                    targets[target] = LABEL_FORMAT % target
+
+            address += decoded.word_length
+
+        labels = dict((target, name) for (target, name) in targets.iteritems()
+                        if target < size and starts[target])
+
+        return labels
+
+    def disassemble(self, words):
+        '''
+        Generates a line of assembler for each instruction in words
+
+        Words that don't form a valid instruction are output as DAT, as are
+        instructions with a next word literal small enough for the assembler
+        to shorten that doesn't point at a label, so addresses don't shift
+        '''
+
+        decode = self.decode
+        labels = self.find_labels(words)
+        size = len(words)
+
+        address = 0
+        while address < size:
+            word = words[address]
+            decoded = decode(word)
+            label = labels.get(address)
+
+            prefix = (":" + label if label else "").ljust(LABEL_COLUMN_WIDTH)
+
+            if decoded.name is None or address + decoded.word_length > size:
+                yield prefix + "DAT " + LITERAL_FORMAT % word
+                address += 1
+                continue
+
+            if self.would_shorten(decoded, words, address, labels):
+                yield prefix + "DAT " + ", ".join(LITERAL_FORMAT % word for word in
+                                                  words[address:address + decoded.word_length])
+                address += decoded.word_length
+                continue
+
+            next_words = iter(words[address + 1:address + decoded.word_length])
+
+            operands = [self.format_operand(decoded.a, next_words, labels)]
+            if decoded.b is not None:
+                operands.append(self.format_operand(decoded.b, next_words, labels))
+
+            yield prefix + decoded.name + " " + ", ".join(operands)
+
+            address += decoded.word_length
+
+    def would_shorten(self, decoded, words, address, labels):
+        for index in decoded.literals:
+            value = words[address + 1 + index]
+
+            if value <= MAX_SHORT_LITERAL and value not in labels:
+                return True
+
+        return False
+
+    def format_operand(self, value_code, next_words, labels):
+        operand = OPERAND_FORMATS[value_code]
+
+        if value_code not in specs.GET_WORD_VALUE_CODES:
+            return operand
+
+        value = next(next_words)
+
+        if value_code == NEXT_WORD_LITERAL and value in labels:
+            return operand % labels[value]
+
+        return operand % (LITERAL_FORMAT % value)
+
+def disassemble(words):
+    return Disassembler().disassemble(words)
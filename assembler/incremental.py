@@ -0,0 +1,195 @@
+from array import array
+from bisect import bisect_left
+
+from assembler import read_line, Directives, InvalidValueReference
+
+class IncrementalAssembler(object):
+    '''
+    Reassembles a program that changes between calls, reparsing only the
+    lines that changed
+
+    Parsed instructions are cached by line content. Words before the first
+    changed line are kept and words after the last one are moved as a block,
+    then only words that reference a label whose address changed are patched.
+    After each call changes holds the (address, word) pairs that differ from
+    the previous output.
+
+    .incbin lines are always reparsed, since the file they include may have
+    changed while the line didn't. Their files are looked up next to path,
+    the file the program is read from, when given
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.cache = {}
+        self.lines = []
+        self.addresses = array('L')
+        self.label_lines = {}
+        self.labels = {}
+        self.references = []
+        self.words = array('H')
+        self.changes = []
+
+    def parse(self, line):
+        if is_include_binary(line):
+            return read_line(line, self.path)
+
+        instruction = self.cache.get(line, False)
+
+        if instruction is False:
+            instruction = self.cache[line] = read_line(line)
+
+        return instruction
+
+    def find_changed_lines(self, lines):
+        '''
+        Returns the number of lines at the start and at the end of
+        the program that are unchanged
+        '''
+
+        old_lines = self.lines
+        shortest = min(len(lines), len(old_lines))
+
+        first = 0
+        while first < shortest and lines[first] == old_lines[first] and not is_include_binary(lines[first]):
+            first += 1
+
+        suffix = 0
+        while suffix < shortest - first and lines[-1 - suffix] == old_lines[-1 - suffix] \
+                and not is_include_binary(lines[-1 - suffix]):
+            suffix += 1
+
+        return (first, suffix)
+
+    def get_address(self, line):
+        return self.addresses[line] if line < len(self.lines) else len(self.words)
+
+    def assemble(self, lines):
+        '''
+        Assembles lines, returning the machine code as an array of words
+        '''
+
+        lines = list(lines)
+        (first, suffix) = self.find_changed_lines(lines)
+
+        old_end_line = len(self.lines) - suffix
+        end_line = len(lines) - suffix
+
+        start = self.get_address(first)
+        old_end = self.get_address(old_end_line)
+
+        # Parse the changed lines
+        middle_addresses = array('L')
+        middle_labels = []
+        instructions = []
+
+        address = start
+        for i in xrange(first, end_line):
+            instruction = self.parse(lines[i])
+            middle_addresses.append(address)
+
+            if instruction is None:
+                continue
+
+            if instruction.label:
+                middle_labels.append((instruction.label, i))
+
+            instructions.append(instruction)
+            address += instruction.word_length
+
+        shift = address - old_end
+        line_shift = end_line - old_end_line
+
+        # Labels before the change keep their address, those after it move with their line
+        label_lines = {}
+
+        for (label, definitions) in self.label_lines.iteritems():
+            kept = [line for line in definitions if line < first] \
+                    + [line + line_shift for line in definitions if line >= old_end_line]
+
+            if kept:
+                label_lines[label] = kept
+
+        for (label, line) in middle_labels:
+            label_lines.setdefault(label, []).append(line)
+
+        labels = {}
+
+        for (label, definitions) in label_lines.iteritems():
+            definitions.sort()
+            line = definitions[-1]
+
+            if line < first:
+                labels[label] = self.addresses[line]
+            elif line < end_line:
+                labels[label] = middle_addresses[line - first]
+            else:
+                labels[label] = self.addresses[line - line_shift] + shift
+
+        # Assemble the changed lines
+        middle_words = array('H')
+        middle_references = []
+
+        for instruction in instructions:
+            for word in instruction.words:
+                if not isinstance(word, int):
+                    if word not in labels:
+                        raise InvalidValueReference(word)
+
+                    middle_references.append((start + len(middle_words), word))
+                    word = labels[word]
+
+                middle_words.append(word)
+
+        old_words = self.words
+        words = old_words[:start] + middle_words + old_words[old_end:]
+
+        # (address, label) pairs for every word holding a label's address, in address order
+        old_references = self.references
+        prefix_references = old_references[:bisect_left(old_references, (start,))]
+        suffix_references = old_references[bisect_left(old_references, (old_end,)):]
+
+        if shift:
+            suffix_references = [(reference + shift, label) for (reference, label) in suffix_references]
+
+        changed_labels = set(label for label in set(labels) | set(self.labels)
+                                if labels.get(label) != self.labels.get(label))
+        patched = []
+
+        if changed_labels:
+            for (reference, label) in prefix_references + suffix_references:
+                if label in changed_labels:
+                    if label not in labels:
+                        raise InvalidValueReference(label)
+
+                    words[reference] = labels[label]
+                    patched.append(reference)
+
+        if shift:
+            suffix_addresses = array('L', (line_address + shift for line_address in self.addresses[old_end_line:]))
+        else:
+            suffix_addresses = self.addresses[old_end_line:]
+
+        # Everything after the changed lines moved if their length changed
+        end = len(words) if shift else start + len(middle_words)
+
+        changes = [(i, words[i]) for i in xrange(start, end)
+                    if i >= len(old_words) or words[i] != old_words[i]]
+        changes += [(i, words[i]) for i in patched if i < start or i >= end]
+        changes.sort()
+
+        self.lines = lines
+        self.addresses = self.addresses[:first] + middle_addresses + suffix_addresses
+        self.label_lines = label_lines
+        self.labels = labels
+        self.references = prefix_references + middle_references + suffix_references
+        self.words = words
+        self.changes = changes
+
+        if len(self.cache) > 2 * len(lines):
+            self.cache = dict((line, self.cache[line]) for line in lines if line in self.cache)
+
+        return words
+
+def is_include_binary(line):
+    return Directives.INCLUDE_BINARY in line
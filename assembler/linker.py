@@ -0,0 +1,225 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from array import array
+
+from simulator import specifications as specs
+from simulator.image import to_big_endian
+from assembler import read_line, InvalidValueReference
+
+OBJECT_FORMAT_VERSION = 1
+
+class ObjectFile(object):
+    '''
+    A separately assembled module
+
+    words holds the machine code with 0x0 in place of label references, the
+    (offset, label) relocations say where each label's final address goes
+    and symbols maps the module's labels to their offset in the module
+    '''
+
+    def __init__(self, words, symbols, relocations, source_hash=None):
+        self.words = words
+        self.symbols = symbols
+        self.relocations = relocations
+        self.source_hash = source_hash
+
+    def save(self, path):
+        f = open(path, 'w')
+        json.dump({
+            'version': OBJECT_FORMAT_VERSION,
+            'source_hash': self.source_hash,
+            'words': to_big_endian(self.words).tostring().encode('hex'),
+            'symbols': self.symbols,
+            'relocations': self.relocations,
+        }, f)
+        f.close()
+
+    @classmethod
+    def load(cls, path):
+        f = open(path)
+        try:
+            data = json.load(f)
+        except ValueError:
+            raise InvalidObjectFile(path)
+        finally:
+            f.close()
+
+        if data.get('version') != OBJECT_FORMAT_VERSION:
+            raise InvalidObjectFile(path)
+
+        words = array('H')
+        words.fromstring(data['words'].decode('hex'))
+        words = to_big_endian(words)
+
+        symbols = dict((str(label), offset) for (label, offset) in data['symbols'].iteritems())
+        relocations = [(offset, str(label)) for (offset, label) in data['relocations']]
+
+        return cls(words, symbols, relocations, data['source_hash'])
+
+def hash_source(lines):
+    return hashlib.sha1("".join(lines)).hexdigest()
+
+def assemble_object(program):
+    '''
+    Assembles a module whose labels are resolved at link time
+    '''
+
+    lines = list(program)
+
+    words = array('H')
+    symbols = {}
+    relocations = []
+
+    for line in lines:
+        instruction = read_line(line)
+
+        if instruction is None:
+            continue
+
+        if instruction.label:
+            symbols[instruction.label] = len(words)
+
+        for word in instruction.words:
+            if not isinstance(word, int):
+                relocations.append((len(words), word))
+                word = 0x0
+
+            words.append(word)
+
+    return ObjectFile(words, symbols, relocations, hash_source(lines))
+
+def link(objects):
+    '''
+    Places the objects one after the other and applies their relocations,
+    returning the machine code and the address of every label
+
+    A label reference resolves to the module's own label if it has one,
+    otherwise to the label of another module, which must be unique
+    '''
+
+    words = array('H')
+    bases = []
+    exported = {}
+
+    for obj in objects:
+        bases.append(len(words))
+
+        for (label, offset) in obj.symbols.iteritems():
+            exported.setdefault(label, []).append(len(words) + offset)
+
+        words.extend(obj.words)
+
+    for (obj, base) in zip(objects, bases):
+        symbols = obj.symbols
+
+        for (offset, label) in obj.relocations:
+            if label in symbols:
+                address = base + symbols[label]
+            elif len(exported.get(label, [])) == 1:
+                address = exported[label][0]
+            elif label in exported:
+                raise AmbiguousSymbol(label)
+            else:
+                raise InvalidValueReference(label)
+
+            words[base + offset] = address
+
+    symbols = dict((label, addresses[0]) for (label, addresses) in exported.iteritems()
+                    if len(addresses) == 1)
+
+    return (words, symbols)
+
+def get_object_path(source, object_dir):
+    '''
+    Returns where the object file for source goes, named after the source
+    file and a hash of its absolute path so that modules with the same
+    name in different directories don't share an object file
+    '''
+
+    name = os.path.splitext(os.path.basename(source))[0]
+    path_hash = hashlib.sha1(os.path.abspath(source)).hexdigest()[:8]
+
+    return os.path.join(object_dir, "%s-%s.%s" % (name, path_hash, specs.OBJECT_FILE_EXT))
+
+def read_source(path):
+    f = open(path)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def assemble_file(paths):
+    '''
+    Assembles the source file into its object file
+    '''
+
+    (source, object_path) = paths
+
+    obj = assemble_object(read_source(source))
+    obj.save(object_path)
+
+    return object_path
+
+def build(sources, object_dir, processes=None):
+    '''
+    Assembles each source file into an object file in object_dir, reusing
+    objects whose source is unchanged, and links them in the given order
+
+    Modules that need assembling are spread across a process pool
+    '''
+
+    if not os.path.isdir(object_dir):
+        os.makedirs(object_dir)
+
+    object_paths = [get_object_path(source, object_dir) for source in sources]
+    objects = [load_if_up_to_date(source, path) for (source, path) in zip(sources, object_paths)]
+
+    stale = [(source, path) for (source, path, obj) in zip(sources, object_paths, objects) if obj is None]
+
+    if len(stale) > 1 and processes != 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            pool.map(assemble_file, stale)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        map(assemble_file, stale)
+
+    objects = [obj or ObjectFile.load(path) for (obj, path) in zip(objects, object_paths)]
+
+    return link(objects)
+
+def load_if_up_to_date(source, object_path):
+    '''
+    Returns the object file assembled from source, None if it is missing or out of date
+    '''
+
+    if not os.path.exists(object_path):
+        return None
+
+    try:
+        obj = ObjectFile.load(object_path)
+    except InvalidObjectFile:
+        return None
+
+    if obj.source_hash != hash_source(read_source(source)):
+        return None
+
+    return obj
+
+class AmbiguousSymbol(Exception):
+    def __init__(self, label):
+        self.label = label
+
+    def __str__(self):
+        return "Label defined in more than one module: %s" % self.label
+
+class InvalidObjectFile(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Not a valid object file: %s" % self.path
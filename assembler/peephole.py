@@ -0,0 +1,302 @@
+import copy
+
+from simulator import specifications as specs
+from simulator.dcpu import get_cycles
+from assembler import Instruction
+
+SET = specs.BasicOperations.SET
+
+# Operations that set O, each with the operand that leaves a unchanged
+O_WRITING_IDENTITIES = {
+    specs.BasicOperations.ADD: 0x0,
+    specs.BasicOperations.SUB: 0x0,
+    specs.BasicOperations.MUL: 0x1,
+    specs.BasicOperations.DIV: 0x1,
+    specs.BasicOperations.SHL: 0x0,
+    specs.BasicOperations.SHR: 0x0,
+}
+
+IDENTITIES = {
+    specs.BasicOperations.BOR: 0x0,
+    specs.BasicOperations.XOR: 0x0,
+    specs.BasicOperations.AND: 0xffff,
+}
+
+POP = specs.STACK_CODE_NAMES['POP']
+PEEK = specs.STACK_CODE_NAMES['PEEK']
+PUSH = specs.STACK_CODE_NAMES['PUSH']
+SP = specs.SPECIAL_REGISTER_NAMES['SP']
+PC = specs.SPECIAL_REGISTER_NAMES['PC']
+O = specs.SPECIAL_REGISTER_NAMES['O']
+
+# Value codes whose evaluation moves SP
+STACK_CHANGING_CODES = frozenset([POP, PUSH])
+
+NEXT_WORD_LITERAL = 0x1f
+
+class PeepholeOptimizer(object):
+    '''
+    Rewrites short sequences of instructions into cheaper ones that leave
+    the registers and memory the same
+
+    Rules are tried at each instruction until none applies anywhere. A rule
+    returns the number of instructions it replaces and their replacement,
+    or None. Instructions right after an IF are never rewritten since that
+    would change what the IF skips, and a rewrite may only remove a label
+    if the next instruction can take it over. Memory below SP is treated
+    as free, so a value pushed and popped straight away needn't be written.
+    '''
+
+    RULES = ['self_assignment', 'identity', 'jump_to_next', 'overwritten_set', 'push_pop']
+
+    def __init__(self, rules=None):
+        self.rules = [(name, getattr(self, 'rewrite_' + name)) for name in (rules or self.RULES)]
+        self.definitions = {}
+        self.rewrites = dict((name, 0) for (name, _) in self.rules)
+        self.cycles_saved = 0
+
+    def optimize(self, instructions):
+        '''
+        Returns the optimized list of instructions
+        '''
+
+        instructions = list(instructions)
+
+        self.definitions = {}
+        for instruction in instructions:
+            if instruction.label:
+                self.definitions[instruction.label] = self.definitions.get(instruction.label, 0) + 1
+
+        while True:
+            (instructions, rewritten) = self.optimize_pass(instructions)
+
+            if not rewritten:
+                return instructions
+
+    def optimize_pass(self, instructions):
+        optimized = []
+        rewritten = 0
+        index = 0
+
+        while index < len(instructions):
+            rewrite = None
+
+            if not (optimized and is_conditional(optimized[-1])):
+                for (name, rule) in self.rules:
+                    rewrite = rule(instructions, index)
+
+                    if rewrite is not None and self.move_label(instructions, index, *rewrite):
+                        break
+
+                    rewrite = None
+
+            if rewrite is None:
+                optimized.append(instructions[index])
+                index += 1
+                continue
+
+            (count, replacement) = rewrite
+
+            self.rewrites[name] += 1
+            self.cycles_saved += sum(get_cycles(instruction.code) for instruction in instructions[index:index + count]) \
+                                 - sum(get_cycles(instruction.code) for instruction in replacement)
+
+            optimized.extend(replacement)
+            rewritten += 1
+            index += count
+
+        return (optimized, rewritten)
+
+    def move_label(self, instructions, index, count, replacement):
+        '''
+        Puts the label of the first replaced instruction on a copy of the
+        instruction that takes its place, so the caller's instructions are
+        left alone. Returns False if the rewrite would lose a label
+        '''
+
+        replaced = instructions[index:index + count]
+
+        if any(instruction.label for instruction in replaced[1:]):
+            return False
+
+        label = replaced[0].label
+
+        if not label:
+            return True
+
+        if replacement:
+            replacement[0] = with_label(replacement[0], label)
+            return True
+
+        if index + count < len(instructions) and not instructions[index + count].label:
+            instructions[index + count] = with_label(instructions[index + count], label)
+            return True
+
+        return False
+
+    def rewrite_self_assignment(self, instructions, index):
+        '''
+        SET a, a
+        '''
+
+        instruction = instructions[index]
+
+        if is_set(instruction) and instruction.value_code_a == instruction.value_code_b \
+                and instruction.value_code_a not in STACK_CHANGING_CODES:
+            words = instruction.additional_words
+
+            if not words or words[0] == words[1]:
+                return (1, [])
+
+        return None
+
+    def rewrite_identity(self, instructions, index):
+        '''
+        ADD a, 0x0, MUL a, 0x1, XOR a, 0x0 and the like, for operations
+        that set O only if O is overwritten before it's read
+        '''
+
+        instruction = instructions[index]
+        op_code = instruction.op_code
+
+        if not instruction.is_basic or instruction.value_code_a in STACK_CHANGING_CODES \
+                or instruction.value_code_a == O:
+            return None
+
+        value = get_literal(instruction)
+
+        if value is None:
+            return None
+
+        if IDENTITIES.get(op_code) == value:
+            return (1, [])
+
+        if O_WRITING_IDENTITIES.get(op_code) == value and is_o_dead(instructions, index):
+            return (1, [])
+
+        return None
+
+    def rewrite_jump_to_next(self, instructions, index):
+        '''
+        SET PC, label where label is the next instruction
+        '''
+
+        instruction = instructions[index]
+
+        if index + 1 < len(instructions) and is_set(instruction) and instruction.value_code_a == PC \
+                and instruction.value_code_b == NEXT_WORD_LITERAL:
+            label = instruction.additional_words[0]
+            next_label = instructions[index + 1].label
+
+            if label == next_label and self.definitions.get(label) == 1:
+                return (1, [])
+
+        return None
+
+    def rewrite_overwritten_set(self, instructions, index):
+        '''
+        SET a, x followed by SET a, y where y doesn't read register a
+        '''
+
+        if index + 1 >= len(instructions):
+            return None
+
+        (first, second) = instructions[index:index + 2]
+        register = first.value_code_a
+
+        if is_set(first) and is_set(second) and register in specs.REGISTERS \
+                and second.value_code_a == register and first.value_code_b not in STACK_CHANGING_CODES \
+                and second.value_code_b not in (register, register + 0x08, register + 0x10):
+            return (1, [])
+
+        return None
+
+    def rewrite_push_pop(self, instructions, index):
+        '''
+        SET PUSH, x followed by SET y, POP becomes SET y, x
+        '''
+
+        if index + 1 >= len(instructions):
+            return None
+
+        (push, pop) = instructions[index:index + 2]
+
+        if not (is_set(push) and is_set(pop) and push.value_code_a == PUSH and pop.value_code_b == POP):
+            return None
+
+        source = push.value_code_b
+        destination = pop.value_code_a
+
+        # Values that depend on SP or PC differ once the push is gone
+        if source in (POP, PEEK, PUSH, SP, PC) or destination in (POP, PEEK, PUSH, SP):
+            return None
+
+        instruction = Instruction(SET, True, destination, source)
+        instruction.line = push.line
+
+        for word in pop.additional_words + push.additional_words:
+            instruction.add_word(word)
+
+        return (2, [instruction])
+
+def with_label(instruction, label):
+    labelled = copy.copy(instruction)
+    labelled.additional_words = list(instruction.additional_words)
+    labelled.label = label
+
+    return labelled
+
+def is_set(instruction):
+    return instruction.is_basic and instruction.op_code == SET
+
+def is_conditional(instruction):
+    return instruction.is_basic and instruction.op_code in specs.IF_OPERATIONS
+
+def is_jump(instruction):
+    return not instruction.is_basic or (instruction.value_code_a == PC and not is_conditional(instruction))
+
+def reads_o(instruction):
+    return O in (instruction.value_code_a, instruction.value_code_b)
+
+def get_literal(instruction):
+    '''
+    Returns the value of instruction's b operand if it's a number, None otherwise
+    '''
+
+    value_code = instruction.value_code_b
+
+    if value_code >= 0x20:
+        return value_code - 0x20
+
+    if value_code == NEXT_WORD_LITERAL:
+        word = instruction.additional_words[-1]
+
+        if isinstance(word, int):
+            return word
+
+    return None
+
+def is_o_dead(instructions, index):
+    '''
+    Whether O is always overwritten after instructions[index] before being
+    read, looking only at the straight line code that follows it
+    '''
+
+    for instruction in instructions[index + 1:]:
+        if reads_o(instruction) or is_conditional(instruction) or is_jump(instruction):
+            return False
+
+        if instruction.op_code in O_WRITING_IDENTITIES:
+            return True
+
+    return False
+
+def optimize(instructions, rules=None):
+    '''
+    Returns the optimized instructions and the estimated cycles saved
+    '''
+
+    optimizer = PeepholeOptimizer(rules)
+    instructions = optimizer.optimize(instructions)
+
+    return (instructions, optimizer.cycles_saved)
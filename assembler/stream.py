@@ -0,0 +1,104 @@
+import struct
+
+from assembler import read_line, InvalidValueReference
+
+class ListWriter(object):
+    '''
+    Collects assembled words in a list
+    '''
+
+    def __init__(self):
+        self.words = []
+
+    def write(self, word):
+        self.words.append(word)
+
+    def patch(self, address, word):
+        self.words[address] = word
+
+class BinaryFileWriter(object):
+    '''
+    Writes assembled words to a seekable file as big-endian 16-bit words
+    '''
+
+    WORD_FORMAT = '>H'
+    WORD_WIDTH = struct.calcsize(WORD_FORMAT)
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, word):
+        self.f.write(struct.pack(self.WORD_FORMAT, word))
+
+    def patch(self, address, word):
+        position = self.f.tell()
+
+        self.f.seek(address * self.WORD_WIDTH)
+        self.write(word)
+        self.f.seek(position)
+
+    def truncate(self, length):
+        '''
+        Cuts the file down to its first length words
+        '''
+
+        self.f.truncate(length * self.WORD_WIDTH)
+
+class HexFileWriter(BinaryFileWriter):
+    '''
+    Writes assembled words to a seekable file as one hex word per line
+
+    Every line has the same width so words can be patched in place
+    '''
+
+    LINE_FORMAT = "%#06x\n"
+    WORD_WIDTH = len(LINE_FORMAT % 0)
+
+    def write(self, word):
+        self.f.write(self.LINE_FORMAT % word)
+
+def assemble_stream(program, writer, path=None):
+    '''
+    Assembles the lines of program in a single pass, writing each word to
+    writer as soon as it is known
+
+    References to labels that haven't been defined yet are written as 0x0
+    and patched when the label is found, so only the addresses of those
+    unresolved references are held in memory. Returns the label addresses.
+    Binary files the program includes are looked up next to path, the
+    file it is read from, when given
+    '''
+
+    current_address = 0x0
+    labels = {}
+    fixups = {}
+
+    for line in program:
+        instruction = read_line(line, path)
+
+        if instruction is None:
+            continue
+
+        label = instruction.label
+
+        if label:
+            labels[label] = current_address
+
+            for address in fixups.pop(label, []):
+                writer.patch(address, current_address)
+
+        for word in instruction.words:
+            if not isinstance(word, int):
+                if word in labels:
+                    word = labels[word]
+                else:
+                    fixups.setdefault(word, []).append(current_address)
+                    word = 0x0
+
+            writer.write(word)
+            current_address += 1
+
+    if fixups:
+        raise InvalidValueReference(min(fixups))
+
+    return labels
@@ -1,8 +1,12 @@
 import unittest
 import glob
 import os
+import shutil
+import tempfile
 from simulator import specifications as specs
-from assembler.assembler import assemble, parse_line, AssemblerSyntaxError, InvalidOperation, ValueOutOfRange, InvalidValueReference
+from simulator.dcpu import DCPU
+from simulator.image import write_image
+from assembler.assembler import assemble, assemble_binary, assemble_words, assemble_with_source_map, read_instructions, relax_instructions, assemble_with_symbols, get_line_addresses, parse_line, parse_number, AssemblerSyntaxError, InvalidOperation, ValueOutOfRange, InvalidValueReference, MissingOperand, ProgramTooLarge, InvalidData
 
 class TestAssembler(unittest.TestCase):
 
@@ -37,6 +41,25 @@ class TestAssembler(unittest.TestCase):
         self.assertRaises(AssemblerSyntaxError, assemble, ["SET A,"])
         self.assertRaises(AssemblerSyntaxError, assemble, ["SET A, 0x10000"])
 
+        self.assertRaisesRegexp(MissingOperand, "SET", parse_line, "SET A,")
+        self.assertRaisesRegexp(MissingOperand, "JSR", parse_line, "JSR")
+        self.assertRaisesRegexp(ValueOutOfRange, "-0x1", parse_line, "SET A, -1")
+        self.assertRaisesRegexp(InvalidValueReference, "SP", parse_line, "SET [0x10+SP], A")
+        self.assertRaisesRegexp(InvalidOperation, "__doc__", parse_line, "__doc__ A, B")
+
+    def test_register_names_unchanged(self):
+        register_names = dict(specs.REGISTER_NAMES)
+        assemble(['SET PUSH, SP', 'SET O, POP', 'SET [A], PC'])
+
+        self.assertEqual(specs.REGISTER_NAMES, register_names)
+
+    def test_parse_number(self):
+        self.assertEqual(parse_number("10"), 10)
+        self.assertEqual(parse_number("0x10"), 0x10)
+        self.assertEqual(parse_number("ff"), 0xff)
+        self.assertEqual(parse_number("loop"), None)
+        self.assertEqual(parse_number("0x"), None)
+
     def test_assemble_label_lookup(self):
         program = [
             ':loop SET A, B',
@@ -57,6 +80,168 @@ class TestAssembler(unittest.TestCase):
         # Invalid lookup
         self.assertRaisesRegexp(InvalidValueReference, 'foo', assemble, ['JSR foo'])
 
+    def test_assemble_with_symbols(self):
+        program = [
+            'SET A, 0x1000',
+            ':loop SET A, B',
+            ':end JSR loop'
+        ]
+
+        (code, symbols) = assemble_with_symbols(program)
+        self.assertEqual(code, assemble(program))
+        self.assertEqual(symbols, {'loop': 0x2, 'end': 0x3})
+
+    def test_data(self):
+        self.assertEqual(assemble(['DAT 0x10, 20, "ab"']), ['0x10', '0x14', '0x61', '0x62'])
+        self.assertEqual(assemble(['DAT "a, b; c\\n" ; comment']), map(hex, map(ord, 'a, b; c\n')))
+        self.assertEqual(assemble(['DAT "say \\"hi\\""']), map(hex, map(ord, 'say "hi"')))
+
+        program = [
+            '       SET A, [table+B]',
+            '       SET PC, end',
+            ':table DAT 0x1, 0x2, end',
+            ':end   DAT table',
+        ]
+
+        (code, symbols) = assemble_with_symbols(program)
+        self.assertEqual(symbols, {'table': 0x4, 'end': 0x7})
+        self.assertEqual(code[4:], ['0x1', '0x2', '0x7', '0x4'])
+
+    def test_data_errors(self):
+        self.assertRaises(MissingOperand, parse_line, 'DAT')
+        self.assertRaises(MissingOperand, parse_line, 'DAT ; nothing')
+        self.assertRaises(InvalidData, parse_line, 'DAT 0x1 0x2')
+        self.assertRaises(InvalidData, parse_line, 'DAT "unterminated')
+        self.assertRaises(ValueOutOfRange, parse_line, 'DAT 0x10000')
+
+    def test_include_binary(self):
+        (handle, path) = tempfile.mkstemp()
+        f = os.fdopen(handle, 'wb')
+        write_image(range(0x1000), f)
+        f.close()
+
+        try:
+            program = [':table .incbin "%s"' % path, ':end SET B, 0x10', 'SET A, [table+B]']
+
+            (words, labels) = assemble_words(program)
+            self.assertEqual(words[:0x1000], range(0x1000))
+            self.assertEqual(labels, {'table': 0x0, 'end': 0x1000})
+
+            cpu = DCPU()
+            cpu.load_words(assemble_binary(program))
+            cpu.PC = labels['end']
+            cpu.execute_next_instruction()
+            cpu.execute_next_instruction()
+
+            self.assertEqual(cpu.registers[specs.REGISTER_NAMES['A']], 0x10)
+        finally:
+            os.remove(path)
+
+        self.assertRaises(AssemblerSyntaxError, assemble, ['.incbin'])
+
+    def test_include_binary_next_to_source(self):
+        directory = tempfile.mkdtemp()
+        f = open(os.path.join(directory, 'table.bin'), 'wb')
+        write_image([0x1, 0x2], f)
+        f.close()
+
+        try:
+            # The working directory is elsewhere, the path is taken from the source file
+            program = ['.incbin "table.bin"']
+            source = os.path.join(directory, 'program.dasm16')
+
+            self.assertEqual(assemble_words(program, path=source)[0], [0x1, 0x2])
+            self.assertEqual(assemble_with_source_map(program, source)[0], [0x1, 0x2])
+            self.assertRaises(AssemblerSyntaxError, assemble_words, program)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_assemble_binary(self):
+        program = ['SET A, 0x1000', ':loop SET PC, loop']
+
+        code = assemble_binary(program)
+        self.assertEqual(code.typecode, 'H')
+        self.assertEqual(map(hex, code), assemble(program))
+
+        self.assertRaisesRegexp(ProgramTooLarge, '65538', assemble_binary, ['SET A, 0x1000'] * 0x8001)
+
+    def test_relax(self):
+        program = [
+            '        SET A, 0x1',
+            '        SET I, 0x0',
+            ':loop   ADD I, 0x1',
+            '        JSR double',
+            '        IFG 0x4, I',
+            '        SET PC, loop',
+            '        SET PC, end',
+            ':double SHL A, 0x1',
+            '        SET PC, POP',
+        ] + ['        SET X, 0x1000'] * 10 + [
+            ':end    SET B, A',
+        ]
+
+        (words, labels) = assemble_words(program)
+        (relaxed_words, relaxed_labels) = assemble_words(program, relax=True)
+
+        self.assertEqual(labels['end'], 0x20)
+        self.assertEqual(relaxed_labels, {'loop': 0x2, 'double': 0x7, 'end': 0x1d})
+        self.assertEqual(len(words) - len(relaxed_words), 3)
+
+        # end only fits once the other references have been shortened
+        self.assertEqual(relax_instructions(read_instructions(program))[1], 3)
+
+        cpu = DCPU()
+        cpu.load_words(words)
+        cpu.run()
+        cycles = cpu.cycles_ran
+        registers = dict(cpu.registers)
+
+        cpu.load_words(relaxed_words)
+        cpu.run()
+
+        # Only PC differs, it stops past the end of the shorter program
+        registers[specs.SPECIAL_REGISTER_NAMES['PC']] -= 3
+        self.assertEqual(cpu.registers, registers)
+        self.assertEqual(cpu.registers[specs.REGISTER_NAMES['B']], 0x10)
+
+        # JSR runs 4 times, SET PC, loop 3 times and SET PC, end once
+        self.assertEqual(cycles - cpu.cycles_ran, 8)
+
+    def test_relax_without_short_labels(self):
+        program = ['SET A, 0x1000'] * 0x10 + [':far SET PC, far', 'SET PC, [far]']
+
+        self.assertEqual(assemble(program, relax=True), assemble(program))
+
+    def test_assemble_with_source_map(self):
+        program = [
+            '; comment',
+            'SET A, 0x1000',
+            ':loop SET A, B',
+            '',
+            ':table DAT 0x1, 0x2',
+            'SET PC, loop',
+        ]
+
+        (words, source_map) = assemble_with_source_map(program, 'test.dasm16', relax=True)
+
+        self.assertEqual(map(hex, words), assemble(program, relax=True))
+        self.assertEqual(source_map.size, len(words))
+        self.assertEqual(source_map.get_symbols(), {'loop': 0x2, 'table': 0x3})
+        self.assertEqual(source_map.lookup(0x1), ('test.dasm16', 2))
+        self.assertEqual(source_map.lookup(0x4), ('test.dasm16', 5))
+        self.assertEqual(source_map.describe(0x5), "test.dasm16:6 (table+2)")
+        self.assertEqual(source_map.get_line_addresses('test.dasm16', len(program)), get_line_addresses(program))
+
+    def test_get_line_addresses(self):
+        program = [
+            '; commented line',
+            'SET A, 0x1000',
+            '',
+            ':loop SET A, B',
+        ]
+
+        self.assertEqual(get_line_addresses(program), [None, 0x0, None, 0x2])
+
     def test_parse_line(self):
 
         # Test a comment
@@ -97,6 +282,11 @@ class TestAssembler(unittest.TestCase):
         self.check_parsed_instruction(ins, op_code=0x07, \
                 value_code_a=0x13, value_code_b=0x17, additional_words=[int(0x1001), int(0x1002)])
 
+        # [next word] label reference
+        ins = parse_line("SET [data], 0x0")
+        self.check_parsed_instruction(ins, op_code=0x01, \
+                value_code_a=0x1e, value_code_b=0x20, additional_words=['data'])
+
         # Non-basic instruction
         ins = parse_line("JSR 0x1000")
         self.assertTrue(ins.value_code_b is None)
@@ -0,0 +1,86 @@
+import unittest
+import os
+import shutil
+import tempfile
+from assembler.assembler import assemble
+from assembler.benchmark import (generate_source, measure, profile, get_category, save, load, compare,
+                                 InvalidBenchmarkFile)
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_generate_source(self):
+        source = generate_source(1000)
+
+        self.assertEqual(source, generate_source(1000))
+        self.assertNotEqual(source, generate_source(1000, seed=1))
+        self.assertTrue(len(source) >= 1000)
+
+        # Assembles, so every label referenced is defined
+        assemble(source)
+
+        self.assertTrue(any(line.startswith(';') for line in source))
+        self.assertTrue(any('+' in line and '[' in line for line in source))
+
+    def test_forward_references(self):
+        source = generate_source(1000)
+
+        defined = {}
+        forward = 0
+
+        for (number, line) in enumerate(source):
+            code = line.split(';')[0]
+
+            if code.startswith(':'):
+                (label, code) = code[1:].split(None, 1)
+                defined[label] = number
+
+            if 'label' in code:
+                label = 'label' + code.rsplit('label', 1)[1].strip(' ]\n')
+                forward += label not in defined
+
+        self.assertTrue(forward > 0)
+
+    def test_measure(self):
+        result = measure(500, repeats=1)
+
+        self.assertEqual(result['words'], len(assemble(generate_source(500))))
+        self.assertTrue(result['lines_per_second'] > 0)
+        self.assertTrue(result['output_bytes'] > result['words'])
+
+    def test_profile(self):
+        shares = profile(500)
+
+        self.assertAlmostEqual(sum(shares.values()), 1.0)
+        self.assertTrue(shares["line parsing"] > 0)
+        self.assertTrue(shares["regular expressions"] > 0)
+
+    def test_category(self):
+        self.assertEqual(get_category('assembler/assembler.py', '__init__'), "instruction building")
+        self.assertEqual(get_category('json/decoder.py', '__init__'), "other")
+
+    def test_compare(self):
+        path = os.path.join(self.directory, 'baseline.json')
+        save({'version': 1, 'results': [{'lines': 10, 'lines_per_second': 200.0},
+                                         {'lines': 20, 'lines_per_second': 100.0}]}, path)
+
+        results = {'version': 1, 'results': [{'lines': 10, 'lines_per_second': 150.0},
+                                             {'lines': 30, 'lines_per_second': 100.0}]}
+
+        self.assertEqual(compare(results, load(path)), [(10, -0.25)])
+
+    def test_load_invalid(self):
+        path = os.path.join(self.directory, 'baseline.json')
+        f = open(path, 'w')
+        f.write('not json')
+        f.close()
+
+        self.assertRaises(InvalidBenchmarkFile, load, path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from assembler.assembler import assemble_binary
+from assembler.cache import AssemblyCache, ASSEMBLER_MODULES
+from simulator import specifications
+
+PROGRAM = [
+    'SET A, 0x30',
+    ':loop SET PC, loop',
+]
+
+class TestAssemblyCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = AssemblyCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_entries(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_assemble(self):
+        (words, symbols) = self.cache.assemble(PROGRAM)
+
+        self.assertEqual(words, assemble_binary(PROGRAM))
+        self.assertEqual(symbols, {'loop': 0x2})
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+        self.assertEqual(self.cache.assemble(PROGRAM), (words, symbols))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        # A new cache, as in a later run
+        cache = AssemblyCache(self.directory)
+        self.assertEqual(cache.assemble(PROGRAM), (words, symbols))
+        self.assertEqual(cache.hits, 1)
+
+    def test_key(self):
+        key = self.cache.get_key(PROGRAM)
+
+        self.assertEqual(key, self.cache.get_key(list(PROGRAM)))
+        self.assertNotEqual(key, self.cache.get_key(PROGRAM + ['SET B, A']))
+        self.assertNotEqual(key, self.cache.get_key(PROGRAM, relax=True))
+
+    def test_changed_source(self):
+        self.cache.assemble(PROGRAM)
+        (words, symbols) = self.cache.assemble(['SET B, 0x1'] + PROGRAM)
+
+        self.assertEqual(words, assemble_binary(['SET B, 0x1'] + PROGRAM))
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(len(self.get_entries()), 2)
+
+    def test_invalid_entry(self):
+        self.cache.assemble(PROGRAM)
+
+        f = open(os.path.join(self.directory, self.get_entries()[0]), 'w')
+        f.write('not json')
+        f.close()
+
+        self.assertEqual(self.cache.assemble(PROGRAM)[0], assemble_binary(PROGRAM))
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(self.cache.assemble(PROGRAM)[0], assemble_binary(PROGRAM))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_damaged_entries(self):
+        self.cache.assemble(PROGRAM)
+        path = os.path.join(self.directory, self.get_entries()[0])
+
+        for data in ['[]', '{"version": 1}', '{"version": 1, "words": "zz", "symbols": {}}',
+                     '{"version": 1, "words": "123456", "symbols": {}}',
+                     '{"version": 1, "words": "1234", "symbols": []}']:
+            f = open(path, 'w')
+            f.write(data)
+            f.close()
+
+            self.assertEqual(self.cache.load(self.cache.get_key(PROGRAM)), None)
+
+    def test_tables_in_version(self):
+        self.assertTrue(specifications in ASSEMBLER_MODULES)
+
+    def test_evict_least_recently_used(self):
+        programs = [['SET A, %#x' % value] + PROGRAM for value in xrange(3)]
+
+        self.cache.assemble(programs[0])
+        size = os.path.getsize(os.path.join(self.directory, self.get_entries()[0]))
+        self.cache.max_size = size * 2
+
+        self.cache.assemble(programs[1])
+
+        # Using the first program makes the second the least recently used
+        past = time.time() - 10
+        os.utime(self.cache.get_path(self.cache.get_key(programs[1])), (past, past))
+        self.cache.assemble(programs[0])
+        self.cache.assemble(programs[2])
+
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertFalse(os.path.exists(self.cache.get_path(self.cache.get_key(programs[1]))))
+        self.assertTrue(os.path.exists(self.cache.get_path(self.cache.get_key(programs[0]))))
+
+    def test_include_binary_not_cached(self):
+        path = os.path.join(self.directory, 'data.bin')
+        f = open(path, 'wb')
+        f.write('\x12\x34')
+        f.close()
+
+        program = ['.incbin "%s"' % path]
+        (words, symbols) = self.cache.assemble(program)
+
+        self.assertEqual(list(words), [0x1234])
+        self.assertEqual(self.get_entries(), ['data.bin'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import random
+import glob
+import os
+from simulator import specifications as specs
+from assembler.assembler import assemble
+from assembler.disassembler import Disassembler, disassemble, read_image
+
+class TestDisassembler(unittest.TestCase):
+
+    def test_round_trip_examples(self):
+        path = os.path.join(os.path.dirname(__file__), "../../examples/")
+
+        for machine_file in glob.glob(os.path.join(path, '*.' + specs.MACHINE_FILE_EXT)):
+            words = read_image(machine_file)
+
+            code = assemble(list(disassemble(words)))
+            self.assertEqual([int(word, 16) for word in code], list(words),
+                    "Disassembly of %s did not reassemble to the same words" % machine_file)
+
+    def test_round_trip_random_words(self):
+        generator = random.Random(0x10c)
+
+        words = [generator.randint(0x0, 0xffff) for _ in range(4096)]
+
+        code = assemble(list(disassemble(words)))
+        self.assertEqual([int(word, 16) for word in code], words)
+
+    def test_disassemble(self):
+        program = [
+            ':start SET [0x1000+A], 0x1f',
+            'JSR sub',
+            'SET PC, start',
+            ':sub SET A, [B]',
+            'SET PC, POP',
+        ]
+
+        words = [int(word, 16) for word in assemble(program)]
+
+        self.assertEqual(list(disassemble(words)), [
+            ":loc_0000     SET [0x1000+A], 0x1f",
+            "              JSR sub_0006",
+            "              SET PC, loc_0000",
+            ":sub_0006     SET A, [B]",
+            "              SET PC, POP",
+        ])
+
+    def test_invalid_words(self):
+        # Unknown non-basic op, then a SET missing its next word
+        self.assertEqual(list(disassemble([0x0, 0x0020, 0x7c01])), [
+            "              DAT 0x0",
+            "              DAT 0x20",
+            "              DAT 0x7c01",
+        ])
+
+    def test_invalid_words_reassemble(self):
+        words = [0x7c01, 0x1000, 0x0, 0x0020, 0x8401, 0x7c01]
+
+        self.assertEqual(assemble(disassemble(words)), map(hex, words))
+
+    def test_round_trip_labels_to_data(self):
+        programs = [
+            ['SET A, tbl', 'DAT 0x7c01', ':tbl DAT 5'],
+            ['SET A, tbl', ':tbl DAT 0x7c01, 0x5'],
+            ['SET [tbl], tbl', 'SET PC, tbl', ':tbl DAT 0x1, 0x2'],
+            ['JSR sub', ':sub SET A, 0x20', 'SET PC, POP'],
+        ]
+
+        for program in programs:
+            words = [int(word, 16) for word in assemble(program)]
+            self.assertEqual([int(word, 16) for word in assemble(list(disassemble(words)))], words,
+                             "Disassembly of %r did not reassemble to the same words" % program)
+
+        for words in ([0x7c01, 0x0003], [0x7c01, 0x3, 0x7c01, 0x5], [0x7c12, 0x1, 0x0]):
+            self.assertEqual([int(word, 16) for word in assemble(list(disassemble(words)))], words)
+
+    def test_shortened_literal_as_data(self):
+        self.assertEqual(list(disassemble([0x7c01, 0x3, 0x7c01, 0x5])), [
+            "              DAT 0x7c01, 0x3",
+            "              DAT 0x7c01, 0x5",
+        ])
+
+    def test_decode_cache(self):
+        disassembler = Disassembler()
+        list(disassembler.disassemble([0x8401] * 100))
+
+        self.assertEqual(disassembler.cache.keys(), [0x8401])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import os
+import shutil
+import tempfile
+from assembler.assembler import assemble, InvalidValueReference, AssemblerSyntaxError
+from assembler.incremental import IncrementalAssembler
+
+PROGRAM = [
+    'JSR end',
+    ':loop SET A, B',
+    '; comment',
+    'IFN A, 0x10',
+    'SET PC, loop',
+    ':end SET PC, end',
+]
+
+class TestIncrementalAssembler(unittest.TestCase):
+
+    def setUp(self):
+        self.assembler = IncrementalAssembler()
+
+    def assert_assembled(self, program):
+        words = self.assembler.assemble(program)
+        self.assertEqual(map(hex, words), assemble(program))
+
+    def test_initial_assembly(self):
+        self.assert_assembled(PROGRAM)
+        self.assertEqual(len(self.assembler.changes), 8)
+        self.assertEqual(self.assembler.labels, {'loop': 0x2, 'end': 0x6})
+
+    def test_unchanged(self):
+        self.assert_assembled(PROGRAM)
+        self.assert_assembled(list(PROGRAM))
+        self.assertEqual(self.assembler.changes, [])
+
+    def test_edit_shifting_labels(self):
+        self.assert_assembled(PROGRAM)
+
+        program = list(PROGRAM)
+        program[3] = 'IFN A, 0x1000'
+        self.assert_assembled(program)
+
+        # The JSR target before the edit is patched, the first three words are unchanged
+        self.assertEqual(self.assembler.changes[0], (0x1, 0x7))
+        self.assertTrue(all(address > 0x2 for (address, _) in self.assembler.changes[1:]))
+
+    def test_edit_without_shift(self):
+        self.assert_assembled(PROGRAM)
+
+        program = list(PROGRAM)
+        program[3] = 'IFN A, 0x11'
+        self.assert_assembled(program)
+        self.assertEqual(len(self.assembler.changes), 1)
+
+    def test_insert_and_remove(self):
+        self.assert_assembled(PROGRAM)
+        self.assert_assembled(PROGRAM + ['SET A, 0x1000'])
+        self.assert_assembled(PROGRAM[:1] + PROGRAM[5:])
+        self.assert_assembled(['SET X, 0x4'] + PROGRAM)
+
+    def test_data(self):
+        program = PROGRAM + [':table DAT "abc", loop, table']
+        self.assert_assembled(program)
+
+        program[1] = ':loop SET A, 0x1000'
+        self.assert_assembled(program)
+
+    def test_include_binary_reread(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'data.bin')
+
+        try:
+            program = PROGRAM + [':table .incbin "%s"' % path, 'SET A, [table]']
+
+            for data in ['\x12\x34', '\x56\x78', '\x56\x78\x9a\xbc']:
+                f = open(path, 'wb')
+                f.write(data)
+                f.close()
+
+                self.assert_assembled(program)
+
+            self.assertEqual(self.assembler.changes, [(0x9, 0x9abc), (0xa, 0x7801), (0xb, 0x8)])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_duplicate_labels(self):
+        program = [':a SET A, 1', ':a SET A, 2', 'SET PC, a']
+        self.assert_assembled(program)
+        self.assert_assembled(program[:1] + ['SET A, 2', 'SET PC, a'])
+
+    def test_errors_keep_state(self):
+        self.assert_assembled(PROGRAM)
+
+        self.assertRaises(InvalidValueReference, self.assembler.assemble, PROGRAM[:-1])
+        self.assertRaises(AssemblerSyntaxError, self.assembler.assemble, PROGRAM + ['SET A,'])
+
+        self.assert_assembled(PROGRAM)
+        self.assertEqual(self.assembler.changes, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import os
+import shutil
+import tempfile
+from assembler.assembler import assemble, InvalidValueReference
+from assembler.linker import (ObjectFile, assemble_object, link, build, get_object_path,
+                              AmbiguousSymbol, InvalidObjectFile)
+
+MAIN = [
+    'JSR double',
+    ':loop SET PC, loop',
+]
+
+LIBRARY = [
+    ':double SHL A, 1',
+    ':loop SET PC, POP',
+]
+
+class TestLinker(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_source(self, name, lines):
+        path = os.path.join(self.directory, name)
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        f = open(path, 'w')
+        f.write("\n".join(lines) + "\n")
+        f.close()
+
+        return path
+
+    def test_assemble_object(self):
+        obj = assemble_object(MAIN)
+
+        self.assertEqual(list(obj.words), [0x7c10, 0x0, 0x7dc1, 0x0])
+        self.assertEqual(obj.symbols, {'loop': 0x2})
+        self.assertEqual(obj.relocations, [(0x1, 'double'), (0x3, 'loop')])
+
+    def test_link_single_module(self):
+        program = MAIN + LIBRARY[:1]
+        (words, symbols) = link([assemble_object(program)])
+
+        self.assertEqual(map(hex, words), assemble(program))
+        self.assertEqual(symbols, {'loop': 0x2, 'double': 0x4})
+
+    def test_link_modules(self):
+        (words, symbols) = link([assemble_object(MAIN), assemble_object(LIBRARY)])
+
+        # Each module's loop refers to its own label
+        self.assertEqual(list(words), [0x7c10, 0x4, 0x7dc1, 0x2, 0x8407, 0x61c1])
+        self.assertEqual(symbols, {'double': 0x4})
+
+    def test_link_data(self):
+        (words, symbols) = link([assemble_object(['SET A, [pointer]', 'SET PC, double']),
+                                 assemble_object([':pointer DAT double', ':double SHL A, 0x1'])])
+
+        self.assertEqual(list(words), [0x7801, 0x4, 0x7dc1, 0x5, 0x5, 0x8407])
+
+    def test_link_errors(self):
+        self.assertRaisesRegexp(InvalidValueReference, 'double', link, [assemble_object(MAIN)])
+
+        self.assertRaisesRegexp(AmbiguousSymbol, 'loop', link,
+                [assemble_object(['SET PC, loop']), assemble_object(MAIN), assemble_object(LIBRARY)])
+
+    def test_save_and_load(self):
+        obj = assemble_object(MAIN)
+        path = os.path.join(self.directory, 'main.dobj')
+        obj.save(path)
+
+        loaded = ObjectFile.load(path)
+        self.assertEqual(loaded.words, obj.words)
+        self.assertEqual(loaded.symbols, obj.symbols)
+        self.assertEqual(loaded.relocations, obj.relocations)
+        self.assertEqual(loaded.source_hash, obj.source_hash)
+
+        f = open(path, 'w')
+        f.write('foo')
+        f.close()
+
+        self.assertRaises(InvalidObjectFile, ObjectFile.load, path)
+
+    def test_build(self):
+        sources = [self.write_source('main.dasm16', MAIN), self.write_source('library.dasm16', LIBRARY)]
+        object_dir = os.path.join(self.directory, 'build')
+
+        (words, _) = build(sources, object_dir, processes=2)
+        self.assertEqual(list(words), [0x7c10, 0x4, 0x7dc1, 0x2, 0x8407, 0x61c1])
+
+        # Unchanged modules are not reassembled
+        library_object = get_object_path(sources[1], object_dir)
+        os.utime(library_object, (0, 0))
+
+        self.write_source('main.dasm16', ['SET A, 1'] + MAIN)
+        (words, _) = build(sources, object_dir)
+
+        self.assertEqual(os.path.getmtime(library_object), 0)
+        self.assertEqual(list(words), [0x8401, 0x7c10, 0x5, 0x7dc1, 0x3, 0x8407, 0x61c1])
+
+    def test_build_same_names(self):
+        sources = [self.write_source('main.dasm16', ['JSR double', 'JSR helper']),
+                   self.write_source(os.path.join('a', 'util.dasm16'), LIBRARY),
+                   self.write_source(os.path.join('b', 'util.dasm16'), [':helper SET PC, POP'])]
+        object_dir = os.path.join(self.directory, 'build')
+
+        self.assertNotEqual(get_object_path(sources[1], object_dir), get_object_path(sources[2], object_dir))
+
+        (words, symbols) = build(sources, object_dir, processes=2)
+
+        self.assertEqual(list(words), [0x7c10, 0x4, 0x7c10, 0x6, 0x8407, 0x61c1, 0x61c1])
+        self.assertEqual(symbols['helper'], 0x6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from simulator import specifications as specs
+from simulator.dcpu import DCPU
+from assembler.assembler import assemble, assemble_words, get_labels, read_instructions
+from assembler.peephole import PeepholeOptimizer, optimize
+
+PROGRAM = [
+    '        SET A, 0x1',
+    '        SET B, B',
+    '        SET C, 0x5',
+    '        SET C, 0x3',
+    ':loop   ADD A, 0x0',
+    '        MUL A, 0x2',
+    '        XOR A, 0x0',
+    '        SET PUSH, A',
+    '        SET [0x1000], POP',
+    '        SET PUSH, B',
+    '        SET B, POP',
+    '        SUB C, 0x1',
+    '        IFN C, 0x0',
+    '        SET PC, loop',
+    '        SET PC, next',
+    ':next   SET X, [0x1000]',
+    '        SET [0x1001], O',
+]
+
+class TestPeephole(unittest.TestCase):
+
+    def assert_optimized(self, program, expected, rules=None):
+        instructions = optimize(read_instructions(program), rules)[0]
+        words = [word for ins in instructions for word in ins.get_words(get_labels(instructions))]
+
+        self.assertEqual(map(hex, words), assemble(expected))
+
+    def test_self_assignment(self):
+        self.assert_optimized(['SET A, A', 'SET [0x10], [0x10]', 'SET B, A'], ['SET B, A'])
+        self.assert_optimized(['SET POP, POP', 'SET [0x10], [0x11]'], ['SET POP, POP', 'SET [0x10], [0x11]'])
+
+    def test_identity(self):
+        self.assert_optimized(['XOR A, 0x0', 'AND B, 0xffff', 'SET C, A'], ['SET C, A'])
+
+        # O is overwritten by the ADD before it is read
+        self.assert_optimized(['ADD A, 0x0', 'SET B, A', 'ADD B, 0x1'], ['SET B, A', 'ADD B, 0x1'])
+
+        # O is read, or may be after the jump
+        self.assert_optimized(['ADD A, 0x0', 'SET B, O'], ['ADD A, 0x0', 'SET B, O'])
+        self.assert_optimized(['MUL A, 0x1', 'SET PC, 0x0'], ['MUL A, 0x1', 'SET PC, 0x0'])
+
+    def test_jump_to_next(self):
+        self.assert_optimized(['SET PC, next', ':next SET A, B'], [':next SET A, B'])
+        self.assert_optimized(['SET PC, next', ':next SET A, B', ':next SET B, A'],
+                              ['SET PC, next', ':next SET A, B', ':next SET B, A'])
+
+    def test_overwritten_set(self):
+        self.assert_optimized(['SET A, 0x1', 'SET A, B'], ['SET A, B'])
+        self.assert_optimized(['SET A, 0x1', 'SET A, [A]'], ['SET A, 0x1', 'SET A, [A]'])
+        self.assert_optimized(['SET A, POP', 'SET A, B'], ['SET A, POP', 'SET A, B'])
+
+    def test_push_pop(self):
+        self.assert_optimized(['SET PUSH, A', 'SET B, POP'], ['SET B, A'])
+        self.assert_optimized(['SET PUSH, A', 'SET A, POP'], [])
+        self.assert_optimized(['SET PUSH, SP', 'SET A, POP'], ['SET PUSH, SP', 'SET A, POP'])
+
+    def test_not_after_if(self):
+        self.assert_optimized(['IFE A, B', 'SET A, A', 'SET C, 0x1'], ['IFE A, B', 'SET A, A', 'SET C, 0x1'])
+
+    def test_labels_kept(self):
+        self.assert_optimized([':start SET A, A', 'SET PC, start'], [':start SET PC, start'])
+        self.assert_optimized([':a SET A, A', ':b SET PC, a'], [':a SET A, A', ':b SET PC, a'])
+        self.assert_optimized(['SET PUSH, A', ':b SET B, POP'], ['SET PUSH, A', ':b SET B, POP'])
+
+    def test_input_unchanged(self):
+        instructions = read_instructions([':start SET A, A', ':loop SET C, 0x5', 'SET C, 0x3', 'SET PC, start'])
+        labels = [instruction.label for instruction in instructions]
+        words = [instruction.words for instruction in instructions]
+
+        optimize(instructions)
+
+        self.assertEqual([instruction.label for instruction in instructions], labels)
+        self.assertEqual([instruction.words for instruction in instructions], words)
+
+    def test_rules(self):
+        self.assert_optimized(['SET A, A', 'XOR A, 0x0'], ['XOR A, 0x0'], rules=['self_assignment'])
+
+    def test_report(self):
+        optimizer = PeepholeOptimizer()
+        optimizer.optimize(read_instructions(['SET A, A', 'SET PUSH, 0x1000', 'SET B, POP']))
+
+        self.assertEqual(optimizer.rewrites['self_assignment'], 1)
+        self.assertEqual(optimizer.rewrites['push_pop'], 1)
+
+        # SET A, A takes 2 cycles, SET PUSH, 0x1000 and SET B, POP take 5 against 3 for SET B, 0x1000
+        self.assertEqual(optimizer.cycles_saved, 4)
+
+    def test_differential_execution(self):
+        words = assemble_words(PROGRAM)[0]
+
+        (instructions, cycles_saved) = optimize(read_instructions(PROGRAM))
+        labels = get_labels(instructions)
+        optimized_words = [word for ins in instructions for word in ins.get_words(labels)]
+
+        self.assertTrue(len(optimized_words) < len(words))
+
+        cpu = DCPU()
+        cpu.load_words(words)
+        cpu.run()
+        cycles = cpu.cycles_ran
+        registers = get_registers(cpu)
+        data = [cpu.RAM[address] for address in (0x1000, 0x1001)]
+
+        cpu.load_words(optimized_words)
+        cpu.run()
+
+        self.assertEqual(get_registers(cpu), registers)
+        self.assertEqual([cpu.RAM[address] for address in (0x1000, 0x1001)], data)
+        self.assertEqual(cpu.registers[specs.REGISTER_NAMES['A']], 0x8)
+
+        # The estimate counts each rewrite once, rewrites in the loop save more
+        self.assertTrue(cycles - cpu.cycles_ran >= cycles_saved)
+
+def get_registers(cpu):
+    '''
+    Values of every register but PC, which differs between programs of different lengths
+    '''
+
+    return [cpu.registers[code] for code in sorted(specs.REGISTERS.keys() + specs.SPECIAL_REGISTERS.keys())
+            if code != specs.SPECIAL_REGISTER_NAMES['PC']]
@@ -0,0 +1,66 @@
+import unittest
+import glob
+import os
+from StringIO import StringIO
+from simulator import specifications as specs
+from assembler.assembler import assemble, InvalidValueReference, AssemblerSyntaxError
+from assembler.stream import assemble_stream, ListWriter, BinaryFileWriter, HexFileWriter
+
+PROGRAM = [
+    'JSR end',
+    ':loop SET A, B',
+    'IFN A, 0x10',
+    'SET PC, loop',
+    ':end SET PC, end',
+]
+
+class TestStream(unittest.TestCase):
+
+    def test_assemble_examples(self):
+        path = os.path.join(os.path.dirname(__file__), "../../examples/")
+
+        for assembly_file in glob.glob(os.path.join(path, '*.' + specs.ASSEMBLER_FILE_EXT)):
+            f = open(assembly_file)
+            program = f.readlines()
+            f.close()
+
+            writer = ListWriter()
+            f = open(assembly_file)
+            assemble_stream(f, writer)
+            f.close()
+
+            self.assertEqual(map(hex, writer.words), assemble(program))
+
+    def test_forward_references(self):
+        writer = ListWriter()
+        labels = assemble_stream(PROGRAM, writer)
+
+        self.assertEqual(map(hex, writer.words), assemble(PROGRAM))
+        self.assertEqual(labels, {'loop': 0x2, 'end': 0x6})
+
+        self.assertRaisesRegexp(InvalidValueReference, 'foo', assemble_stream, ['JSR foo'], ListWriter())
+        self.assertRaises(AssemblerSyntaxError, assemble_stream, ['SET A,'], ListWriter())
+
+    def test_data(self):
+        program = ['SET A, [table]', 'DAT "hi", table', ':table DAT 0x1234, table']
+
+        writer = ListWriter()
+        assemble_stream(program, writer)
+        self.assertEqual(map(hex, writer.words), assemble(program))
+
+    def test_binary_file_writer(self):
+        output = StringIO()
+        assemble_stream(PROGRAM, BinaryFileWriter(output))
+
+        self.assertEqual(output.getvalue()[:4], '\x7c\x10\x00\x06')
+        self.assertEqual(len(output.getvalue()), 16)
+
+    def test_hex_file_writer(self):
+        output = StringIO()
+        assemble_stream(PROGRAM, HexFileWriter(output))
+
+        words = [int(line, 16) for line in output.getvalue().splitlines()]
+        self.assertEqual(map(hex, words), assemble(PROGRAM))
+
+if __name__ == '__main__':
+    unittest.main()
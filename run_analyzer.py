@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+
+from simulator import specifications
+from simulator.cfg import ControlFlowGraph
+from simulator.image import read_image
+from simulator.sourcemap import SourceMap
+from assembler import assembler
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def load_program(path, source_map=None):
+    '''
+    Returns the machine code in path and its source map, assembling
+    it first if it contains assembler instructions
+    '''
+
+    if os.path.splitext(path)[1] == '.' + specifications.ASSEMBLER_FILE_EXT:
+        return assembler.assemble_with_source_map(read_program(path), path)
+
+    return (read_image(path), SourceMap.load(source_map) if source_map else SourceMap())
+
+def get_name(address, source_map):
+    label = source_map.get_label(address)
+
+    if label is None or label[1]:
+        return "%#06x" % address
+
+    return "%s (%#06x)" % (label[0], address)
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Estimate the cycles taken by each subroutine of a program without running it')
+
+    parser.add_argument('program', help='the file containing the assembler instructions or machine code to be analyzed')
+    parser.add_argument('--source-map', metavar='FILE', help='the source map saved when assembling the machine code')
+    parser.add_argument('--max-cycles', type=int, default=None, help='exit with an error if a worst case is above this many cycles')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+    (words, source_map) = load_program(args.program, args.source_map)
+
+    graph = ControlFlowGraph(words)
+    over_budget = []
+
+    print "%-32s %10s %7s" % ("subroutine", "worst case", "blocks")
+
+    for (entry, subroutine) in sorted(graph.subroutines.iteritems()):
+        notes = []
+        if subroutine.is_recursive:
+            notes.append("recursive")
+        if subroutine.has_indirect_flow:
+            notes.append("indirect jumps or calls not counted")
+
+        worst_case = subroutine.worst_case_cycles
+
+        print ("%-32s %10s %7d  %s" % (get_name(entry, source_map), worst_case if worst_case is not None else "-",
+                                       len(subroutine.blocks), ", ".join(notes))).rstrip()
+
+        for loop in sorted(subroutine.loops, key=lambda loop: loop.header):
+            print "%sloop at %s: %s cycles per iteration%s" % (
+                    "  " * loop.depth, get_name(loop.header, source_map), loop.iteration_cycles,
+                    "" if loop.has_exit else ", never exits")
+
+        if args.max_cycles is not None and worst_case > args.max_cycles:
+            over_budget.append(entry)
+
+    if over_budget:
+        print >> sys.stderr, "Worst case above %d cycles: %s" % (
+                args.max_cycles, ", ".join(get_name(entry, source_map) for entry in over_budget))
+        sys.exit(1)
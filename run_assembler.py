@@ -1,6 +1,20 @@
 import argparse
+import os
+import sys
+import time
 from simulator import specifications as specs
+from simulator.image import write_image
 from assembler import assembler
+from assembler.incremental import IncrementalAssembler
+from assembler.peephole import PeepholeOptimizer
+from assembler.stream import assemble_stream, BinaryFileWriter, HexFileWriter
+
+WATCH_INTERVAL = 0.1
+
+WRITERS = {
+    'bin': BinaryFileWriter,
+    'hex': HexFileWriter,
+}
 
 def read_program(program):
     f = open(program)
@@ -13,11 +27,124 @@ def get_args():
     parser = argparse.ArgumentParser(description='Assemble the given code')
 
     parser.add_argument('program', help='the file containing the code to be assembled')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='hex', help='output one hex word per line or raw big-endian 16-bit words')
+    parser.add_argument('--output', metavar='FILE', help='stream the machine code into FILE instead of printing it')
+    parser.add_argument('--watch', action='store_true', help='reassemble into the --output file whenever the program changes')
+    parser.add_argument('--relax', action='store_true', help='encode references to labels at 0x1f or below as short literals')
+    parser.add_argument('--optimize', action='store_true', help='apply peephole optimizations to the instructions')
+    parser.add_argument('--source-map', metavar='FILE', help='save the mapping of addresses to source lines and labels in FILE')
     parser.add_argument('--version', action='version', version='DCPU v%s' % specs.DCPU_VERSION)
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.watch and not args.output:
+        parser.error('--watch requires --output')
+
+    if args.watch and (args.relax or args.optimize or args.source_map):
+        parser.error('--relax, --optimize and --source-map can not be used with --watch')
+
+    return args
+
+def assemble(path, relax=False, optimize=False, source_map=None):
+    '''
+    Assembles the program in path with the requested optimizations, reporting
+    the savings, and saves its source map to the source_map file if given
+    '''
+
+    instructions = assembler.read_instructions(read_program(path), path)
+
+    if optimize:
+        optimizer = PeepholeOptimizer()
+        instructions = optimizer.optimize(instructions)
+
+        print >> sys.stderr, "Applied %d peephole rewrites (%s), saving about %d cycles" % (
+                sum(optimizer.rewrites.values()),
+                ", ".join("%s: %d" % rewrite for rewrite in sorted(optimizer.rewrites.iteritems())),
+                optimizer.cycles_saved)
+
+    if relax:
+        (labels, shortened) = assembler.relax_instructions(instructions)
+
+        print >> sys.stderr, "Shortened %d label operands, saving %d words and a cycle each time one is executed" % (
+                shortened, shortened)
+    else:
+        labels = assembler.get_labels(instructions)
+
+    if source_map:
+        assembler.get_source_map(instructions, labels, path).save(source_map)
+
+    return assembler.get_words(instructions, labels)
+
+def watch(program, writer):
+    '''
+    Reassembles program each time it is modified, rewriting only
+    the words of the output that changed
+    '''
+
+    incremental = IncrementalAssembler(program)
+    modified = None
+
+    while True:
+        if os.stat(program).st_mtime != modified:
+            modified = os.stat(program).st_mtime
+            start = time.time()
+
+            try:
+                words = incremental.assemble(read_program(program))
+            except (assembler.AssemblerSyntaxError, assembler.InvalidValueReference), e:
+                print e
+                continue
+
+            for (address, word) in incremental.changes:
+                writer.patch(address, word)
+
+            writer.truncate(len(words))
+            writer.f.flush()
+
+            print "Assembled %d words in %.1fms, %d changed" % (
+                    len(words), 1000 * (time.time() - start), len(incremental.changes))
+
+        time.sleep(WATCH_INTERVAL)
 
 if __name__ == '__main__':
 
     args = get_args()
-    print "\n".join(assembler.assemble(read_program(args.program)))
+
+    if args.watch:
+        try:
+            watch(args.program, WRITERS[args.format](open(args.output, 'wb')))
+        except KeyboardInterrupt:
+            pass
+
+    elif args.relax or args.optimize or args.source_map:
+        words = assemble(args.program, args.relax, args.optimize, args.source_map)
+
+        if args.output:
+            output = open(args.output, 'wb')
+            writer = WRITERS[args.format](output)
+
+            for word in words:
+                writer.write(word)
+
+            output.close()
+
+        elif args.format == 'bin':
+            write_image(words, sys.stdout)
+
+        else:
+            print "\n".join(map(hex, words))
+
+    elif args.output:
+        source = open(args.program)
+        output = open(args.output, 'wb')
+
+        assemble_stream(source, WRITERS[args.format](output), args.program)
+
+        output.close()
+        source.close()
+
+    elif args.format == 'bin':
+        write_image(assembler.assemble_binary(read_program(args.program), path=args.program), sys.stdout)
+
+    else:
+        print "\n".join(assembler.assemble(read_program(args.program), path=args.program))
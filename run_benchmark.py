@@ -0,0 +1,54 @@
+import argparse
+import sys
+
+from simulator import specifications
+from assembler import benchmark
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Measure how fast the assembler assembles generated programs of different sizes')
+
+    parser.add_argument('--lines', type=int, nargs='+', default=benchmark.DEFAULT_SIZES, help='the sizes of the programs to generate')
+    parser.add_argument('--repeats', type=int, default=3, help='assemble each program this many times and keep the best')
+    parser.add_argument('--seed', type=int, default=0x10c, help='the seed the programs are generated from')
+    parser.add_argument('--output', metavar='FILE', help='save the results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against results saved with --output')
+    parser.add_argument('--max-slowdown', type=float, default=None, metavar='PERCENT',
+                        help='exit with an error if any size is this much slower than the baseline')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+    results = benchmark.run(args.lines, args.repeats, args.seed)
+
+    print "%10s %10s %12s %10s %10s" % ("lines", "seconds", "lines/sec", "peak KB", "words")
+
+    for result in results['results']:
+        print "%10d %10.3f %12d %10d %10d" % (result['lines'], result['seconds'], result['lines_per_second'] or 0,
+                                              result['peak_memory_kb'], result['words'])
+
+    print
+    print "Where assembling %d lines spends its time:" % min(args.lines)
+
+    for (category, share) in sorted(results['profile'].iteritems(), key=lambda total: -total[1]):
+        print "%6.1f%%  %s" % (share * 100, category)
+
+    if args.output:
+        benchmark.save(results, args.output)
+
+    if args.baseline:
+        slower = []
+
+        print
+        for (lines, change) in benchmark.compare(results, benchmark.load(args.baseline)):
+            print "%10d lines: %+.1f%% lines/sec against the baseline" % (lines, change * 100)
+
+            if args.max_slowdown is not None and -change * 100 > args.max_slowdown:
+                slower.append(lines)
+
+        if slower:
+            print >> sys.stderr, "More than %.1f%% slower than the baseline for: %s lines" % (
+                    args.max_slowdown, ", ".join(str(lines) for lines in slower))
+            sys.exit(1)
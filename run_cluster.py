@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import sys
+
+from simulator import specifications
+from simulator.cluster import Cluster, WorkerDied, MAILBOX_ADDRESS
+from simulator.image import read_image
+from assembler import assembler
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def load_program(path):
+    if os.path.splitext(path)[1] == '.' + specifications.ASSEMBLER_FILE_EXT:
+        return assembler.assemble_binary(read_program(path), path=path)
+
+    return read_image(path)
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Run a cluster of DCPUs talking to each other through mailboxes mapped at %#x' % MAILBOX_ADDRESS)
+
+    parser.add_argument('programs', nargs='+', help='the assembler or machine code file each CPU runs')
+    parser.add_argument('--cpus', type=int, default=None, help='run this many CPUs, going round the programs given')
+    parser.add_argument('--quantum', type=int, default=1000, help='the cycles CPUs run between picking up the words sent to them')
+    parser.add_argument('--max-cycles', type=int, default=1000000, help='stop each CPU after this many cycles')
+    parser.add_argument('--relaxed', action='store_true', help="don't keep the CPUs in step, faster but results depend on scheduling")
+    parser.add_argument('--stats', action='store_true', help='print the run counters of each CPU as JSON on stderr when done')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    programs = [load_program(program) for program in args.programs]
+    count = args.cpus or len(programs)
+
+    cluster = Cluster([programs[number % len(programs)] for number in xrange(count)],
+                      args.quantum, args.max_cycles, not args.relaxed)
+
+    try:
+        cluster.run()
+    except WorkerDied, e:
+        print >> sys.stderr, e
+        sys.exit(1)
+
+    for (number, cpu) in enumerate(cluster.cpus):
+        (sent, dropped, received) = cluster.messages[number]
+
+        print
+        print "--------------------------"
+        print "DCPU %d State after execution" % number
+        print "--------------------------"
+
+        if number in cluster.errors:
+            print "*****Stopped on %s*****" % cluster.errors[number]
+
+        print "Sent %d words, dropped %d, received %d" % (sent, dropped, received)
+        print cpu
+
+    if args.stats:
+        print >> sys.stderr, json.dumps([cpu.get_stats() for cpu in cluster.cpus], indent=2, sort_keys=True)
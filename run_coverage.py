@@ -0,0 +1,48 @@
+import argparse
+import os
+
+from simulator import DCPU, specifications
+from simulator.coverage import Coverage
+from assembler import assembler
+
+# Programs usually end in a loop, so a run is cut short at this many
+# instructions unless it stops or jumps to itself first
+DEFAULT_MAX_INSTRUCTIONS = 1000000
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Run a program and report which instructions were executed')
+
+    parser.add_argument('program', help='the file containing the assembler instructions to be run')
+    parser.add_argument('--max-instructions', type=int, default=DEFAULT_MAX_INSTRUCTIONS, help='stop after this many instructions')
+    parser.add_argument('--merge', metavar='FILE', help='combine the coverage with the bitmaps stored in FILE and save it there')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+    source = read_program(args.program)
+
+    (words, source_map) = assembler.assemble_with_source_map(source, args.program)
+
+    cpu = DCPU()
+    cpu.load_words(words)
+
+    coverage = Coverage()
+    coverage.run(cpu, args.max_instructions)
+
+    if args.merge:
+        if os.path.exists(args.merge):
+            coverage.merge(Coverage.load(args.merge))
+
+        coverage.save(args.merge)
+
+    print "\n".join(coverage.annotate(source, source_map.get_line_addresses(args.program, len(source))))
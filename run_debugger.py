@@ -0,0 +1,51 @@
+import argparse
+import os
+
+from simulator import DCPU, specifications
+from simulator.debugger import Debugger, DebuggerShell
+from simulator.history import History
+from assembler import assembler
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def load_program(cpu, program):
+    '''
+    Loads the given file into cpu, assembling it first if it contains
+    assembler instructions, and returns its symbols and source map
+    '''
+
+    lines = read_program(program)
+
+    if os.path.splitext(program)[1] == '.' + specifications.ASSEMBLER_FILE_EXT:
+        (words, source_map) = assembler.assemble_with_source_map(lines, program)
+        cpu.load_words(words)
+
+        return (source_map.get_symbols(), source_map)
+
+    cpu.load_program(lines)
+
+    return ({}, None)
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Debug a program on the DCPU simulator')
+
+    parser.add_argument('program', help='the file containing the assembler or machine code to be debugged')
+    parser.add_argument('--record', action='store_true', help='record execution so it can be stepped backwards')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+    cpu = DCPU()
+    (symbols, source_map) = load_program(cpu, args.program)
+
+    history = History(cpu) if args.record else None
+
+    DebuggerShell(Debugger(cpu, symbols, history, source_map)).cmdloop()
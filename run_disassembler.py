@@ -0,0 +1,18 @@
+import argparse
+from simulator import specifications as specs
+from assembler import disassembler
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Disassemble the given machine code')
+
+    parser.add_argument('program', help='the file containing the machine code, either one hex word per line or raw 16-bit words')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specs.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    for line in disassembler.disassemble(disassembler.read_image(args.program)):
+        print line
@@ -0,0 +1,51 @@
+import argparse
+import glob
+import os
+
+from simulator import specifications
+from simulator.benchmark import ENGINES, measure
+from simulator.image import read_image
+from assembler import assembler
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples', '*.' + specifications.ASSEMBLER_FILE_EXT)
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def load_program(path):
+    if os.path.splitext(path)[1] == '.' + specifications.ASSEMBLER_FILE_EXT:
+        return assembler.assemble_binary(read_program(path), path=path)
+
+    return read_image(path)
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Compare how fast the simulator engines run programs')
+
+    parser.add_argument('programs', nargs='*', help='the assembler or machine code files to run, the examples by default')
+    parser.add_argument('--instructions', type=int, default=100000, help='run each program until this many instructions have been executed')
+    parser.add_argument('--max-instructions', type=int, default=10000, help='restart a program after this many instructions')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+    programs = args.programs or sorted(glob.glob(EXAMPLES))
+
+    print "%-20s %12s %14s %10s" % ("program", "engine", "instructions/s", "speedup")
+
+    for program in programs:
+        words = load_program(program)
+        baseline = None
+
+        for engine in sorted(ENGINES):
+            result = measure(words, engine, args.instructions, args.max_instructions)
+            rate = result['instructions_per_second']
+            baseline = baseline or rate
+
+            print "%-20s %12s %14d %9.1fx" % (os.path.basename(program), engine, rate, rate / baseline)
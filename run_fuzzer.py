@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from simulator import specifications
+from simulator.fuzzer import fuzz
+from simulator.image import read_image
+from assembler import assembler
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def load_program(path):
+    '''
+    Returns the machine code in path, assembling it first if it contains
+    assembler instructions
+    '''
+
+    if os.path.splitext(path)[1] == '.' + specifications.ASSEMBLER_FILE_EXT:
+        return assembler.assemble_binary(read_program(path), path=path)
+
+    return read_image(path)
+
+def parse_region(region):
+    '''
+    Parses ADDRESS:LENGTH into a (start, length) tuple
+
+    Ex.
+        0x1000:4 -> (0x1000, 4)
+    '''
+
+    (start, length) = region.split(':')
+    return (int(start, 0), int(length, 0))
+
+def parse_register(name):
+    if name.upper() not in specifications.REGISTER_NAMES:
+        raise argparse.ArgumentTypeError("Unknown register: %s" % name)
+
+    return specifications.REGISTER_NAMES[name.upper()]
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Run a program on mutated inputs looking for ones that make the simulator raise')
+
+    parser.add_argument('program', help='the file containing the assembler instructions or machine code to be fuzzed')
+    parser.add_argument('--input', type=parse_region, action='append', default=[], metavar='ADDRESS:LENGTH',
+                        help='a region of RAM the program reads its input from, can be repeated')
+    parser.add_argument('--register', type=parse_register, action='append', default=[], metavar='NAME',
+                        help='a register the program reads its input from, can be repeated')
+    parser.add_argument('--max-cycles', type=int, default=10000, help='stop each run after this many cycles')
+    parser.add_argument('--iterations', type=int, default=10000, help='the number of inputs to try')
+    parser.add_argument('--jobs', type=int, default=None, help='the number of processes to fuzz in, one per CPU by default')
+    parser.add_argument('--seed', type=int, default=0, help='the seed inputs are mutated from')
+    parser.add_argument('--output', metavar='FILE', help='save the crashing inputs as JSON to FILE')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    if not args.input and not args.register:
+        print >> sys.stderr, "Nothing to fuzz, give at least one --input or --register"
+        sys.exit(2)
+
+    start = time.time()
+    (corpus, coverage, crashes, executions, timeouts) = fuzz(load_program(args.program), args.input, args.register,
+                                                             args.max_cycles, args.iterations, args.jobs, seed=args.seed)
+    elapsed = time.time() - start
+
+    print "Ran %d inputs in %.1fs (%d/s), %d ran out of cycles" % (executions, elapsed, executions / elapsed, timeouts)
+    print "Corpus of %d inputs covering %d transitions" % (len(corpus), len(coverage))
+
+    for (key, crash) in sorted(crashes.iteritems()):
+        print "%s at %#06x: %s" % (crash.error, crash.pc, crash.message)
+        print "    input: %s" % " ".join("%04x" % value for value in crash.values)
+
+    if args.output:
+        f = open(args.output, 'w')
+        json.dump([{'error': crash.error, 'message': crash.message, 'pc': crash.pc, 'input': crash.values}
+                   for (key, crash) in sorted(crashes.iteritems())], f, indent=2)
+        f.close()
+
+    sys.exit(1 if crashes else 0)
@@ -0,0 +1,90 @@
+import argparse
+import os
+
+from simulator import DCPU, specifications
+from simulator.heatmap import Heatmap
+from simulator.image import read_image
+from simulator.sourcemap import SourceMap
+from assembler import assembler
+
+# Programs usually end in a loop, so a run is cut short at this many
+# instructions unless it stops or jumps to itself first
+DEFAULT_MAX_INSTRUCTIONS = 1000000
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def load_program(cpu, path, source_map=None):
+    '''
+    Loads the program in path, assembling it first if it contains assembler
+    instructions, and returns its source map
+    '''
+
+    if os.path.splitext(path)[1] == '.' + specifications.ASSEMBLER_FILE_EXT:
+        (words, source_map) = assembler.assemble_with_source_map(read_program(path), path)
+        cpu.load_words(words)
+
+        return source_map
+
+    cpu.load_words(read_image(path))
+
+    return SourceMap.load(source_map) if source_map else SourceMap()
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Run a program and report which parts of RAM it reads and writes the most')
+
+    parser.add_argument('program', help='the file containing the assembler instructions or machine code to be run')
+    parser.add_argument('--source-map', metavar='FILE', help='the source map saved when assembling the machine code')
+    parser.add_argument('--max-instructions', type=int, default=DEFAULT_MAX_INSTRUCTIONS, help='stop after this many instructions')
+    parser.add_argument('--window', type=int, default=1000, help='the instructions over which each working set is measured')
+    parser.add_argument('--top', type=int, default=10, help='the number of hot regions to report')
+    parser.add_argument('--output', metavar='FILE', help='save the heatmap as a PGM image, a row of pixels per 256 word page')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    cpu = DCPU()
+    source_map = load_program(cpu, args.program, args.source_map)
+
+    heatmap = Heatmap(args.window)
+    instructions = heatmap.run(cpu, args.max_instructions)
+    working_sets = heatmap.working_sets or [0]
+
+    print "Ran %d instructions in %d cycles" % (instructions, cpu.cycles_ran)
+    print "Reads %d, writes %d, fetches %d" % (sum(heatmap.reads), sum(heatmap.writes), sum(heatmap.fetches))
+    print "Stack depth high-water mark: %d words (SP down to %#06x)" % (heatmap.stack_depth, heatmap.lowest_sp)
+    print "Working set per %d instructions: min %d, mean %.1f, max %d words" % (
+        args.window, min(working_sets), float(sum(working_sets)) / len(working_sets), max(working_sets))
+    print "Working set over time: %s" % " ".join(str(words) for words in working_sets)
+
+    print
+    print "%-13s %8s %8s %8s" % ("hot region", "reads", "writes", "fetches")
+
+    for (start, end, reads, writes, fetches) in heatmap.get_hot_regions(args.top):
+        print "%#06x-%#06x %8d %8d %8d" % (start, end - 1, reads, writes, fetches)
+
+    print
+    print "%-6s %8s %8s %8s %6s" % ("page", "reads", "writes", "fetches", "words")
+
+    for (start, reads, writes, fetches, words) in heatmap.get_page_totals():
+        print "%#06x %8d %8d %8d %6d" % (start, reads, writes, fetches, words)
+
+    print
+    print "%8s %8s %8s  %s" % ("reads", "writes", "fetches", "label")
+
+    for (label, (reads, writes, fetches)) in sorted(heatmap.get_label_totals(source_map).iteritems(),
+                                                    key=lambda total: -sum(total[1])):
+        print "%8d %8d %8d  %s" % (reads, writes, fetches, label or "-")
+
+    if args.output:
+        f = open(args.output, 'wb')
+        heatmap.save_heatmap(f)
+        f.close()
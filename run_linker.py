@@ -0,0 +1,20 @@
+import argparse
+from simulator import specifications as specs
+from assembler import linker
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Assemble and link several modules into one program')
+
+    parser.add_argument('sources', nargs='+', help='the files containing the modules, in the order they are placed in memory')
+    parser.add_argument('--object-dir', default='build', help='where object files are kept between builds')
+    parser.add_argument('--jobs', type=int, default=None, help='number of modules to assemble in parallel')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specs.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+    (words, symbols) = linker.build(args.sources, args.object_dir, args.jobs)
+
+    print "\n".join(hex(word) for word in words)
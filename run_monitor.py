@@ -0,0 +1,63 @@
+import argparse
+import sys
+import time
+
+from simulator import specifications
+from simulator.shared import SharedMemory, StaleSharedState
+
+HEX_OUTPUT_FORMAT = "%#06x"
+WORDS_PER_ROW = 8
+
+def get_state(shared, address, count):
+    (registers, cycles_ran) = shared.read_state()
+
+    state = ["Ran %d cycles" % cycles_ran, ""]
+
+    for (code, name) in sorted(specifications.SPECIAL_REGISTERS.iteritems(), key=lambda register: register[1]):
+        state.append("%-3s " % (name + ":") + HEX_OUTPUT_FORMAT % registers[code])
+
+    state.append(" ".join("%s: " % name + HEX_OUTPUT_FORMAT % registers[code]
+                          for (code, name) in sorted(specifications.REGISTERS.iteritems())))
+    state.append("")
+
+    # Read straight from the shared words while the simulator keeps running
+    words = shared.words
+    for row in xrange(address, min(address + count, specifications.MAX_RAM_ADDRESS + 1), WORDS_PER_ROW):
+        state.append("%04x: " % row + " ".join("%04x" % words[row + offset] for offset in xrange(WORDS_PER_ROW)
+                                                if row + offset <= specifications.MAX_RAM_ADDRESS))
+
+    return state
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Follow a DCPU started with run_simulator --shared from another process')
+
+    parser.add_argument('name', help='the shared memory name given to run_simulator')
+    parser.add_argument('--address', type=lambda value: int(value, 0), default=0x8000, help='the first address of RAM to show')
+    parser.add_argument('--words', type=int, default=0x20, help='the number of words of RAM to show')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between refreshes')
+    parser.add_argument('--count', type=int, default=None, help='stop after this many refreshes')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+    shared = SharedMemory(args.name)
+    refreshes = 0
+
+    try:
+        while args.count is None or refreshes < args.count:
+            if refreshes:
+                time.sleep(args.interval)
+                print
+
+            print '\n'.join(get_state(shared, args.address, args.words))
+            refreshes += 1
+    except KeyboardInterrupt:
+        pass
+    except StaleSharedState, e:
+        print >> sys.stderr, e
+        sys.exit(1)
+    finally:
+        shared.close()
@@ -0,0 +1,82 @@
+import argparse
+import os
+
+from simulator import DCPU, specifications
+from simulator.image import read_image
+from simulator.profiler import Profiler
+from simulator.sourcemap import SourceMap
+from assembler import assembler
+
+# Programs usually end in a loop, so a run is cut short at this many
+# instructions unless it stops or jumps to itself first
+DEFAULT_MAX_INSTRUCTIONS = 1000000
+
+def read_program(program):
+    f = open(program)
+    lines = f.readlines()
+    f.close()
+
+    return lines
+
+def load_program(cpu, path, source_map=None):
+    '''
+    Loads the program in path, assembling it first if it contains assembler
+    instructions, and returns its source map
+    '''
+
+    if os.path.splitext(path)[1] == '.' + specifications.ASSEMBLER_FILE_EXT:
+        (words, source_map) = assembler.assemble_with_source_map(read_program(path), path)
+        cpu.load_words(words)
+
+        return source_map
+
+    cpu.load_words(read_image(path))
+
+    return SourceMap.load(source_map) if source_map else SourceMap()
+
+def get_source_line(path, line, sources):
+    if path not in sources:
+        sources[path] = read_program(path) if path and os.path.exists(path) else []
+
+    lines = sources[path]
+    return lines[line - 1].strip() if line <= len(lines) else ""
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Run a program and report the source lines it spent the most cycles on')
+
+    parser.add_argument('program', help='the file containing the assembler instructions or machine code to be run')
+    parser.add_argument('--source-map', metavar='FILE', help='the source map saved when assembling the machine code')
+    parser.add_argument('--max-instructions', type=int, default=DEFAULT_MAX_INSTRUCTIONS, help='stop after this many instructions')
+    parser.add_argument('--top', type=int, default=20, help='the number of source lines to report')
+    parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    cpu = DCPU()
+    source_map = load_program(cpu, args.program, args.source_map)
+
+    profiler = Profiler()
+
+    try:
+        profiler.run(cpu, args.max_instructions)
+    except KeyboardInterrupt:
+        print "Interrupted, reporting the run so far"
+
+    print "Ran %d instructions in %d cycles" % (cpu.instructions_ran, cpu.cycles_ran)
+    print
+    print "%8s %8s  %-24s %s" % ("cycles", "count", "line", "source")
+
+    sources = {}
+    for (cycles, executions, path, line) in profiler.get_hot_spots(source_map, args.top):
+        location = "%s:%d" % (os.path.basename(path) if path else "", line)
+        print "%8d %8d  %-24s %s" % (cycles, executions, location, get_source_line(path, line, sources))
+
+    print
+    print "%8s  %s" % ("cycles", "label")
+
+    for (label, cycles) in sorted(profiler.get_label_totals(source_map).iteritems(), key=lambda total: -total[1]):
+        print "%8d  %s" % (cycles, label or "-")
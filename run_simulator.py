@@ -1,6 +1,18 @@
 import argparse
+import json
+import os
+import sys
 
 from simulator import DCPU, specifications, InfiniteLoopDetected
+from simulator.devices import run_with_devices
+from simulator.disk import Disk, DiskRAM, SEEK_CYCLES
+from simulator.image import read_image
+from simulator.keyboard import Keyboard, KeyboardReader, load_key_script
+from simulator.metrics import MetricsFile
+from simulator.shared import SharedMemory, SharedRAM, Publisher
+from simulator.threaded import ThreadedEngine
+from assembler import assembler
+from assembler.cache import AssemblyCache, DEFAULT_CACHE_DIR
 
 def read_program(program):
     f = open(program)
@@ -9,28 +21,138 @@ def read_program(program):
 
     return instructions
 
+def load_program(cpu, program, cache=None):
+    '''
+    Loads the given file into the cpu, assembling it in process if it
+    contains assembler instructions, or taking it from cache if given
+    and the source is unchanged since it was last assembled
+    '''
+
+    extension = os.path.splitext(program)[1]
+
+    if extension == '.' + specifications.ASSEMBLER_FILE_EXT:
+        if cache is not None:
+            cpu.load_words(cache.assemble(read_program(program), path=program)[0])
+        else:
+            cpu.load_words(assembler.assemble_binary(read_program(program), path=program))
+    elif extension == '.' + specifications.BINARY_FILE_EXT:
+        cpu.load_words(read_image(program))
+    else:
+        cpu.load_program(read_program(program))
+
 def get_args():
     parser = argparse.ArgumentParser(description='Run the DCPU simulator')
 
-    parser.add_argument('program', help='the file containing the instruction words to be run')
+    parser.add_argument('program', help='the file containing the instruction words or assembler instructions to be run')
+    parser.add_argument('--shared', metavar='NAME', help='keep RAM and registers in shared memory NAME where run_monitor can read them')
+    parser.add_argument('--threaded', action='store_true', help='run with the threaded engine, which decodes each instruction once')
+    parser.add_argument('--keyboard', action='store_true', help='type what is read from stdin into the keyboard buffer at 0x9000')
+    parser.add_argument('--keys', metavar='FILE', help='type the keys in the key script FILE into the keyboard buffer at the cycles it gives')
+    parser.add_argument('--disk', metavar='FILE', help='attach FILE as a disk of 512 word sectors with its registers at 0x9200')
+    parser.add_argument('--disk-read-only', action='store_true', help="don't let the program write to the disk")
+    parser.add_argument('--disk-seek-cycles', type=int, default=SEEK_CYCLES, help='the cycles the disk takes to start a transfer')
+    parser.add_argument('--max-instructions', type=int, default=None, help='with --shared, --threaded or devices attached, stop after this many instructions')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='where assembled programs are kept between runs')
+    parser.add_argument('--no-cache', action='store_true', help='always assemble assembler files, without using the cache')
+    parser.add_argument('--stats', action='store_true', help='print the run counters as JSON on stderr when done')
+    parser.add_argument('--metrics', metavar='FILE', help='keep FILE updated with the run counters in OpenMetrics text format')
+    parser.add_argument('--metrics-interval', type=float, default=1.0, metavar='SECONDS', help='how often to update --metrics')
     parser.add_argument('--version', action='version', version='DCPU v%s' % specifications.DCPU_VERSION)
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.shared and args.threaded:
+        parser.error('--shared and --threaded cannot be used together')
+
+    if args.shared and (args.keyboard or args.keys or args.disk):
+        parser.error('--shared cannot be used with --keyboard, --keys or --disk')
+
+    return args
 
 if __name__ == '__main__':
 
     args = get_args()
-    instructions = read_program(args.program)
 
     cpu = DCPU()
+    cache = None if args.no_cache else AssemblyCache(args.cache_dir)
+
+    metrics = MetricsFile(args.metrics, args.metrics_interval) if args.metrics else None
+    on_slice = metrics.update if metrics else None
+
+    if args.shared:
+        # Keeps running through loops that never end so monitors can follow along
+        shared = SharedMemory(args.shared, create=True)
+
+        try:
+            SharedRAM.convert(cpu.RAM, shared)
+            load_program(cpu, args.program, cache)
+
+            try:
+                Publisher(shared).run(cpu, args.max_instructions, on_slice)
+            except KeyboardInterrupt:
+                pass
+        finally:
+            SharedRAM.revert(cpu.RAM)
+            shared.close()
+            shared.unlink()
+    elif args.keyboard or args.keys or args.disk:
+        # Waiting for a key or the disk looks like a loop that never ends, so loops aren't detected
+        devices = []
+
+        if args.keyboard or args.keys:
+            keyboard = Keyboard(load_key_script(args.keys) if args.keys else ())
+            devices.append(keyboard)
+
+            if args.keyboard:
+                KeyboardReader(keyboard, sys.stdin).start()
 
-    try:
-        cpu.run_program(instructions)
-    except InfiniteLoopDetected:
-        print "*****Infinite loop detected, stopping execution*****"
+        disk = Disk(args.disk, args.disk_read_only, args.disk_seek_cycles) if args.disk else None
+
+        if disk:
+            devices.append(disk)
+
+        load_program(cpu, args.program, cache)
+        engine = ThreadedEngine(cpu) if args.threaded else cpu
+
+        if disk:
+            DiskRAM.convert(cpu.RAM, disk)
+
+        try:
+            run_with_devices(cpu, devices, args.max_instructions, on_slice, engine.execute_next_instruction)
+        except KeyboardInterrupt:
+            pass
+
+        if disk:
+            disk.close()
+    elif args.threaded:
+        # Only detects loops of an instruction that jumps to itself
+        load_program(cpu, args.program, cache)
+
+        engine = ThreadedEngine(cpu)
+
+        try:
+            engine.run(args.max_instructions, on_slice)
+        except KeyboardInterrupt:
+            pass
+
+        if engine.halted:
+            print "*****Infinite loop detected, stopping execution*****"
+    else:
+        load_program(cpu, args.program, cache)
+
+        try:
+            cpu.run(on_slice)
+        except InfiniteLoopDetected:
+            print "*****Infinite loop detected, stopping execution*****"
 
     print
     print "--------------------------"
     print "DCPU State after execution"
     print "--------------------------"
     print cpu
+
+    if metrics:
+        metrics.write(cpu)
+
+    if args.stats:
+        print >> sys.stderr, json.dumps(cpu.get_stats(), indent=2, sort_keys=True)
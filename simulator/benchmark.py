@@ -0,0 +1,66 @@
+import time
+
+from dcpu import DCPU, is_halt_loop
+from threaded import ThreadedEngine
+
+def run_interpreter(cpu, max_instructions):
+    '''
+    Stops at an instruction that jumps to itself as the threaded engine
+    does, so both execute the same instructions
+    '''
+
+    count = 0
+
+    while count < max_instructions:
+        pc = cpu.PC
+        word = cpu.RAM[pc]
+
+        if not cpu.execute_next_instruction():
+            break
+
+        count += 1
+
+        if is_halt_loop(word, pc, cpu.PC):
+            break
+
+    return count
+
+def run_threaded(cpu, max_instructions):
+    engine = cpu.caches.get('threaded') or ThreadedEngine(cpu)
+
+    return engine.run(max_instructions)
+
+ENGINES = {
+    'interpreter': run_interpreter,
+    'threaded': run_threaded,
+}
+
+def measure(words, engine, min_instructions=100000, max_instructions=10000):
+    '''
+    Runs the program made of words with the given engine, stopping each
+    run after max_instructions and reloading it until min_instructions
+    have been executed overall. Returns the instructions executed, the
+    time taken and the resulting rate
+    '''
+
+    run = ENGINES[engine]
+    cpu = DCPU()
+
+    instructions = 0
+    cycles = 0
+    start = time.time()
+
+    while instructions < min_instructions:
+        cpu.load_words(words)
+        instructions += run(cpu, max_instructions) or 1
+        cycles += cpu.cycles_ran
+
+    seconds = time.time() - start
+
+    return {
+        'engine': engine,
+        'instructions': instructions,
+        'cycles': cycles,
+        'seconds': seconds,
+        'instructions_per_second': instructions / seconds if seconds else None,
+    }
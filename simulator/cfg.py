@@ -0,0 +1,389 @@
+import specifications as specs
+
+from dcpu import parse_instruction, get_word_length, get_cycles, BASIC_OP_CYCLES, NON_BASIC_OP_CYCLES
+
+PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+POP_CODE = specs.STACK_CODE_NAMES['POP']
+NEXT_WORD_LITERAL = 0x1f
+
+# Cycles the DCPU adds when an IF skips the next instruction
+SKIP_CYCLES = 1
+
+class EdgeKind:
+    NEXT = "next"
+    SKIP = "skip"
+    JUMP = "jump"
+    RETURN = "return"
+
+class Exit:
+    '''
+    How execution leaves a block that has no successors
+    '''
+
+    STOP = "stop"
+    RETURN = "return"
+    INDIRECT = "indirect"
+    INVALID = "invalid"
+
+class Edge(object):
+    '''
+    A way from one block to another: falling through (or an IF whose
+    condition held), an IF skipping an instruction, a jump or coming back
+    after a subroutine call. cycles are spent on top of the blocks'
+    '''
+
+    __slots__ = ['kind', 'target', 'cycles']
+
+    def __init__(self, kind, target, cycles=0):
+        self.kind = kind
+        self.target = target
+        self.cycles = cycles
+
+    def __repr__(self):
+        return "Edge(%s, %#06x)" % (self.kind, self.target)
+
+class BasicBlock(object):
+    '''
+    A run of instructions only entered at the first and only left after
+    the last, with the cycles it takes
+
+    calls holds the subroutines called by its last instruction, None
+    standing for a call through a register or memory
+    '''
+
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.instructions = []
+        self.cycles = 0
+        self.successors = []
+        self.calls = []
+        self.exit = None
+
+    def add(self, address, word, cycles):
+        self.instructions.append((address, word))
+        self.cycles += cycles
+        self.end = address + get_word_length(word)
+
+class Loop(object):
+    '''
+    The blocks that can reach a back edge to header without passing it, and
+    the most cycles one iteration through them can take with inner loops
+    going round once
+    '''
+
+    def __init__(self, header, blocks, sources):
+        self.header = header
+        self.blocks = blocks
+        self.sources = sources
+        self.depth = 1
+        self.iteration_cycles = None
+        self.has_exit = True
+
+class Subroutine(object):
+    '''
+    The blocks reachable from an entry point without following calls,
+    with the loops among them
+    '''
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.blocks = []
+        self.back_edges = set()
+        self.loops = []
+        self.calls = set()
+        self.worst_case_cycles = None
+        self.is_recursive = False
+        self.has_indirect_flow = False
+
+class ControlFlowGraph(object):
+    '''
+    The basic blocks of a program in machine code and the subroutines they
+    form, found by following the flow from an entry address rather than
+    decoding every word, so data between code isn't mistaken for it
+
+    Blocks end at IFs, jumps, JSRs and instructions that stop the program,
+    and their cycles are those DCPU charges: see dcpu.get_cycles. The
+    worst case of a subroutine is its most expensive path from entry to
+    exit with every loop going round once and the worst case of the
+    subroutines it calls added at their JSR.
+    '''
+
+    def __init__(self, words, entry=0x0):
+        self.words = words
+        self.entry = entry
+        self.blocks = {}
+        self.subroutines = {}
+
+        self.build()
+
+    def word_at(self, address):
+        return self.words[address] if address < len(self.words) else 0x0
+
+    def get_literal(self, value_code, address):
+        '''
+        Returns the value of a literal operand whose next word, if it
+        has one, is at address. None for other value codes
+        '''
+
+        if value_code == NEXT_WORD_LITERAL:
+            return self.word_at(address)
+        elif value_code >= 0x20:
+            return value_code - 0x20
+
+        return None
+
+    def get_flow(self, address):
+        '''
+        Returns the edges out of the instruction at address, the subroutines
+        it calls and how it exits if it has no successors
+        '''
+
+        word = self.word_at(address)
+        (op_code, a, b) = parse_instruction(word)
+        next_address = address + get_word_length(word)
+
+        if word == specs.STOP_INSTRUCTION:
+            return ([], [], Exit.STOP)
+
+        if op_code not in (BASIC_OP_CYCLES if b is not None else NON_BASIC_OP_CYCLES):
+            return ([], [], Exit.INVALID)
+
+        if b is None:
+            return ([Edge(EdgeKind.RETURN, next_address)], [self.get_literal(a, address + 1)], None)
+
+        if op_code in specs.IF_OPERATIONS:
+            skipped = get_word_length(self.word_at(next_address))
+
+            return ([Edge(EdgeKind.NEXT, next_address),
+                     Edge(EdgeKind.SKIP, next_address + skipped, SKIP_CYCLES)], [], None)
+
+        if a == PC_CODE:
+            if op_code == specs.BasicOperations.SET and b == POP_CODE:
+                return ([], [], Exit.RETURN)
+
+            target = self.get_literal(b, address + 1)
+
+            if op_code == specs.BasicOperations.SET and target is not None:
+                return ([Edge(EdgeKind.JUMP, target)], [], None)
+
+            return ([], [], Exit.INDIRECT)
+
+        return ([Edge(EdgeKind.NEXT, next_address)], [], None)
+
+    def build(self):
+        flows = {}
+        leaders = set([self.entry])
+        entries = set([self.entry])
+        pending = [self.entry]
+
+        # Follow the flow to every reachable instruction
+        while pending:
+            address = pending.pop()
+
+            if address in flows or address > specs.MAX_RAM_ADDRESS:
+                continue
+
+            flow = flows[address] = self.get_flow(address)
+            (edges, calls, _) = flow
+
+            pending.extend(edge.target for edge in edges)
+
+            if ends_block(flow):
+                leaders.update(edge.target for edge in edges)
+
+            for call in calls:
+                if call is not None:
+                    leaders.add(call)
+                    entries.add(call)
+                    pending.append(call)
+
+        # Cut the instructions into blocks at the leaders
+        for leader in sorted(leaders):
+            if leader not in flows:
+                continue
+
+            block = self.blocks[leader] = BasicBlock(leader)
+            address = leader
+
+            while True:
+                flow = flows[address]
+                (edges, calls, exit) = flow
+                word = self.word_at(address)
+
+                block.add(address, word, get_cycles(word) if exit not in (Exit.STOP, Exit.INVALID) else 1)
+
+                if ends_block(flow):
+                    block.successors = [edge for edge in edges if edge.target in flows]
+                    block.calls = calls
+                    block.exit = exit
+                    break
+
+                address = edges[0].target
+
+                if address in leaders or address not in flows:
+                    block.successors = [Edge(EdgeKind.NEXT, address)] if address in flows else []
+                    break
+
+        for entry in sorted(entries):
+            self.subroutines[entry] = self.find_subroutine(entry)
+
+        for entry in sorted(entries):
+            self.get_worst_case(entry)
+
+    def find_subroutine(self, entry):
+        '''
+        Walks the blocks reachable from entry depth first, recording them
+        in post-order along with the back edges and the loops they close
+        '''
+
+        subroutine = Subroutine(entry)
+        blocks = self.blocks
+
+        on_stack = set([entry])
+        visited = set([entry])
+        stack = [(entry, iter(blocks[entry].successors))]
+
+        while stack:
+            (start, successors) = stack[-1]
+            edge = next(successors, None)
+
+            if edge is None:
+                stack.pop()
+                on_stack.discard(start)
+                subroutine.blocks.append(start)
+                continue
+
+            if edge.target in on_stack:
+                subroutine.back_edges.add((start, edge.target))
+            elif edge.target not in visited:
+                visited.add(edge.target)
+                on_stack.add(edge.target)
+                stack.append((edge.target, iter(blocks[edge.target].successors)))
+
+        for start in subroutine.blocks:
+            block = blocks[start]
+            subroutine.calls.update(block.calls)
+
+            if block.exit in (Exit.INDIRECT, Exit.INVALID) or None in block.calls:
+                subroutine.has_indirect_flow = True
+
+        subroutine.loops = self.find_loops(subroutine)
+
+        return subroutine
+
+    def find_loops(self, subroutine):
+        predecessors = {}
+        for start in subroutine.blocks:
+            for edge in self.blocks[start].successors:
+                predecessors.setdefault(edge.target, set()).add(start)
+
+        sources = {}
+        for (source, header) in subroutine.back_edges:
+            sources.setdefault(header, set()).add(source)
+
+        loops = []
+
+        for (header, loop_sources) in sorted(sources.iteritems()):
+            body = set([header])
+            pending = [source for source in loop_sources if source != header]
+
+            while pending:
+                start = pending.pop()
+
+                if start not in body:
+                    body.add(start)
+                    pending.extend(predecessors.get(start, []))
+
+            loop = Loop(header, body, loop_sources)
+            loop.has_exit = any(self.blocks[start].exit is not None or
+                                any(edge.target not in body for edge in self.blocks[start].successors)
+                                for start in body)
+
+            loops.append(loop)
+
+        for loop in loops:
+            loop.depth = sum(1 for other in loops if loop.header in other.blocks)
+
+        return loops
+
+    def get_worst_case(self, entry, calling=None):
+        '''
+        Returns the most cycles a call to the subroutine at entry can take
+        with every loop going round once
+        '''
+
+        subroutine = self.subroutines[entry]
+
+        if subroutine.worst_case_cycles is not None:
+            return subroutine.worst_case_cycles
+
+        calling = (calling or set()) | set([entry])
+        call_cycles = {}
+
+        for start in subroutine.blocks:
+            cycles = 0
+
+            for call in self.blocks[start].calls:
+                if call in calling:
+                    subroutine.is_recursive = True
+                elif call is not None:
+                    cycles += self.get_worst_case(call, calling)
+
+            call_cycles[start] = cycles
+
+        # Inner loops first, each iteration of a loop goes round its inner loops once
+        for loop in sorted(subroutine.loops, key=lambda loop: -loop.depth):
+            blocks = [start for start in subroutine.blocks if start in loop.blocks]
+            loop.iteration_cycles = self.get_path_costs(subroutine, blocks, call_cycles, loop)[loop.header]
+
+        subroutine.worst_case_cycles = self.get_path_costs(subroutine, subroutine.blocks, call_cycles)[entry]
+
+        return subroutine.worst_case_cycles
+
+    def get_path_costs(self, subroutine, blocks, call_cycles, loop=None):
+        '''
+        Returns the cycles of the most expensive path from each block to an
+        exit, or when given a loop back to its header, None if there is none
+
+        Back edges aren't followed, instead a path reaching a loop's header
+        goes round the loop once. A loop without a way out, like the usual
+        :halt SET PC, halt, ends the path after its one iteration.
+
+        blocks must be in post-order so every block comes after its successors
+        '''
+
+        costs = {}
+
+        for start in blocks:
+            block = self.blocks[start]
+            paths = []
+
+            for edge in block.successors:
+                if (start, edge.target) in subroutine.back_edges:
+                    if loop is not None and edge.target == loop.header:
+                        paths.append(edge.cycles)
+
+                elif loop is None or edge.target in loop.blocks:
+                    if costs.get(edge.target) is not None:
+                        paths.append(edge.cycles + costs[edge.target])
+
+            if loop is None and not block.successors:
+                paths.append(0)
+
+            cost = block.cycles + call_cycles[start] + max(paths) if paths else None
+
+            iterations = [other.iteration_cycles for other in subroutine.loops
+                          if other.header == start and other is not loop and other.iteration_cycles is not None]
+
+            if iterations:
+                cost = (cost or 0) + sum(iterations)
+
+            costs[start] = cost
+
+        return costs
+
+def ends_block(flow):
+    (edges, calls, exit) = flow
+
+    return exit is not None or bool(calls) or len(edges) != 1 or edges[0].kind != EdgeKind.NEXT
@@ -0,0 +1,433 @@
+import Queue
+import ctypes
+import multiprocessing
+import time
+from collections import deque
+
+from dcpu import DCPU
+from fuzzer import PROGRAM_ERRORS
+from memory import RAM
+
+# Where each CPU's mailbox registers are mapped in its RAM
+MAILBOX_ADDRESS = 0x9100
+
+class MailboxRegisters:
+    ID = 0x0        # this CPU's number, read only
+    CPUS = 0x1      # how many CPUs are in the cluster, read only
+    TO = 0x2        # the CPU messages are sent to
+    SEND = 0x3      # writing a word sends it to TO
+    STATUS = 0x4    # whether the last word sent was delivered, read only
+    PENDING = 0x5   # how many received words are waiting, read only
+    FROM = 0x6      # the CPU the oldest waiting word came from, read only
+    DATA = 0x7      # the oldest waiting word, writing anything takes it
+
+MAILBOX_WORDS = 8
+
+SEND_OK = 0x0
+SEND_DROPPED = 0x1
+
+QUEUE_CAPACITY = 256
+
+# How often, in seconds, the parent checks its workers are still alive
+# while it waits on them, and how long it lets each one exit once the
+# cluster stops before terminating it
+POLL_INTERVAL = 0.1
+JOIN_TIMEOUT = 1.0
+
+class MessageQueues(object):
+    '''
+    A ring buffer of words in shared memory for every (sender, receiver)
+    pair of CPUs, so worker processes exchange messages without pickling
+    them or going through the parent
+
+    Each entry holds the word and the quantum it was sent in. Only the
+    sender moves a queue's tail and only the receiver its head, so no
+    locking is needed
+    '''
+
+    def __init__(self, cpus, capacity=QUEUE_CAPACITY):
+        self.cpus = cpus
+        self.capacity = capacity
+
+        self.entries = multiprocessing.RawArray(ctypes.c_uint16, cpus * cpus * capacity * 2)
+        self.heads = multiprocessing.RawArray(ctypes.c_uint32, cpus * cpus)
+        self.tails = multiprocessing.RawArray(ctypes.c_uint32, cpus * cpus)
+
+    def put(self, sender, receiver, word, quantum=0):
+        '''
+        Queues word from sender to receiver, returning False if the queue
+        is full and the word was dropped
+        '''
+
+        queue = sender * self.cpus + receiver
+        tail = self.tails[queue]
+
+        if (tail - self.heads[queue]) & 0xffffffff >= self.capacity:
+            return False
+
+        entry = (queue * self.capacity + tail % self.capacity) * 2
+        self.entries[entry] = quantum & 0xffff
+        self.entries[entry + 1] = word
+
+        # Publish the entry only once it is written
+        self.tails[queue] = tail + 1
+
+        return True
+
+    def take(self, receiver, quantum=None):
+        '''
+        Removes and returns the words waiting for receiver as (sender, word)
+        pairs, ordered by sender and then by when they were sent
+
+        With quantum, words sent during that quantum are left queued, as a
+        sender that has already moved on to it may still be adding to them
+        '''
+
+        taken = []
+        capacity = self.capacity
+        entries = self.entries
+
+        for sender in xrange(self.cpus):
+            queue = sender * self.cpus + receiver
+            head = self.heads[queue]
+            tail = self.tails[queue]
+
+            while head != tail:
+                entry = (queue * capacity + head % capacity) * 2
+
+                if quantum is not None and entries[entry] == quantum & 0xffff:
+                    break
+
+                taken.append((sender, entries[entry + 1]))
+                head += 1
+
+            self.heads[queue] = head
+
+        return taken
+
+class Mailbox(object):
+    '''
+    The memory mapped device a CPU in a cluster sends and receives words
+    through. Received words wait in inbox until the program takes them
+
+    The registers are plain RAM words kept up to date as the inbox
+    changes, so reading them costs nothing extra
+
+    When deterministic, at most half a queue can be sent to each CPU per
+    quantum. The receiver empties the queue at some point during the next
+    quantum, so whether a word is dropped never depends on exactly when
+    '''
+
+    def __init__(self, number, queues, deterministic=False):
+        self.number = number
+        self.queues = queues
+        self.deterministic = deterministic
+        self.inbox = deque()
+        self.quantum = 0
+        self.quantum_sent = {}
+        self.status = SEND_OK
+        self.ram = None
+
+        self.sent = 0
+        self.dropped = 0
+        self.received = 0
+
+    def attach(self, ram):
+        self.ram = ram
+        self.refresh()
+
+    def read(self, register):
+        return dict.get(self.ram, MAILBOX_ADDRESS + register, 0x0)
+
+    def write(self, register, value):
+        '''
+        Handles a write by the program, value having already been stored
+        '''
+
+        if register == MailboxRegisters.SEND:
+            receiver = self.read(MailboxRegisters.TO)
+
+            if receiver < self.queues.cpus and self.can_send(receiver) \
+                    and self.queues.put(self.number, receiver, value, self.quantum):
+                self.status = SEND_OK
+                self.sent += 1
+                self.quantum_sent[receiver] = self.quantum_sent.get(receiver, 0) + 1
+            else:
+                self.status = SEND_DROPPED
+                self.dropped += 1
+        elif register == MailboxRegisters.DATA and self.inbox:
+            self.inbox.popleft()
+
+        self.refresh()
+
+    def can_send(self, receiver):
+        return not self.deterministic or self.quantum_sent.get(receiver, 0) < self.queues.capacity / 2
+
+    def start_quantum(self, quantum):
+        '''
+        Moves on to the given quantum, receiving the words sent before it
+        '''
+
+        self.quantum = quantum
+        self.quantum_sent.clear()
+        self.receive(quantum)
+
+    def receive(self, quantum=None):
+        '''
+        Moves the words sent to this CPU into its inbox, leaving those sent
+        during quantum if given
+        '''
+
+        words = self.queues.take(self.number, quantum)
+
+        if words:
+            self.inbox.extend(words)
+            self.received += len(words)
+            self.refresh()
+
+    def refresh(self):
+        (sender, word) = self.inbox[0] if self.inbox else (0x0, 0x0)
+
+        for (register, value) in [(MailboxRegisters.ID, self.number),
+                                  (MailboxRegisters.CPUS, self.queues.cpus),
+                                  (MailboxRegisters.STATUS, self.status),
+                                  (MailboxRegisters.PENDING, min(len(self.inbox), 0xffff)),
+                                  (MailboxRegisters.FROM, sender),
+                                  (MailboxRegisters.DATA, word)]:
+            dict.__setitem__(self.ram, MAILBOX_ADDRESS + register, value)
+
+class MailboxRAM(RAM):
+    '''
+    RAM with a Mailbox mapped at MAILBOX_ADDRESS
+
+    Only writes are intercepted, reads of the mailbox registers are served
+    from the words the mailbox keeps up to date
+    '''
+
+    @classmethod
+    def convert(cls, ram, mailbox):
+        '''
+        Turns the given RAM into a MailboxRAM in place, so anything already
+        holding a reference to it (e.g. a DCPU) talks to mailbox
+        '''
+
+        ram.__class__ = cls
+        ram.mailbox = mailbox
+        mailbox.attach(ram)
+
+        return ram
+
+    @staticmethod
+    def revert(ram):
+        ram.__class__ = RAM
+
+    def __setitem__(self, key, val):
+        super(MailboxRAM, self).__setitem__(key, val)
+
+        register = key - MAILBOX_ADDRESS
+        if 0 <= register < MAILBOX_WORDS:
+            self.mailbox.write(register, dict.__getitem__(self, key))
+
+def run_slice(cpu, cycles):
+    '''
+    Executes instructions until cpu has ran at least cycles, returning
+    False if the program stopped first
+    '''
+
+    execute = cpu.execute_next_instruction
+    count = 0
+    start = time.time()
+
+    try:
+        while cpu.cycles_ran < cycles:
+            if not execute():
+                return False
+
+            count += 1
+    finally:
+        cpu.add_stats(count, start)
+
+    return True
+
+def take_report(queue, workers, pending):
+    '''
+    Takes the next item a worker put on queue, raising WorkerDied if one
+    of the workers numbered in pending exited without putting it
+    '''
+
+    dead = None
+
+    while True:
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Queue.Empty:
+            # A worker flushes what it put before exiting, so only give up
+            # once the queue stayed empty after one was seen dead
+            if dead is not None:
+                raise WorkerDied(dead, workers[dead].exitcode)
+
+            dead = next((number for number in pending if not workers[number].is_alive()), None)
+
+def cluster_worker(number, words, queues, quantum, max_cycles, deterministic, barrier, running, results):
+    '''
+    Runs one CPU of a cluster, in its own process
+
+    In deterministic mode each quantum starts by taking the words sent
+    during the previous one and ends at the barrier, where the parent
+    waits for every CPU before letting them all carry on
+    '''
+
+    (reports, go) = barrier
+
+    cpu = DCPU()
+    cpu.load_words(words)
+
+    mailbox = Mailbox(number, queues, deterministic)
+    MailboxRAM.convert(cpu.RAM, mailbox)
+
+    done = False
+    error = None
+    current = 0
+
+    while True:
+        if deterministic:
+            mailbox.start_quantum(current)
+        else:
+            mailbox.receive()
+
+        if not done:
+            try:
+                done = not run_slice(cpu, min((current + 1) * quantum, max_cycles))
+            except PROGRAM_ERRORS, exception:
+                error = '%s: %s' % (exception.__class__.__name__, exception)
+                done = True
+
+            done = done or cpu.cycles_ran >= max_cycles
+
+        if deterministic:
+            reports.put((number, done))
+            go.acquire()
+
+            if not running.value:
+                break
+        elif done or not running.value:
+            break
+
+        current += 1
+
+    MailboxRAM.revert(cpu.RAM)
+
+    results.put((number, dict(cpu.registers), dict(cpu.RAM), cpu.cycles_ran, cpu.instructions_ran,
+                 cpu.run_time, error, (mailbox.sent, mailbox.dropped, mailbox.received)))
+
+class Cluster(object):
+    '''
+    Runs a DCPU per program, each in its own process, talking to each
+    other through the Mailbox mapped in their RAM
+
+    CPUs run in quanta of the given number of cycles. When deterministic,
+    every CPU waits for the others at the end of each quantum and only
+    sees the words sent to it once the quantum they were sent in is over,
+    so runs give the same results however the processes get scheduled.
+    Otherwise CPUs never wait for each other and pick up the words sent
+    to them at the end of each of their quanta, as fast as they can go
+
+    After run, cpus holds a DCPU with the final state of each program,
+    and errors the error each program that raised stopped on
+    '''
+
+    def __init__(self, programs, quantum=1000, max_cycles=1000000, deterministic=True, capacity=QUEUE_CAPACITY):
+        self.programs = programs
+        self.quantum = quantum
+        self.max_cycles = max_cycles
+        self.deterministic = deterministic
+        self.capacity = capacity
+
+        self.cpus = []
+        self.errors = {}
+        self.messages = []
+        self.quanta = 0
+
+    def run(self):
+        count = len(self.programs)
+        queues = MessageQueues(count, self.capacity)
+
+        reports = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+        running = multiprocessing.RawValue(ctypes.c_bool, True)
+        gates = [multiprocessing.Semaphore(0) for _ in xrange(count)]
+
+        workers = [multiprocessing.Process(target=cluster_worker,
+                                           args=(number, words, queues, self.quantum, self.max_cycles,
+                                                 self.deterministic, (reports, gates[number]), running, results))
+                   for (number, words) in enumerate(self.programs)]
+
+        for worker in workers:
+            worker.start()
+
+        try:
+            if self.deterministic:
+                self.quanta = 0
+
+                while running.value:
+                    done = {}
+                    while len(done) < count:
+                        (number, stopped) = take_report(reports, workers, set(xrange(count)) - set(done))
+                        done[number] = stopped
+
+                    self.quanta += 1
+
+                    running.value = not all(done.values())
+
+                    for gate in gates:
+                        gate.release()
+
+            # Results must be read before joining, their pipe could otherwise fill up
+            finished = {}
+            while len(finished) < count:
+                result = take_report(results, workers, set(xrange(count)) - set(finished))
+                finished[result[0]] = result
+
+            finished = sorted(finished.values())
+        finally:
+            # Stops workers left waiting at the barrier or still running
+            # when a worker died or the run was interrupted
+            running.value = False
+
+            for gate in gates:
+                gate.release()
+
+            for worker in workers:
+                worker.join(JOIN_TIMEOUT)
+
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+
+        self.cpus = []
+        self.errors = {}
+        self.messages = []
+
+        for (number, registers, ram, cycles_ran, instructions, run_time, error, messages) in finished:
+            cpu = DCPU()
+            dict.update(cpu.registers, registers)
+            dict.update(cpu.RAM, ram)
+            cpu.cycles_ran = cycles_ran
+            cpu.instructions_ran = instructions
+            cpu.run_time = run_time
+
+            self.cpus.append(cpu)
+            self.messages.append(messages)
+
+            if error is not None:
+                self.errors[number] = error
+
+        return self.cpus
+
+class WorkerDied(Exception):
+    def __init__(self, number, exitcode):
+        self.number = number
+        self.exitcode = exitcode
+
+    def __str__(self):
+        return "The process running CPU %d exited with code %s before reporting back" % (self.number, self.exitcode)
@@ -0,0 +1,143 @@
+import specifications as specs
+
+from dcpu import get_word_length, is_halt_loop
+from utilities import bitmask, bitwise_or
+
+BITMAP_SIZE = (specs.MAX_RAM_ADDRESS + 1) / 8
+
+class Coverage(object):
+    '''
+    Records which addresses of a program were executed in a bitmap
+    with one bit per RAM address
+
+    For IFE/IFN/IFG/IFB instructions the taken bitmap marks the ones whose
+    condition held and not_taken the ones that skipped the next instruction
+    '''
+
+    PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+    OP_CODE_MASK = bitmask(specs.BASIC_OP_CODE_LENGTH)
+
+    def __init__(self):
+        self.executed = bytearray(BITMAP_SIZE)
+        self.taken = bytearray(BITMAP_SIZE)
+        self.not_taken = bytearray(BITMAP_SIZE)
+
+    def run(self, cpu, max_instructions=None):
+        '''
+        Executes the program loaded in cpu until it stops, reaches an
+        instruction that jumps to itself or max_instructions have been
+        executed, recording coverage. Returns the number of instructions
+        executed
+        '''
+
+        registers = cpu.registers
+        ram = cpu.RAM
+        execute = cpu.execute_next_instruction
+        executed = self.executed
+        op_code_mask = self.OP_CODE_MASK
+        pc_code = self.PC_CODE
+        if_operations = specs.IF_OPERATIONS
+
+        count = 0
+
+        while max_instructions is None or count < max_instructions:
+            count += 1
+
+            pc = dict.get(registers, pc_code, 0)
+            executed[pc >> 3] |= 1 << (pc & 7)
+
+            word = dict.get(ram, pc, 0)
+
+            if not execute():
+                break
+
+            next_pc = dict.get(registers, pc_code, 0)
+
+            if (word & op_code_mask) in if_operations:
+                branches = self.taken if next_pc == pc + get_word_length(word) else self.not_taken
+                branches[pc >> 3] |= 1 << (pc & 7)
+            elif next_pc == pc and is_halt_loop(word, pc, next_pc):
+                break
+
+        return count
+
+    def merge(self, other):
+        '''
+        Adds the coverage recorded by other to this one
+        '''
+
+        self.executed = bitwise_or(self.executed, other.executed)
+        self.taken = bitwise_or(self.taken, other.taken)
+        self.not_taken = bitwise_or(self.not_taken, other.not_taken)
+
+    def is_executed(self, address):
+        return is_set(self.executed, address)
+
+    def get_executed_addresses(self):
+        return [address for address in xrange(specs.MAX_RAM_ADDRESS + 1)
+                if self.executed[address >> 3] and is_set(self.executed, address)]
+
+    def save(self, path):
+        f = open(path, 'wb')
+        f.write(self.executed + self.taken + self.not_taken)
+        f.close()
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, 'rb')
+        data = bytearray(f.read())
+        f.close()
+
+        if len(data) != 3 * BITMAP_SIZE:
+            raise InvalidCoverageFile(path)
+
+        coverage = cls()
+        coverage.executed = data[:BITMAP_SIZE]
+        coverage.taken = data[BITMAP_SIZE:2 * BITMAP_SIZE]
+        coverage.not_taken = data[2 * BITMAP_SIZE:]
+
+        return coverage
+
+    def get_marker(self, address):
+        '''
+        "+" for executed addresses, "-" otherwise, followed by T and/or N
+        for conditions that were taken and not taken
+        '''
+
+        if not self.is_executed(address):
+            return "-"
+
+        return "+" + ("T" if is_set(self.taken, address) else "") \
+                   + ("N" if is_set(self.not_taken, address) else "")
+
+    def annotate(self, source, line_addresses):
+        '''
+        Returns the source lines prefixed with their address and coverage marker
+
+        Ex.
+            0005 +   :nextfib    ADD I, 0x1
+            0010 +TN             IFG 0xa, I
+            0011 +                   SET PC, nextfib
+        '''
+
+        listing = []
+
+        for (line, address) in zip(source, line_addresses):
+            line = line.rstrip("\n")
+
+            if address is None:
+                listing.append(" " * 9 + line)
+            else:
+                listing.append("%04x %-4s%s" % (address, self.get_marker(address), line))
+
+        return listing
+
+def is_set(bitmap, address):
+    return bool(bitmap[address >> 3] & (1 << (address & 7)))
+
+class InvalidCoverageFile(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Not a coverage file: %s" % self.path
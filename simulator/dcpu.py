@@ -1,7 +1,10 @@
 import operator
+import time
+from array import array
+
 import specifications as specs
 
-from memory import Memory, RAM
+from memory import Memory, RAM, InvalidMemoryAccess
 from utilities import bitmask, to_int
 
 class Value(object):
@@ -13,8 +16,16 @@ class DCPU(object):
     HEX_OUTPUT_FORMAT = "%#06x"
     MAX_VAL = bitmask(specs.WORD_SIZE)
 
+    # Instructions run between updates of the run counters
+    STATS_SLICE = 0x1000
+
     def __init__(self):
         self.cycles_ran = 0
+        self.reset_stats()
+
+        # Decode or block caches register their counters here by name, as
+        # objects with hits, misses and invalidations attributes
+        self.caches = {}
         self.registers = Memory(specs.WORD_SIZE)
 
         self.reset_registers()
@@ -69,6 +80,8 @@ class DCPU(object):
                 self.cycles_ran += num_cycles
 
                 return fn(self, *args, **kwargs)
+
+            wrapper.cycles = num_cycles
             return wrapper
 
         return cycle_decorator
@@ -111,21 +124,83 @@ class DCPU(object):
 
     def reset(self):
         '''
-        Set CPU to clean state
+        Set CPU to clean state, with RAM back to the words last loaded
+        with load_words if any
         '''
 
         self.cycles_ran = 0
+        self.reset_stats()
         self.reset_registers()
-        self.RAM.clear()
+        self.RAM.reset()
+
+    def reset_stats(self):
+        self.instructions_ran = 0
+        self.run_time = 0.0
+
+    def add_stats(self, instructions, start):
+        '''
+        Adds a slice of a run that started at time start to the run
+        counters, returning the time it ended
+        '''
+
+        end = time.time()
+
+        self.instructions_ran += instructions
+        self.run_time += end - start
+
+        return end
+
+    def get_stats(self):
+        '''
+        Returns the run counters as a dictionary, with the rates they give,
+        the RAM pages written since the program was loaded and the words
+        whose value that changed
+
+        Ex.
+            {'instructions': 1200, 'cycles': 2600, 'wall_time': 0.01,
+             'instructions_per_second': 120000.0, 'clock_rate_hz': 260000.0,
+             'pages_written': 1, 'words_changed': 12, 'caches': {}}
+        '''
+
+        run_time = self.run_time
+
+        return {
+            'instructions': self.instructions_ran,
+            'cycles': self.cycles_ran,
+            'wall_time': run_time,
+            'instructions_per_second': self.instructions_ran / run_time if run_time else 0.0,
+            'clock_rate_hz': self.cycles_ran / run_time if run_time else 0.0,
+            'pages_written': len(self.RAM.dirty_pages or ()),
+            'words_changed': self.RAM.count_changed_words(),
+            'caches': dict((name, {'hits': cache.hits, 'misses': cache.misses, 'invalidations': cache.invalidations})
+                           for (name, cache) in self.caches.iteritems()),
+        }
 
     def load_program(self, program):
         '''
         Load given instructions into RAM sequentially
         '''
 
+        self.RAM.clear()
+        self.load_words(array('H', [read_instruction(instruction) for instruction in program]))
+
+    def load_words(self, words):
+        '''
+        Load the given WORD_SIZE-bit integers into RAM sequentially in a
+        single copy, e.g. an array('H') produced by the assembler
+
+        Loading the same words again only puts back the pages of RAM
+        written since they were loaded
+        '''
+
+        if len(words) > self.RAM.max_address + 1:
+            raise InvalidMemoryAccess(len(words) - 1)
+
+        if words is not self.RAM.image:
+            self.RAM.clear()
+            self.RAM.load_words(words)
+
         self.reset()
-        for i in range(len(program)):
-            self.RAM[i] = read_instruction(program[i])
 
     def run_program(self, program):
         '''
@@ -133,16 +208,38 @@ class DCPU(object):
         '''
 
         self.load_program(program)
+        self.run()
+
+    def run(self, on_slice=None):
+        '''
+        Runs the program already loaded in RAM and detects any infinite loops
+
+        The run counters are only updated every STATS_SLICE instructions,
+        when on_slice(cpu) is called if given, and when the run ends
+        '''
 
         visited_states = set()
+        count = 0
+        start = time.time()
 
-        while self.execute_next_instruction():
-            state = ("\n").join(self.get_state(show_cycles=False))
+        try:
+            while self.execute_next_instruction():
+                count += 1
+                state = ("\n").join(self.get_state(show_cycles=False))
 
-            if state in visited_states:
-                raise InfiniteLoopDetected()
-            else:
-                visited_states.add(state)
+                if state in visited_states:
+                    raise InfiniteLoopDetected()
+                else:
+                    visited_states.add(state)
+
+                if count == self.STATS_SLICE:
+                    start = self.add_stats(count, start)
+                    count = 0
+
+                    if on_slice is not None:
+                        on_slice(self)
+        finally:
+            self.add_stats(count, start)
 
     def execute_next_instruction(self):
         '''
@@ -415,6 +512,39 @@ class DCPU(object):
     def __str__(self):
         return '\n'.join(self.get_state())
 
+# Cycles taken by each operation, excluding reading the instruction and its next words
+BASIC_OP_CYCLES = {
+    specs.BasicOperations.SET: DCPU.set.cycles,
+    specs.BasicOperations.ADD: DCPU.add.cycles,
+    specs.BasicOperations.SUB: DCPU.subtract.cycles,
+    specs.BasicOperations.MUL: DCPU.multiply.cycles,
+    specs.BasicOperations.DIV: DCPU.divide.cycles,
+    specs.BasicOperations.MOD: DCPU.modulo.cycles,
+    specs.BasicOperations.SHL: DCPU.shift_left.cycles,
+    specs.BasicOperations.SHR: DCPU.shift_right.cycles,
+    specs.BasicOperations.AND: DCPU.boolean_operation.cycles,
+    specs.BasicOperations.BOR: DCPU.boolean_operation.cycles,
+    specs.BasicOperations.XOR: DCPU.boolean_operation.cycles,
+    specs.BasicOperations.IFE: DCPU.if_condition.cycles,
+    specs.BasicOperations.IFN: DCPU.if_condition.cycles,
+    specs.BasicOperations.IFG: DCPU.if_condition.cycles,
+    specs.BasicOperations.IFB: DCPU.if_condition.cycles,
+}
+
+NON_BASIC_OP_CYCLES = {
+    specs.NonBasicOperations.JSR: DCPU.jump_and_set_return.cycles,
+}
+
+def get_cycles(instruction):
+    '''
+    Estimates the cycles taken to execute the given instruction: reading it
+    and its next words plus its operation, not counting a skipped instruction
+    '''
+
+    (op_code, a, b) = parse_instruction(instruction)
+    op_cycles = BASIC_OP_CYCLES if b is not None else NON_BASIC_OP_CYCLES
+
+    return get_word_length(instruction) + op_cycles[op_code]
 
 def get_word_length(instruction):
     '''
@@ -424,6 +554,21 @@ def get_word_length(instruction):
     (_, a, b) = parse_instruction(instruction)
     return 1 + (a in specs.GET_WORD_VALUE_CODES) + (b in specs.GET_WORD_VALUE_CODES)
 
+# SET PC, b with b's bits left out, and the b operands that move SP
+SET_PC = specs.BasicOperations.SET | (specs.SPECIAL_REGISTER_NAMES['PC'] << specs.BASIC_OP_CODE_LENGTH)
+SET_PC_MASK = bitmask(specs.BASIC_OP_CODE_LENGTH + specs.VALUE_LENGTH)
+STACK_CHANGING_CODES = frozenset([specs.STACK_CODE_NAMES['POP'], specs.STACK_CODE_NAMES['PUSH']])
+
+def is_halt_loop(instruction, pc, next_pc):
+    '''
+    Whether the given instruction, executed at pc and leaving PC at
+    next_pc, is a SET PC back to itself that changed nothing else, like
+    :crash SET PC, crash. Executing it again can never change the state
+    '''
+
+    return next_pc == pc and instruction & SET_PC_MASK == SET_PC \
+        and instruction >> (specs.BASIC_OP_CODE_LENGTH + specs.VALUE_LENGTH) not in STACK_CHANGING_CODES
+
 def parse_instruction(instruction):
     '''
     Parses the given WORD_SIZE-bit instruction into an op_code
@@ -453,7 +598,7 @@ def read_instruction(instruction):
 
     value = to_int(instruction, bases_to_try=[16])
 
-    if not value:
+    if value is None:
         raise InvalidInstruction("Could not read instruction as a binary or hexadecimal number", instruction)
 
 
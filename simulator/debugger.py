@@ -0,0 +1,292 @@
+import cmd
+import os
+
+import specifications as specs
+
+from history import HistoryUnavailable
+from memory import WatchedRAM
+from utilities import to_int
+
+class StopReason:
+    BREAKPOINT = "breakpoint"
+    WATCHPOINT = "watchpoint"
+    STOPPED = "stopped"
+    STEPPED = "stepped"
+
+class UnknownLocation(Exception):
+    def __init__(self, location):
+        self.location = location
+
+    def __str__(self):
+        return "Unrecognized address or label: %s" % self.location
+
+class DebuggerError(Exception):
+    pass
+
+class Debugger(object):
+    '''
+    Drives a DCPU with breakpoints and memory watchpoints
+
+    Breakpoints are only looked up in a dedicated run loop that is used
+    when at least one is set, and RAM is only switched to a WatchedRAM
+    while watchpoints exist, so without them execution runs at full speed.
+
+    If a History is given execution is recorded and can be stepped backwards,
+    and with a SourceMap addresses are described with their source line
+    '''
+
+    PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+
+    def __init__(self, cpu, symbols=None, history=None, source_map=None):
+        self.cpu = cpu
+        self.symbols = symbols or {}
+        self.history = history
+        self.source_map = source_map
+        self.breakpoints = set()
+        self.execute = history.step if history else cpu.execute_next_instruction
+
+    def resolve(self, location):
+        '''
+        Returns the address of the given label or number
+        '''
+
+        if isinstance(location, int):
+            return location
+
+        if location in self.symbols:
+            return self.symbols[location]
+
+        address = to_int(location, bases_to_try=[10, 16])
+
+        if address is None or address < 0x0 or address > specs.MAX_RAM_ADDRESS:
+            raise UnknownLocation(location)
+
+        return address
+
+    def describe(self, address):
+        '''
+        Formats an address relative to the closest preceding label
+        '''
+
+        label = None
+        for (name, label_address) in self.symbols.iteritems():
+            if label_address <= address and (label is None or label_address > self.symbols[label]):
+                label = name
+
+        if label is None:
+            description = "%#06x" % address
+        else:
+            offset = address - self.symbols[label]
+            description = "%#06x (%s%s)" % (address, label, "+%d" % offset if offset else "")
+
+        location = self.source_map.lookup(address) if self.source_map else None
+
+        if location is not None:
+            (path, line) = location
+            description += " at %s:%d" % (os.path.basename(path) if path else "", line)
+
+        return description
+
+    def add_breakpoint(self, location):
+        address = self.resolve(location)
+        self.breakpoints.add(address)
+        return address
+
+    def remove_breakpoint(self, location):
+        address = self.resolve(location)
+        self.breakpoints.discard(address)
+        return address
+
+    @property
+    def watching(self):
+        return isinstance(self.cpu.RAM, WatchedRAM)
+
+    @property
+    def watch_hits(self):
+        return self.cpu.RAM.hits if self.watching else []
+
+    def add_watchpoint(self, location, on_read=False, on_write=True):
+        address = self.resolve(location)
+        WatchedRAM.convert(self.cpu.RAM).watch(address, on_read, on_write)
+        return address
+
+    def remove_watchpoint(self, location):
+        address = self.resolve(location)
+
+        if self.watching:
+            ram = self.cpu.RAM
+            ram.unwatch(address)
+
+            if not ram.watched_pages:
+                WatchedRAM.revert(ram)
+
+        return address
+
+    def step(self, n=1):
+        '''
+        Executes up to n instructions, stopping early on a watchpoint hit
+        '''
+
+        del self.watch_hits[:]
+
+        for _ in xrange(n):
+            if not self.execute():
+                return StopReason.STOPPED
+
+            if self.watch_hits:
+                return StopReason.WATCHPOINT
+
+        return StopReason.STEPPED
+
+    def cont(self):
+        '''
+        Runs until a breakpoint or watchpoint is hit or the CPU stops
+        '''
+
+        execute = self.execute
+        registers = self.cpu.registers
+        breakpoints = self.breakpoints
+        watching = self.watching
+
+        del self.watch_hits[:]
+
+        if not breakpoints and not watching:
+            while execute():
+                pass
+
+            return StopReason.STOPPED
+
+        hits = self.watch_hits
+
+        while execute():
+            if watching and hits:
+                return StopReason.WATCHPOINT
+
+            if dict.get(registers, self.PC_CODE, 0) in breakpoints:
+                return StopReason.BREAKPOINT
+
+        return StopReason.STOPPED
+
+    def step_back(self, n=1):
+        if self.history is None:
+            raise DebuggerError("Execution is not being recorded")
+
+        self.history.step_back(n)
+
+    def read_memory(self, location, count=1):
+        '''
+        Returns count words of RAM without triggering watchpoints
+        '''
+
+        address = self.resolve(location)
+        return [dict.get(self.cpu.RAM, a, 0x0)
+                for a in range(address, min(address + count, specs.MAX_RAM_ADDRESS + 1))]
+
+class DebuggerShell(cmd.Cmd):
+    '''
+    Command line interface to a Debugger
+    '''
+
+    prompt = "(dcpu) "
+    WORD_FORMAT = "%04x"
+
+    def __init__(self, debugger, **kwargs):
+        cmd.Cmd.__init__(self, **kwargs)
+        self.debugger = debugger
+
+    def onecmd(self, line):
+        try:
+            return cmd.Cmd.onecmd(self, line)
+        except (UnknownLocation, DebuggerError, HistoryUnavailable, ValueError), e:
+            self.write(str(e))
+        except KeyboardInterrupt:
+            self.write("Interrupted")
+            self.report(StopReason.STEPPED)
+
+    def emptyline(self):
+        pass
+
+    def write(self, line):
+        self.stdout.write(line + "\n")
+
+    def report(self, reason):
+        debugger = self.debugger
+
+        if reason == StopReason.WATCHPOINT:
+            for (address, value, is_write) in debugger.watch_hits:
+                self.write("Watchpoint %s %s: %#06x" % (
+                    "write" if is_write else "read", debugger.describe(address), value))
+
+        elif reason == StopReason.BREAKPOINT:
+            self.write("Breakpoint")
+
+        elif reason == StopReason.STOPPED:
+            self.write("Program stopped")
+
+        self.write("PC: %s" % debugger.describe(debugger.cpu.PC))
+
+    def do_break(self, arg):
+        '''break LOCATION: stop when execution reaches an address or label'''
+        self.write("Breakpoint set at %s" % self.debugger.describe(self.debugger.add_breakpoint(arg.strip())))
+
+    def do_delete(self, arg):
+        '''delete LOCATION: remove a breakpoint'''
+        self.debugger.remove_breakpoint(arg.strip())
+
+    def do_watch(self, arg):
+        '''watch LOCATION [r|w|rw]: stop when an address is read and/or written'''
+        args = arg.split()
+        if not args:
+            raise DebuggerError("watch requires a location")
+
+        mode = args[1] if len(args) > 1 else "w"
+        address = self.debugger.add_watchpoint(args[0], on_read="r" in mode, on_write="w" in mode)
+        self.write("Watchpoint set at %s" % self.debugger.describe(address))
+
+    def do_unwatch(self, arg):
+        '''unwatch LOCATION: remove a watchpoint'''
+        self.debugger.remove_watchpoint(arg.strip())
+
+    def do_step(self, arg):
+        '''step [N]: execute N instructions'''
+        self.report(self.debugger.step(int(arg) if arg.strip() else 1))
+
+    def do_continue(self, arg):
+        '''continue: run until a breakpoint or watchpoint is hit'''
+        self.report(self.debugger.cont())
+
+    def do_back(self, arg):
+        '''back [N]: undo the last N instructions'''
+        self.debugger.step_back(int(arg) if arg.strip() else 1)
+        self.report(StopReason.STEPPED)
+
+    def do_registers(self, arg):
+        '''registers: show the register values'''
+        state = self.debugger.cpu.get_state()
+        self.write("\n".join(state[:state.index("Memory dump")]).rstrip())
+
+    def do_memory(self, arg):
+        '''memory LOCATION [COUNT]: show COUNT words of RAM'''
+        args = arg.split()
+        if not args:
+            raise DebuggerError("memory requires a location")
+
+        address = self.debugger.resolve(args[0])
+        words = self.debugger.read_memory(address, int(args[1]) if len(args) > 1 else 8)
+        self.write("%04x: %s" % (address, " ".join(self.WORD_FORMAT % w for w in words)))
+
+    def do_where(self, arg):
+        '''where: show the current PC'''
+        self.report(StopReason.STEPPED)
+
+    def do_quit(self, arg):
+        '''quit: exit the debugger'''
+        return True
+
+    do_EOF = do_quit
+    do_b = do_break
+    do_s = do_step
+    do_c = do_continue
+    do_r = do_registers
+    do_m = do_memory
+    do_q = do_quit
@@ -0,0 +1,107 @@
+import heapq
+import time
+
+# Instructions run between device updates
+BATCH_INSTRUCTIONS = 0x100
+
+class EventQueue(object):
+    '''
+    Actions a device scheduled for when the CPU reaches a given cycle, so
+    work that takes emulated time completes while the CPU keeps running
+    '''
+
+    def __init__(self):
+        self.events = []
+        self.scheduled = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    def schedule(self, cycle, action, *args):
+        '''
+        Calls action(*args) once cycle is reached, after any action
+        scheduled earlier for the same cycle
+        '''
+
+        heapq.heappush(self.events, (cycle, self.scheduled, action, args))
+        self.scheduled += 1
+
+    def run_due(self, cycles_ran):
+        '''
+        Calls the actions scheduled for cycles_ran or earlier, in order
+        '''
+
+        while self.events and self.events[0][0] <= cycles_ran:
+            (_, _, action, args) = heapq.heappop(self.events)
+            action(*args)
+
+    def next_cycle(self):
+        return self.events[0][0] if self.events else None
+
+def update_devices(cpu, devices):
+    '''
+    Updates every device, returning the earliest cycle any of them needs
+    to be updated at, None if they only need the regular updates
+    '''
+
+    due = None
+
+    for device in devices:
+        cycle = device.update(cpu)
+
+        if cycle is not None and (due is None or cycle < due):
+            due = cycle
+
+    return due
+
+def run_with_devices(cpu, devices, max_instructions=None, on_slice=None, execute=None, batch=BATCH_INSTRUCTIONS):
+    '''
+    Executes the program loaded in cpu until it stops or max_instructions
+    have been executed, calling update(cpu) on each device between batches
+    of instructions. Returns the number of instructions executed
+
+    A device's update returns the cycle it next needs to be updated at, or
+    None, and the batch running then ends as soon as that cycle is reached.
+    Devices only ever touch RAM between instructions, so the CPU never
+    waits on them and they are never polled per instruction
+
+    execute defaults to the interpreter's, and as with DCPU.run the run
+    counters are updated and on_slice(cpu) called every STATS_SLICE
+    instructions
+    '''
+
+    execute = execute or cpu.execute_next_instruction
+    stats_slice = cpu.STATS_SLICE
+
+    count = 0
+    sliced = 0
+    start = time.time()
+    running = True
+
+    due = update_devices(cpu, devices)
+
+    while running and (max_instructions is None or count < max_instructions):
+        end = count + batch
+
+        if max_instructions is not None:
+            end = min(end, max_instructions)
+
+        while count < end and (due is None or cpu.cycles_ran < due):
+            if not execute():
+                running = False
+                break
+
+            count += 1
+
+        due = update_devices(cpu, devices)
+
+        if count - sliced >= stats_slice:
+            start = cpu.add_stats(count - sliced, start)
+            sliced = count
+
+            if on_slice is not None:
+                on_slice(cpu)
+
+    cpu.add_stats(count - sliced, start)
+
+    return count
@@ -0,0 +1,218 @@
+import mmap
+import os
+from array import array
+
+import specifications as specs
+
+from devices import EventQueue
+from memory import RAM
+from image import to_big_endian
+
+# Where the disk's registers are mapped in RAM
+DISK_ADDRESS = 0x9200
+
+class DiskRegisters:
+    COMMAND = 0x0       # writing a command starts it, set back to 0x0 once it has
+    STATUS = 0x1        # whether the disk is ready, busy or failed the last command, read only
+    SECTOR_HIGH = 0x2   # the first sector to transfer
+    SECTOR_LOW = 0x3
+    ADDRESS = 0x4       # where in RAM the sectors go to or come from
+    COUNT = 0x5         # the number of sectors to transfer
+    SECTORS_HIGH = 0x6  # the number of sectors on the disk, read only
+    SECTORS_LOW = 0x7
+
+DISK_WORDS = 8
+
+class DiskCommands:
+    READ = 0x1
+    WRITE = 0x2
+
+class DiskStatus:
+    READY = 0x0
+    BUSY = 0x1
+    ERROR = 0x2
+
+SECTOR_WORDS = 0x200
+SECTOR_BYTES = SECTOR_WORDS * 2
+
+# Emulated cycles a transfer takes, as a seek and then per sector
+SEEK_CYCLES = 1000
+SECTOR_CYCLES = 100
+
+RAM_WORDS = specs.MAX_RAM_ADDRESS + 1
+
+class Disk(object):
+    '''
+    A device exposing a host file as sectors of SECTOR_WORDS big-endian
+    16-bit words, through registers mapped at DISK_ADDRESS
+
+    A program sets the sector, address and count registers and writes a
+    command. With the RAM converted to a DiskRAM, STATUS reads BUSY as soon
+    as the command is written. The disk picks the command up between
+    batches of instructions and schedules the transfer for seek_cycles plus
+    sector_cycles per sector later, the CPU running on meanwhile. The
+    transfer itself is a single copy between a slice of the memory mapped
+    file and RAM
+
+    Any trailing part of the file short of a whole sector isn't used
+    '''
+
+    def __init__(self, path, read_only=False, seek_cycles=SEEK_CYCLES, sector_cycles=SECTOR_CYCLES):
+        self.path = path
+        self.read_only = read_only
+        self.seek_cycles = seek_cycles
+        self.sector_cycles = sector_cycles
+
+        f = open(path, 'rb' if read_only else 'r+b')
+        try:
+            self.sectors = os.fstat(f.fileno()).st_size / SECTOR_BYTES
+
+            if not self.sectors:
+                raise InvalidDisk(path)
+
+            self.buffer = mmap.mmap(f.fileno(), self.sectors * SECTOR_BYTES,
+                                    access=mmap.ACCESS_READ if read_only else mmap.ACCESS_WRITE)
+        finally:
+            f.close()
+
+        self.events = EventQueue()
+        self.status = DiskStatus.READY
+
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+
+    def read_register(self, ram, register):
+        return dict.get(ram, DISK_ADDRESS + register, 0x0)
+
+    def write_register(self, ram, register, value):
+        ram[DISK_ADDRESS + register] = value
+
+    def update(self, cpu):
+        '''
+        Completes the transfers that are due and starts the command written
+        since the last update, if any. Returns the cycle the transfer under
+        way completes at
+        '''
+
+        ram = cpu.RAM
+
+        self.events.run_due(cpu.cycles_ran)
+
+        if not self.events and self.read_register(ram, DiskRegisters.COMMAND):
+            self.start(cpu)
+
+        for (register, value) in [(DiskRegisters.STATUS, self.status),
+                                  (DiskRegisters.SECTORS_HIGH, self.sectors >> specs.WORD_SIZE),
+                                  (DiskRegisters.SECTORS_LOW, self.sectors & 0xffff)]:
+            if self.read_register(ram, register) != value:
+                self.write_register(ram, register, value)
+
+        return self.events.next_cycle()
+
+    def command_written(self, ram):
+        '''
+        Reports BUSY straight away for a command the next update starts
+        '''
+
+        self.status = DiskStatus.BUSY
+        self.write_register(ram, DiskRegisters.STATUS, DiskStatus.BUSY)
+
+    def start(self, cpu):
+        ram = cpu.RAM
+
+        command = self.read_register(ram, DiskRegisters.COMMAND)
+        sector = (self.read_register(ram, DiskRegisters.SECTOR_HIGH) << specs.WORD_SIZE) | \
+            self.read_register(ram, DiskRegisters.SECTOR_LOW)
+        address = self.read_register(ram, DiskRegisters.ADDRESS)
+        count = self.read_register(ram, DiskRegisters.COUNT)
+
+        self.write_register(ram, DiskRegisters.COMMAND, 0x0)
+
+        if command not in (DiskCommands.READ, DiskCommands.WRITE) or not count \
+                or sector + count > self.sectors or address + count * SECTOR_WORDS > RAM_WORDS \
+                or (command == DiskCommands.WRITE and self.read_only):
+            self.status = DiskStatus.ERROR
+            self.errors += 1
+            return
+
+        self.status = DiskStatus.BUSY
+        self.events.schedule(cpu.cycles_ran + self.seek_cycles + count * self.sector_cycles,
+                             self.transfer, ram, command, sector, address, count)
+
+    def transfer(self, ram, command, sector, address, count):
+        if command == DiskCommands.READ:
+            ram.write_words(address, self.read_sectors(sector, count))
+            self.reads += count
+        else:
+            self.write_sectors(sector, ram.read_words(address, count * SECTOR_WORDS))
+            self.writes += count
+
+        self.status = DiskStatus.READY
+
+    def read_sectors(self, sector, count):
+        start = sector * SECTOR_BYTES
+
+        words = array('H')
+        words.fromstring(self.buffer[start:start + count * SECTOR_BYTES])
+
+        return to_big_endian(words)
+
+    def write_sectors(self, sector, words):
+        start = sector * SECTOR_BYTES
+        self.buffer[start:start + len(words) * 2] = to_big_endian(words).tostring()
+
+    def close(self):
+        if not self.read_only:
+            self.buffer.flush()
+
+        self.buffer.close()
+
+class DiskRAM(RAM):
+    '''
+    RAM that tells a Disk when a command is written to its COMMAND register
+
+    Converting RAM that is already a RAM subclass (e.g. a ThreadedRAM)
+    keeps its behaviour, the disk's being added on top
+    '''
+
+    combined_classes = {}
+
+    @classmethod
+    def convert(cls, ram, disk):
+        '''
+        Turns the given RAM into a DiskRAM in place, so anything already
+        holding a reference to it (e.g. a DCPU) talks to disk
+        '''
+
+        base = ram.__class__
+
+        if not issubclass(base, cls):
+            combined = cls if base is RAM else cls.combined_classes.get(base)
+
+            if combined is None:
+                combined = cls.combined_classes[base] = type('Disk' + base.__name__, (cls, base), {})
+
+            ram.__class__ = combined
+            ram.base_class = base
+
+        ram.disk = disk
+
+        return ram
+
+    @staticmethod
+    def revert(ram):
+        ram.__class__ = ram.base_class
+
+    def __setitem__(self, key, val):
+        super(DiskRAM, self).__setitem__(key, val)
+
+        if key == DISK_ADDRESS + DiskRegisters.COMMAND and dict.get(self, key):
+            self.disk.command_written(self)
+
+class InvalidDisk(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Disk file holds less than a sector of %d words: %s" % (SECTOR_WORDS, self.path)
@@ -0,0 +1,268 @@
+import multiprocessing
+import random
+
+import specifications as specs
+
+from dcpu import DCPU, OpCodeNotImplemented, InvalidValueCode
+from memory import InvalidMemoryAccess, InvalidMemoryValue
+from utilities import bitmask
+
+WORD_MASK = bitmask(specs.WORD_SIZE)
+
+# The errors a program can make the DCPU raise
+PROGRAM_ERRORS = (OpCodeNotImplemented, InvalidValueCode, InvalidMemoryAccess, InvalidMemoryValue)
+
+# Values at the edges of what programs tend to check for
+INTERESTING_VALUES = [0x0, 0x1, 0x1f, 0x20, 0x7fff, 0x8000, 0xfffe, 0xffff]
+
+class Crash(object):
+    '''
+    An input that made the program raise, with the address of the
+    instruction that raised
+    '''
+
+    def __init__(self, values, error, pc):
+        self.values = values
+        self.error = error.__class__.__name__
+        self.message = str(error)
+        self.pc = pc
+
+    @property
+    def key(self):
+        return (self.error, self.pc)
+
+class Fuzzer(object):
+    '''
+    Runs the program loaded in a DCPU over and over on mutated inputs,
+    looking for inputs that make it raise
+
+    An input is the values of the given registers followed by the words of
+    the given (start, length) RAM regions. The CPU's state when the fuzzer
+    is created is kept as the starting point for every run: writes are
+    logged through write_log and undone after each run, so restoring costs
+    as much as the run wrote rather than reloading the program.
+
+    Inputs reaching a (previous PC, PC) transition no earlier input reached
+    are added to the corpus, which the next inputs are mutated from
+    '''
+
+    PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+
+    def __init__(self, cpu, regions=(), registers=(), max_cycles=10000, seed=0):
+        self.cpu = cpu
+        self.regions = list(regions)
+        self.registers = list(registers)
+        self.max_cycles = max_cycles
+        self.random = random.Random(seed)
+
+        self.cycles_ran = cpu.cycles_ran
+        self.log = []
+        cpu.registers.write_log = self.log
+        cpu.RAM.write_log = self.log
+
+        self.corpus = [self.get_input()]
+        self.coverage = set()
+        self.crashes = {}
+        self.executions = 0
+        self.timeouts = 0
+
+    def get_input(self):
+        values = [self.cpu.registers[code] for code in self.registers]
+
+        for (start, length) in self.regions:
+            values.extend(self.cpu.RAM[address] for address in xrange(start, start + length))
+
+        return values
+
+    def set_input(self, values):
+        for (code, value) in zip(self.registers, values):
+            self.cpu.registers[code] = value
+
+        index = len(self.registers)
+        for (start, length) in self.regions:
+            for address in xrange(start, start + length):
+                self.cpu.RAM[address] = values[index]
+                index += 1
+
+    def restore(self):
+        '''
+        Undoes every write since the last restore
+        '''
+
+        log = self.log
+
+        for i in xrange(len(log) - 1, -1, -1):
+            (memory, key, previous) = log[i]
+
+            if previous is None:
+                dict.pop(memory, key, None)
+            else:
+                dict.__setitem__(memory, key, previous)
+
+        del log[:]
+        self.cpu.cycles_ran = self.cycles_ran
+
+    def execute(self, values):
+        '''
+        Runs the program on the given input until it stops, raises or runs
+        out of cycles, then restores the starting state. Returns the set of
+        transitions it went through and the Crash if it raised
+        '''
+
+        cpu = self.cpu
+        registers = cpu.registers
+        execute = cpu.execute_next_instruction
+        pc_code = self.PC_CODE
+        end = self.cycles_ran + self.max_cycles
+
+        edges = set()
+        crash = None
+
+        self.set_input(values)
+        pc = dict.get(registers, pc_code, 0)
+
+        try:
+            while cpu.cycles_ran < end:
+                if not execute():
+                    break
+
+                next_pc = dict.get(registers, pc_code, 0)
+                edges.add(pc << specs.WORD_SIZE | next_pc)
+                pc = next_pc
+            else:
+                self.timeouts += 1
+        except PROGRAM_ERRORS, error:
+            crash = Crash(values, error, pc)
+
+        self.restore()
+        self.executions += 1
+
+        return (edges, crash)
+
+    def mutate(self, values):
+        '''
+        Returns a copy of values with a few words changed
+        '''
+
+        values = list(values)
+
+        if not values:
+            return values
+
+        for _ in xrange(self.random.randint(1, 4)):
+            index = self.random.randrange(len(values))
+            choice = self.random.random()
+
+            if choice < 0.3:
+                values[index] ^= 1 << self.random.randrange(specs.WORD_SIZE)
+            elif choice < 0.5:
+                values[index] = (values[index] + self.random.randint(-16, 16)) & WORD_MASK
+            elif choice < 0.7:
+                values[index] = self.random.choice(INTERESTING_VALUES)
+            elif choice < 0.85:
+                values[index] = self.random.randint(0x0, WORD_MASK)
+            else:
+                # Splice in a word from another input in the corpus
+                other = self.random.choice(self.corpus)
+                values[index] = other[index]
+
+        return values
+
+    def add(self, values, edges, crash):
+        '''
+        Records the result of executing values, adding them to the corpus if
+        they reached new transitions. Returns whether they were added
+        '''
+
+        if crash is not None:
+            self.crashes.setdefault(crash.key, crash)
+
+        if not edges <= self.coverage:
+            self.coverage |= edges
+            self.corpus.append(values)
+            return True
+
+        return False
+
+    def run(self, iterations):
+        '''
+        Executes iterations mutated inputs, returning how many were added to the corpus
+        '''
+
+        added = 0
+
+        # The corpus may come from elsewhere, find out what it covers
+        for values in self.corpus:
+            (edges, crash) = self.execute(values)
+            self.coverage |= edges
+
+            if crash is not None:
+                self.crashes.setdefault(crash.key, crash)
+
+        for _ in xrange(iterations):
+            values = self.mutate(self.random.choice(self.corpus))
+            added += self.add(values, *self.execute(values))
+
+        return added
+
+def fuzz_worker(args):
+    '''
+    Fuzzes from a fresh DCPU, run in each worker process
+    '''
+
+    (words, regions, registers, max_cycles, seed, corpus, iterations) = args
+
+    cpu = DCPU()
+    cpu.load_words(words)
+
+    fuzzer = Fuzzer(cpu, regions, registers, max_cycles, seed)
+    fuzzer.corpus.extend(corpus)
+    fuzzer.run(iterations)
+
+    return (fuzzer.corpus, fuzzer.coverage, fuzzer.crashes, fuzzer.executions, fuzzer.timeouts)
+
+def fuzz(words, regions=(), registers=(), max_cycles=10000, iterations=1000, jobs=None, rounds=4, seed=0):
+    '''
+    Fuzzes the program made of words in jobs processes, each running its
+    share of iterations in every round and starting the next round from
+    the corpus all of them built
+
+    Returns (corpus, coverage, crashes, executions, timeouts), crashes
+    mapping (error, pc) to the first Crash found for it
+    '''
+
+    jobs = jobs or multiprocessing.cpu_count()
+    words = list(words)
+
+    corpus = []
+    coverage = set()
+    crashes = {}
+    executions = 0
+    timeouts = 0
+
+    pool = multiprocessing.Pool(jobs)
+
+    try:
+        share = max(1, iterations / (jobs * rounds))
+
+        for number in xrange(rounds):
+            work = [(words, regions, registers, max_cycles, seed + number * jobs + job, corpus, share)
+                    for job in xrange(jobs)]
+
+            for (worker_corpus, worker_coverage, worker_crashes, worker_executions, worker_timeouts) \
+                    in pool.map(fuzz_worker, work):
+                for values in worker_corpus:
+                    if values not in corpus:
+                        corpus.append(values)
+
+                coverage |= worker_coverage
+                executions += worker_executions
+                timeouts += worker_timeouts
+
+                for (key, crash) in worker_crashes.iteritems():
+                    crashes.setdefault(key, crash)
+    finally:
+        pool.close()
+        pool.join()
+
+    return (corpus, coverage, crashes, executions, timeouts)
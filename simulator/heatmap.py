@@ -0,0 +1,257 @@
+import math
+import time
+from array import array
+
+import specifications as specs
+
+from dcpu import is_halt_loop
+from memory import RAM
+
+RAM_WORDS = specs.MAX_RAM_ADDRESS + 1
+
+# The binary heatmap is a greyscale PGM image, a row of pixels per page
+HEATMAP_WIDTH = 1 << RAM.PAGE_BITS
+HEATMAP_MAX_VALUE = 255
+
+class CountingRAM(RAM):
+    '''
+    RAM that counts every access to each address in the arrays of a
+    Heatmap. Reading the word at PC is counted as a fetch rather than a
+    read, so instructions don't drown out the data they work on
+    '''
+
+    @classmethod
+    def convert(cls, ram, heatmap):
+        '''
+        Turns the given RAM into a CountingRAM in place, so anything already
+        holding a reference to it (e.g. a DCPU) is counted
+        '''
+
+        ram.__class__ = cls
+        ram.heatmap = heatmap
+
+        return ram
+
+    @staticmethod
+    def revert(ram):
+        ram.__class__ = RAM
+
+    def __getitem__(self, key):
+        value = super(CountingRAM, self).__getitem__(key)
+        heatmap = self.heatmap
+
+        if key == dict.get(heatmap.registers, heatmap.PC_CODE, 0):
+            heatmap.fetches[key] += 1
+        else:
+            heatmap.reads[key] += 1
+
+        heatmap.touch(key)
+
+        return value
+
+    def __setitem__(self, key, val):
+        super(CountingRAM, self).__setitem__(key, val)
+
+        self.heatmap.writes[key] += 1
+        self.heatmap.touch(key)
+
+    def write_words(self, address, words):
+        super(CountingRAM, self).write_words(address, words)
+
+        for key in xrange(address, address + len(words)):
+            self.heatmap.writes[key] += 1
+            self.heatmap.touch(key)
+
+class Heatmap(object):
+    '''
+    Counts the reads, writes and instruction fetches of every RAM address
+    during a run, along with the number of words touched in each window of
+    instructions (the working set) and the lowest SP reached
+
+    Counts are kept in flat arrays preallocated for the whole of RAM, so
+    counting an access is an index rather than a dictionary update
+    '''
+
+    PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+    SP_CODE = specs.SPECIAL_REGISTER_NAMES['SP']
+
+    def __init__(self, window=1000):
+        self.window = window
+
+        self.reads = array('L', [0]) * RAM_WORDS
+        self.writes = array('L', [0]) * RAM_WORDS
+        self.fetches = array('L', [0]) * RAM_WORDS
+
+        # The window each address was last touched in, counting from 1
+        self.last_window = array('L', [0]) * RAM_WORDS
+        self.current_window = 1
+        self.window_words = 0
+        self.working_sets = []
+
+        self.lowest_sp = specs.MAX_RAM_ADDRESS
+        self.registers = None
+
+    def touch(self, address):
+        if self.last_window[address] != self.current_window:
+            self.last_window[address] = self.current_window
+            self.window_words += 1
+
+    def end_window(self):
+        self.working_sets.append(self.window_words)
+        self.current_window += 1
+        self.window_words = 0
+
+    def run(self, cpu, max_instructions=None):
+        '''
+        Executes the program loaded in cpu until it stops, reaches an
+        instruction that jumps to itself or max_instructions have been
+        executed. Returns the number of instructions executed
+        '''
+
+        self.registers = registers = cpu.registers
+        ram = cpu.RAM
+        execute = cpu.execute_next_instruction
+        pc_code = self.PC_CODE
+        sp_code = self.SP_CODE
+        window = self.window
+
+        count = 0
+        windowed = 0
+        start = time.time()
+
+        CountingRAM.convert(cpu.RAM, self)
+
+        try:
+            while max_instructions is None or count < max_instructions:
+                pc = dict.get(registers, pc_code, 0)
+                word = dict.get(ram, pc, 0)
+
+                if not execute():
+                    break
+
+                count += 1
+                next_pc = dict.get(registers, pc_code, 0)
+
+                if next_pc == pc and is_halt_loop(word, pc, next_pc):
+                    break
+
+                sp = dict.get(registers, sp_code, 0)
+                if sp < self.lowest_sp:
+                    self.lowest_sp = sp
+
+                if count - windowed == window:
+                    self.end_window()
+                    windowed = count
+        finally:
+            CountingRAM.revert(cpu.RAM)
+            cpu.add_stats(count, start)
+
+        if count > windowed:
+            self.end_window()
+
+        return count
+
+    @property
+    def stack_depth(self):
+        '''
+        The most words the stack held at once, as it grows down from the top of RAM
+        '''
+
+        return specs.MAX_RAM_ADDRESS - self.lowest_sp
+
+    def get_accesses(self):
+        '''
+        Returns the reads, writes and fetches of every address added up
+        '''
+
+        return array('L', (reads + writes + fetches for (reads, writes, fetches) in
+                           zip(self.reads, self.writes, self.fetches)))
+
+    def get_hot_regions(self, count=None):
+        '''
+        Returns (start, end, reads, writes, fetches) for each run of
+        consecutive addresses that were accessed, end excluded, the most
+        accessed first
+        '''
+
+        regions = []
+        start = None
+
+        for (address, accesses) in enumerate(self.get_accesses()):
+            if accesses and start is None:
+                start = address
+            elif not accesses and start is not None:
+                regions.append(self.get_region(start, address))
+                start = None
+
+        if start is not None:
+            regions.append(self.get_region(start, RAM_WORDS))
+
+        regions.sort(key=lambda region: (-sum(region[2:]), region[0]))
+
+        return regions[:count] if count is not None else regions
+
+    def get_region(self, start, end):
+        return (start, end, sum(self.reads[start:end]), sum(self.writes[start:end]), sum(self.fetches[start:end]))
+
+    def get_page_totals(self):
+        '''
+        Returns (start, reads, writes, fetches, words) for each page that was
+        accessed, words being the number of its addresses that were
+        '''
+
+        totals = []
+        size = 1 << RAM.PAGE_BITS
+        accesses = self.get_accesses()
+
+        for page in xrange(RAM_WORDS / size):
+            start = page * size
+            words = sum(1 for total in accesses[start:start + size] if total)
+
+            if words:
+                totals.append((start,) + self.get_region(start, start + size)[2:] + (words,))
+
+        return totals
+
+    def get_label_totals(self, source_map):
+        '''
+        Returns a dictionary mapping each label to the (reads, writes, fetches)
+        of the program's words from it up to the next label. Accesses outside
+        the program are counted under None
+        '''
+
+        totals = {}
+
+        for (address, counts) in enumerate(zip(self.reads, self.writes, self.fetches)):
+            if not any(counts):
+                continue
+
+            label = source_map.get_label(address) if address < source_map.size else None
+            name = label[0] if label else None
+
+            total = totals.get(name, (0, 0, 0))
+            totals[name] = tuple(a + b for (a, b) in zip(total, counts))
+
+        return totals
+
+    def get_heatmap(self):
+        '''
+        Returns a byte per address for its accesses on a log scale, 0 for
+        addresses that were never accessed and HEATMAP_MAX_VALUE for the most
+        accessed
+        '''
+
+        accesses = self.get_accesses()
+        highest = max(accesses)
+        scale = (HEATMAP_MAX_VALUE - 1) / math.log(highest) if highest > 1 else 0
+
+        return array('B', (1 + int(round(math.log(total) * scale)) if total else 0 for total in accesses))
+
+    def save_heatmap(self, f):
+        '''
+        Writes the heatmap to the open binary file f as a PGM image, one row
+        of HEATMAP_WIDTH pixels per page of RAM
+        '''
+
+        f.write("P5\n%d %d\n%d\n" % (HEATMAP_WIDTH, RAM_WORDS / HEATMAP_WIDTH, HEATMAP_MAX_VALUE))
+        f.write(self.get_heatmap().tostring())
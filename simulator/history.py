@@ -0,0 +1,224 @@
+from array import array
+
+class HistoryUnavailable(Exception):
+    def __init__(self, position):
+        self.position = position
+
+    def __str__(self):
+        return "No recorded history for instruction %d" % self.position
+
+class Snapshot(object):
+    '''
+    A full copy of the CPU registers, RAM and cycle count
+    '''
+
+    def __init__(self, cpu):
+        self.cycles_ran = cpu.cycles_ran
+        self.registers = dict(cpu.registers)
+        self.RAM = dict(cpu.RAM)
+
+    @property
+    def size(self):
+        return 1 + len(self.registers) + len(self.RAM)
+
+    def restore(self, cpu):
+        # Values were validated when first written, bypass the write paths
+        cpu.cycles_ran = self.cycles_ran
+
+        dict.clear(cpu.registers)
+        dict.update(cpu.registers, self.registers)
+
+        dict.clear(cpu.RAM)
+        dict.update(cpu.RAM, self.RAM)
+
+class Segment(object):
+    '''
+    A snapshot followed by the write deltas of every instruction
+    executed after it
+
+    pcs[i] and cycles[i] hold PC and cycles_ran before the i-th instruction,
+    whose (memory, key, previous value) writes are log[starts[i]:starts[i+1]]
+    '''
+
+    def __init__(self, cpu, position):
+        self.position = position
+        self.snapshot = Snapshot(cpu)
+        self.pcs = array('H')
+        self.cycles = array('L')
+        self.starts = array('L')
+        self.log = []
+
+    def __len__(self):
+        return len(self.pcs)
+
+    @property
+    def size(self):
+        return self.snapshot.size + 3 * len(self.pcs) + len(self.log)
+
+    def undo(self, cpu, count):
+        '''
+        Reverts the last count instructions of the segment
+        '''
+
+        if count <= 0:
+            return
+
+        index = len(self.pcs) - count
+        log = self.log
+
+        for i in xrange(len(log) - 1, self.starts[index] - 1, -1):
+            (memory, key, previous) = log[i]
+
+            if previous is None:
+                dict.pop(memory, key, None)
+            else:
+                dict.__setitem__(memory, key, previous)
+
+        cpu.cycles_ran = self.cycles[index]
+
+        self.truncate(index)
+
+    def truncate(self, index):
+        '''
+        Forgets every instruction recorded from index onwards
+        '''
+
+        if index < len(self.pcs):
+            del self.log[self.starts[index]:]
+
+        del self.pcs[index:]
+        del self.cycles[index:]
+        del self.starts[index:]
+
+class History(object):
+    '''
+    Records the execution of a DCPU so it can be stepped backwards
+
+    A full snapshot is taken every snapshot_interval instructions and every
+    register/RAM write in between is logged along with the value it replaced.
+    Recorded history is measured in words and entries, when it grows past
+    budget the oldest segments are discarded first.
+    '''
+
+    def __init__(self, cpu, snapshot_interval=1000, budget=1000000):
+        self.cpu = cpu
+        self.snapshot_interval = snapshot_interval
+        self.budget = budget
+
+        self.position = 0
+        self.segments = []
+
+        self.start_segment()
+
+    @property
+    def earliest(self):
+        '''
+        The earliest instruction position that can be returned to
+        '''
+
+        return self.segments[0].position
+
+    @property
+    def size(self):
+        return sum(segment.size for segment in self.segments)
+
+    def attach(self, log):
+        self.cpu.registers.write_log = log
+        self.cpu.RAM.write_log = log
+
+    def detach(self):
+        self.attach(None)
+
+    def start_segment(self):
+        segment = Segment(self.cpu, self.position)
+        self.segments.append(segment)
+        self.attach(segment.log)
+
+        while len(self.segments) > 1 and self.size > self.budget:
+            del self.segments[0]
+
+        return segment
+
+    def step(self):
+        '''
+        Executes and records the next instruction, returns False if the
+        CPU stopped
+        '''
+
+        segment = self.segments[-1]
+
+        if len(segment) >= self.snapshot_interval:
+            segment = self.start_segment()
+
+        segment.pcs.append(self.cpu.PC)
+        segment.cycles.append(self.cpu.cycles_ran)
+        segment.starts.append(len(segment.log))
+
+        self.position += 1
+
+        return self.cpu.execute_next_instruction()
+
+    def run(self, max_instructions=None):
+        '''
+        Steps until the CPU stops or max_instructions have been executed
+        '''
+
+        executed = 0
+
+        while max_instructions is None or executed < max_instructions:
+            executed += 1
+
+            if not self.step():
+                break
+
+        return executed
+
+    def step_back(self, n=1):
+        '''
+        Returns the CPU to its state n instructions ago
+
+        Within the current segment the logged writes are undone, anything
+        older is reached by restoring the nearest snapshot and replaying forward
+        '''
+
+        target = self.position - n
+
+        if n < 0 or target < self.earliest:
+            raise HistoryUnavailable(target)
+
+        index = len(self.segments) - 1
+        while self.segments[index].position > target:
+            index -= 1
+
+        segment = self.segments[index]
+
+        if index == len(self.segments) - 1:
+            segment.undo(self.cpu, self.position - target)
+            self.position = target
+            return
+
+        del self.segments[index + 1:]
+
+        segment.truncate(0)
+        segment.snapshot.restore(self.cpu)
+        self.attach(segment.log)
+        self.position = segment.position
+
+        while self.position < target:
+            self.step()
+
+    def run_back_to(self, pc):
+        '''
+        Steps back to the most recent point at which PC was about to
+        execute the given address
+        '''
+
+        position = self.position
+
+        for segment in reversed(self.segments):
+            for i in xrange(len(segment) - 1, -1, -1):
+                if segment.pcs[i] == pc:
+                    self.step_back(position - (segment.position + i))
+                    return
+
+        raise HistoryUnavailable(pc)
@@ -0,0 +1,78 @@
+import mmap
+import os
+import sys
+from array import array
+
+import specifications as specs
+
+from dcpu import read_instruction
+
+def to_big_endian(words):
+    '''
+    Converts an array of words between native and big-endian
+    byte order, which is its own inverse
+    '''
+
+    if sys.byteorder == 'little':
+        words = array('H', words)
+        words.byteswap()
+
+    return words
+
+def read_image(path):
+    '''
+    Reads machine code from a file, either as one hex word per line for
+    MACHINE_FILE_EXT files or as raw big-endian 16-bit words otherwise
+    '''
+
+    if os.path.splitext(path)[1] == '.' + specs.MACHINE_FILE_EXT:
+        f = open(path)
+        words = array('H', (read_instruction(line.strip()) for line in f if line.strip()))
+        f.close()
+
+        return words
+
+    f = open(path, 'rb')
+    words = array('H')
+    words.fromstring(f.read())
+    f.close()
+
+    return to_big_endian(words)
+
+def map_image(path):
+    '''
+    Reads a file of raw big-endian 16-bit words through a memory map,
+    copying it into an array in one go
+    '''
+
+    f = open(path, 'rb')
+    words = array('H')
+
+    try:
+        size = os.fstat(f.fileno()).st_size
+
+        if size % words.itemsize:
+            raise InvalidImage(path)
+
+        if size:
+            data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            words.fromstring(data[:])
+            data.close()
+    finally:
+        f.close()
+
+    return to_big_endian(words)
+
+def write_image(words, f):
+    '''
+    Writes words to a file as raw big-endian 16-bit words
+    '''
+
+    f.write(to_big_endian(array('H', words)).tostring())
+
+class InvalidImage(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Not a file of 16-bit words: %s" % self.path
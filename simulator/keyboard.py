@@ -0,0 +1,146 @@
+import os
+import threading
+import Queue
+from collections import deque
+
+# The 1.1 era keyboard: a ring buffer of 16 words that keys are written
+# into in turn. A program takes a key by reading a non-zero word at its own
+# position in the ring and writing 0x0 back to free the slot
+KEYBOARD_ADDRESS = 0x9000
+KEYBOARD_BUFFER_WORDS = 0x10
+
+# How much of a file or pipe the reader asks for at once
+READ_SIZE = 1024
+
+class Keyboard(object):
+    '''
+    A device that types keys into the keyboard ring buffer in RAM whenever
+    the slot they go to is free, holding on to them otherwise
+
+    Keys come from a background KeyboardReader through a thread-safe queue,
+    or from a key script at the cycles it gives. Both are only looked at
+    in update, between batches of instructions
+    '''
+
+    def __init__(self, script=()):
+        self.received = Queue.Queue()
+        self.waiting = deque()
+        self.position = 0
+
+        # (cycle, keys) typed once the CPU reaches cycle, in order
+        self.script = deque(sorted(script, key=lambda event: event[0]))
+
+        self.typed = 0
+
+    def type(self, keys):
+        '''
+        Queues keys to be typed, safe to call from any thread
+        '''
+
+        for key in keys:
+            if key:
+                self.received.put(key)
+
+    def update(self, cpu):
+        '''
+        Types as many waiting keys as there are free slots, returning the
+        cycle the next scripted keys are due at
+        '''
+
+        while self.script and self.script[0][0] <= cpu.cycles_ran:
+            self.waiting.extend(key for key in self.script.popleft()[1] if key)
+
+        while True:
+            try:
+                self.waiting.append(self.received.get_nowait())
+            except Queue.Empty:
+                break
+
+        ram = cpu.RAM
+
+        while self.waiting:
+            address = KEYBOARD_ADDRESS + self.position
+
+            if ram[address]:
+                break
+
+            ram[address] = self.waiting.popleft()
+            self.position = (self.position + 1) % KEYBOARD_BUFFER_WORDS
+            self.typed += 1
+
+        return self.script[0][0] if self.script else None
+
+class KeyboardReader(object):
+    '''
+    Reads keys from a file, pipe or terminal in a background thread and
+    hands them to a Keyboard, so the CPU never blocks on input
+
+    A terminal only passes keys on once a line is entered
+    '''
+
+    def __init__(self, keyboard, f):
+        self.keyboard = keyboard
+        self.f = f
+
+        self.thread = threading.Thread(target=self.read)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def read(self):
+        while True:
+            data = os.read(self.f.fileno(), READ_SIZE)
+
+            if not data:
+                break
+
+            self.keyboard.type(get_keys(data))
+
+def get_keys(text):
+    '''
+    Returns the key codes typing text produces, a new line as 0xa
+    '''
+
+    return [ord(character) for character in text.replace('\r\n', '\n')]
+
+def load_key_script(path):
+    '''
+    Reads a key script, each line holding the cycle to type at and the
+    text to type, with backslash escapes such as \\n. Blank lines and
+    lines starting with # are skipped
+
+    Ex.
+        0 hello\\n
+        5000 quit\\n
+    '''
+
+    script = []
+
+    f = open(path)
+    try:
+        for (number, line) in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+
+            if not line.strip() or line.startswith('#'):
+                continue
+
+            (cycle, _, text) = line.partition(' ')
+
+            try:
+                script.append((int(cycle, 0), get_keys(text.decode('string_escape'))))
+            except ValueError:
+                raise InvalidKeyScript(path, number)
+    finally:
+        f.close()
+
+    return script
+
+class InvalidKeyScript(Exception):
+    def __init__(self, path, line):
+        self.path = path
+        self.line = line
+
+    def __str__(self):
+        return "Invalid key script line %s:%d, expected a cycle followed by the text to type" % (self.path, self.line)
@@ -1,3 +1,6 @@
+from array import array
+from itertools import izip
+
 from utilities import bitmask
 
 class InvalidMemoryAccess(Exception):
@@ -18,15 +21,23 @@ class Memory(dict):
     '''
     A dictionary that forces values to be set within the range [0x0, word_size - 1]
     Any access to an unset key returns 0x0
+
+    If write_log is set to a list, every write appends a
+    (memory, key, previous value) entry to it, the previous value
+    being None for keys that were unset
     '''
 
     def __init__(self, word_size):
         self.word_mask = bitmask(word_size)
+        self.write_log = None
 
     def __setitem__(self, key, val):
         if not isinstance(val, int):
             raise InvalidMemoryValue(val)
 
+        if self.write_log is not None:
+            self.write_log.append((self, key, dict.get(self, key)))
+
         super(Memory, self).__setitem__(key, (val & self.word_mask))
 
     def __getitem__(self, key):
@@ -36,14 +47,22 @@ class RAM(Memory):
     '''
     A block of memory that only accepts keys which are hex values
     between 0x0 and max_address. 
+
+    After load_words the words loaded are kept as image and the pages
+    written since are tracked in dirty_pages, so reset only has to put
+    those pages back
     '''
 
     DUMP_WORDS_PER_ROW = 8
     DUMP_HEX_FORMAT = '%04x'
 
+    PAGE_BITS = 8
+
     def __init__(self, word_size, max_address):
         super(RAM, self).__init__(word_size)
         self.max_address = max_address
+        self.image = None
+        self.dirty_pages = None
 
     def check_RAM_access(self, address):
         if isinstance(address, int) and(address < 0x0 or address > self.max_address):
@@ -53,10 +72,113 @@ class RAM(Memory):
         self.check_RAM_access(key)
         super(RAM, self).__setitem__(key, val)
 
+        if self.dirty_pages is not None:
+            self.dirty_pages.add(key >> self.PAGE_BITS)
+
     def __getitem__(self, key):
         self.check_RAM_access(key)
         return super(RAM, self).__getitem__(key)
 
+    def clear(self):
+        super(RAM, self).clear()
+        self.image = None
+        self.dirty_pages = None
+
+    def load_words(self, words):
+        '''
+        Sets the words from address 0x0 on in a single copy, bypassing the
+        per-word checks, and keeps them as the image reset goes back to.
+        words must not be changed afterwards
+        '''
+
+        dict.update(self, izip(xrange(len(words)), words))
+
+        self.image = words
+        self.dirty_pages = set()
+
+    def read_words(self, address, count):
+        '''
+        Returns the count words from address on as an array
+        '''
+
+        if count:
+            self.check_RAM_access(address)
+            self.check_RAM_access(address + count - 1)
+
+        return array('H', [dict.get(self, key, 0x0) for key in xrange(address, address + count)])
+
+    def write_words(self, address, words):
+        '''
+        Sets the words from address on in a single copy, as a device
+        transferring a block does, still logging and tracking the pages
+        written
+        '''
+
+        if not words:
+            return
+
+        end = address + len(words)
+
+        self.check_RAM_access(address)
+        self.check_RAM_access(end - 1)
+
+        if self.write_log is not None:
+            self.write_log.extend((self, key, dict.get(self, key)) for key in xrange(address, end))
+
+        dict.update(self, izip(xrange(address, end), words))
+
+        if self.dirty_pages is not None:
+            self.dirty_pages.update(xrange(address >> self.PAGE_BITS, ((end - 1) >> self.PAGE_BITS) + 1))
+
+    def count_changed_words(self):
+        '''
+        Returns the number of addresses holding another word than the image
+        last loaded put there, an unset address counting as 0x0. Only the
+        pages written since are looked at
+        '''
+
+        if self.image is None:
+            return sum(1 for value in self.itervalues() if value)
+
+        image = self.image
+        size = len(image)
+        changed = 0
+
+        for page in self.dirty_pages:
+            start = page << self.PAGE_BITS
+
+            for address in xrange(start, min(start + (1 << self.PAGE_BITS), self.max_address + 1)):
+                if dict.get(self, address, 0x0) != (image[address] if address < size else 0x0):
+                    changed += 1
+
+        return changed
+
+    def reset(self):
+        '''
+        Puts back the image last loaded, rewriting only the pages written
+        since, or clears RAM if no image was loaded
+        '''
+
+        if self.image is None:
+            self.clear()
+            return
+
+        for page in self.dirty_pages:
+            self.restore_page(page)
+
+        self.dirty_pages.clear()
+
+    def restore_page(self, page):
+        image = self.image
+        start = page << self.PAGE_BITS
+        end = min(start + (1 << self.PAGE_BITS), self.max_address + 1)
+
+        for address in xrange(start, end):
+            if address < len(image):
+                dict.__setitem__(self, address, image[address])
+            else:
+                dict.pop(self, address, None)
+
     def get_memory_dump(self):
         '''
         Returns a list of strings representing the values stored in RAM
@@ -89,3 +211,71 @@ class RAM(Memory):
     def __str__(self):
         return '\n'.join(self.get_memory_dump())
 
+
+class WatchedRAM(RAM):
+    '''
+    RAM that records accesses to watched addresses in hits as
+    (address, value, is_write) tuples
+
+    Only accesses to pages containing a watched address pay for the
+    exact address lookup
+    '''
+
+    @classmethod
+    def convert(cls, ram):
+        '''
+        Turns the given RAM into a WatchedRAM in place, so anything already
+        holding a reference to it (e.g. a DCPU) sees the watchpoints
+        '''
+
+        if not isinstance(ram, cls):
+            ram.__class__ = cls
+            ram.read_watches = set()
+            ram.write_watches = set()
+            ram.watched_pages = set()
+            ram.hits = []
+
+        return ram
+
+    @staticmethod
+    def revert(ram):
+        ram.__class__ = RAM
+
+    def watch(self, address, on_read=False, on_write=True):
+        if on_read:
+            self.read_watches.add(address)
+        if on_write:
+            self.write_watches.add(address)
+
+        self.update_pages()
+
+    def unwatch(self, address):
+        self.read_watches.discard(address)
+        self.write_watches.discard(address)
+
+        self.update_pages()
+
+    def update_pages(self):
+        self.watched_pages = set(address >> self.PAGE_BITS
+                for address in self.read_watches | self.write_watches)
+
+    def __setitem__(self, key, val):
+        super(WatchedRAM, self).__setitem__(key, val)
+
+        if key >> self.PAGE_BITS in self.watched_pages and key in self.write_watches:
+            self.hits.append((key, dict.get(self, key), True))
+
+    def write_words(self, address, words):
+        super(WatchedRAM, self).write_words(address, words)
+
+        for key in sorted(self.write_watches):
+            if address <= key < address + len(words):
+                self.hits.append((key, dict.get(self, key), True))
+
+    def __getitem__(self, key):
+        value = super(WatchedRAM, self).__getitem__(key)
+
+        if key >> self.PAGE_BITS in self.watched_pages and key in self.read_watches:
+            self.hits.append((key, value, False))
+
+        return value
@@ -0,0 +1,93 @@
+import os
+import time
+
+METRICS_PREFIX = 'dcpu'
+
+# (stats key, metric name, type, help)
+METRICS = [
+    ('instructions', 'instructions', 'counter', 'Instructions executed'),
+    ('cycles', 'cycles', 'counter', 'Cycles spent executing instructions'),
+    ('wall_time', 'run_seconds', 'counter', 'Wall time spent running'),
+    ('instructions_per_second', 'instructions_per_second', 'gauge', 'Instructions executed per second of wall time'),
+    ('clock_rate_hz', 'clock_rate_hertz', 'gauge', 'Emulated clock rate'),
+    ('pages_written', 'memory_pages_written', 'gauge', 'RAM pages written since the program was loaded'),
+    ('words_changed', 'memory_words_changed', 'gauge', 'RAM words changed since the program was loaded'),
+]
+
+CACHE_METRICS = [
+    ('hits', 'cache_hits', 'Cache lookups that hit'),
+    ('misses', 'cache_misses', 'Cache lookups that missed'),
+    ('invalidations', 'cache_invalidations', 'Cache entries invalidated'),
+]
+
+def format_openmetrics(stats, prefix=METRICS_PREFIX):
+    '''
+    Formats the dictionary returned by DCPU.get_stats in the OpenMetrics
+    text format
+
+    Ex.
+        # TYPE dcpu_instructions counter
+        # HELP dcpu_instructions Instructions executed.
+        dcpu_instructions_total 1200
+        ...
+        # EOF
+    '''
+
+    lines = []
+
+    for (key, name, metric_type, description) in METRICS:
+        name = "%s_%s" % (prefix, name)
+        lines.append("# TYPE %s %s" % (name, metric_type))
+        lines.append("# HELP %s %s." % (name, description))
+        lines.append("%s%s %s" % (name, "_total" if metric_type == 'counter' else "", format_value(stats[key])))
+
+    caches = sorted(stats['caches'].iteritems())
+
+    for (key, name, description) in CACHE_METRICS:
+        if not caches:
+            break
+
+        name = "%s_%s" % (prefix, name)
+        lines.append("# TYPE %s counter" % name)
+        lines.append("# HELP %s %s." % (name, description))
+
+        for (cache, counters) in caches:
+            lines.append('%s_total{cache="%s"} %s' % (name, cache, format_value(counters[key])))
+
+    lines.append("# EOF")
+
+    return "\n".join(lines) + "\n"
+
+def format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+class MetricsFile(object):
+    '''
+    Keeps a file holding the latest stats of a DCPU in OpenMetrics text
+    format, for a host to scrape while the simulator runs
+
+    update is meant to be given as the on_slice callback of a run, it only
+    rewrites the file once interval seconds have passed. The file is
+    replaced in one rename so a reader never sees it half written
+    '''
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.last_write = None
+
+    def update(self, cpu):
+        now = time.time()
+
+        if self.last_write is None or now - self.last_write >= self.interval:
+            self.write(cpu)
+            self.last_write = now
+
+    def write(self, cpu):
+        temporary_path = self.path + '.tmp'
+
+        f = open(temporary_path, 'w')
+        f.write(format_openmetrics(cpu.get_stats()))
+        f.close()
+
+        os.rename(temporary_path, self.path)
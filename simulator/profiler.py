@@ -0,0 +1,91 @@
+import time
+from array import array
+
+import specifications as specs
+
+from dcpu import is_halt_loop
+
+class Profiler(object):
+    '''
+    Counts how many times the instruction at each address was executed
+    and the cycles spent in it
+
+    Counts are kept per address in flat arrays during the run and are only
+    related to source lines afterwards, through a SourceMap
+    '''
+
+    PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+
+    def __init__(self):
+        self.executions = array('L', [0]) * (specs.MAX_RAM_ADDRESS + 1)
+        self.cycles = array('L', [0]) * (specs.MAX_RAM_ADDRESS + 1)
+
+    def run(self, cpu, max_instructions=None):
+        '''
+        Executes the program loaded in cpu until it stops, reaches an
+        instruction that jumps to itself or max_instructions have been
+        executed. Returns the number of instructions executed
+
+        The counts collected so far are kept if the run is interrupted
+        '''
+
+        registers = cpu.registers
+        ram = cpu.RAM
+        execute = cpu.execute_next_instruction
+        executions = self.executions
+        cycles = self.cycles
+        pc_code = self.PC_CODE
+
+        count = 0
+        start = time.time()
+
+        try:
+            while max_instructions is None or count < max_instructions:
+                pc = dict.get(registers, pc_code, 0)
+                word = dict.get(ram, pc, 0)
+                cycles_ran = cpu.cycles_ran
+
+                if not execute():
+                    break
+
+                executions[pc] += 1
+                cycles[pc] += cpu.cycles_ran - cycles_ran
+                count += 1
+
+                next_pc = dict.get(registers, pc_code, 0)
+
+                if next_pc == pc and is_halt_loop(word, pc, next_pc):
+                    break
+        finally:
+            cpu.add_stats(count, start)
+
+        return count
+
+    def get_hot_spots(self, source_map, count=None):
+        '''
+        Returns (cycles, executions, path, line) for the source lines that
+        were executed, the most expensive first
+        '''
+
+        cycles = source_map.total_by_line(self.cycles)
+        executions = source_map.total_by_line(self.executions)
+
+        hot_spots = sorted(((total, executions[key]) + key for (key, total) in cycles.iteritems()),
+                           key=lambda hot_spot: (-hot_spot[0], hot_spot[2], hot_spot[3]))
+
+        return hot_spots[:count] if count is not None else hot_spots
+
+    def get_label_totals(self, source_map):
+        '''
+        Returns a dictionary mapping each label to the cycles spent from it up to the next label
+        '''
+
+        totals = {}
+
+        for (address, cycles) in enumerate(self.cycles):
+            if cycles:
+                label = source_map.get_label(address)
+                name = label[0] if label else None
+                totals[name] = totals.get(name, 0) + cycles
+
+        return totals
@@ -0,0 +1,277 @@
+import ctypes
+import mmap
+import os
+import tempfile
+import time
+
+import specifications as specs
+
+from memory import RAM
+from dcpu import get_word_length
+
+SHARED_MEMORY_MAGIC = 'DCPU'
+SHARED_MEMORY_FORMAT_VERSION = 1
+
+# Named shared memory on Linux lives in /dev/shm, elsewhere fall back to a temporary file
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+REGISTER_CODES = sorted(specs.REGISTERS) + sorted(specs.SPECIAL_REGISTERS)
+
+RAM_WORDS = specs.MAX_RAM_ADDRESS + 1
+
+# How long a reader retries while the state is being published, spinning
+# at first and then sleeping between tries, before giving up on a
+# publisher that died halfway through
+READ_STATE_TIMEOUT = 1.0
+READ_STATE_SPINS = 1000
+READ_STATE_SLEEP = 0.001
+
+class Header(ctypes.Structure):
+    '''
+    The CPU state published ahead of RAM. sequence is odd while the state
+    is being written so readers can tell a torn read and retry
+    '''
+
+    _fields_ = [
+        ('magic', ctypes.c_char * 4),
+        ('version', ctypes.c_uint32),
+        ('sequence', ctypes.c_uint32),
+        ('cycles_ran', ctypes.c_uint64),
+        ('registers', ctypes.c_uint16 * len(REGISTER_CODES)),
+    ]
+
+HEADER_SIZE = ctypes.sizeof(Header)
+SHARED_MEMORY_SIZE = HEADER_SIZE + RAM_WORDS * ctypes.sizeof(ctypes.c_uint16)
+
+def get_path(name):
+    return name if os.path.isabs(name) else os.path.join(SHARED_MEMORY_DIR, name)
+
+class SharedMemory(object):
+    '''
+    A named block of memory mapped into every process that opens it,
+    holding a Header followed by RAM as native 16-bit words
+
+    header and words are views straight onto the mapping, so another
+    process (a display, a debugger, a monitor) reads video RAM and
+    registers without any copying or serialization, and without pausing
+    the CPU writing them
+    '''
+
+    def __init__(self, name, create=False):
+        self.path = get_path(name)
+
+        f = open(self.path, 'w+b' if create else 'r+b')
+        try:
+            if create:
+                f.truncate(SHARED_MEMORY_SIZE)
+            elif os.fstat(f.fileno()).st_size != SHARED_MEMORY_SIZE:
+                raise InvalidSharedMemory(self.path)
+
+            self.buffer = mmap.mmap(f.fileno(), SHARED_MEMORY_SIZE)
+        finally:
+            f.close()
+
+        self.header = Header.from_buffer(self.buffer)
+        self.words = (ctypes.c_uint16 * RAM_WORDS).from_buffer(self.buffer, HEADER_SIZE)
+
+        if create:
+            self.header.magic = SHARED_MEMORY_MAGIC
+            self.header.version = SHARED_MEMORY_FORMAT_VERSION
+        elif self.header.magic != SHARED_MEMORY_MAGIC or self.header.version != SHARED_MEMORY_FORMAT_VERSION:
+            self.close()
+            raise InvalidSharedMemory(self.path)
+
+    def publish(self, registers, cycles_ran):
+        '''
+        Writes the register values and cycle count to the header
+        '''
+
+        header = self.header
+        header.sequence += 1
+
+        header.cycles_ran = cycles_ran
+        for (index, code) in enumerate(REGISTER_CODES):
+            header.registers[index] = dict.get(registers, code, 0x0)
+
+        header.sequence += 1
+
+    def read_state(self, timeout=READ_STATE_TIMEOUT):
+        '''
+        Returns the last published (registers, cycles_ran), registers
+        being a dictionary mapping register code to value
+
+        Raises StaleSharedState if no complete state could be read within
+        timeout seconds
+        '''
+
+        header = self.header
+        deadline = None
+        tries = 0
+
+        while True:
+            sequence = header.sequence
+
+            if not sequence % 2:
+                cycles_ran = header.cycles_ran
+                values = header.registers[:]
+
+                if header.sequence == sequence:
+                    return (dict(zip(REGISTER_CODES, values)), cycles_ran)
+
+            tries += 1
+
+            if tries >= READ_STATE_SPINS:
+                if deadline is None:
+                    deadline = time.time() + timeout
+                elif time.time() >= deadline:
+                    raise StaleSharedState(self.path)
+
+                time.sleep(READ_STATE_SLEEP)
+
+    def close(self):
+        # The views must go before the mapping they point into
+        self.header = None
+        self.words = None
+        self.buffer.close()
+
+    def unlink(self):
+        os.remove(self.path)
+
+class SharedRAM(RAM):
+    '''
+    RAM that mirrors every write into the words of a SharedMemory
+
+    Reads are still served from the dictionary, so running a program costs
+    one extra store per write. Anything writing around __setitem__ (e.g.
+    restoring recorded history) must call sync afterwards
+    '''
+
+    @classmethod
+    def convert(cls, ram, shared):
+        '''
+        Turns the given RAM into a SharedRAM in place, so anything already
+        holding a reference to it (e.g. a DCPU) writes to shared
+        '''
+
+        ram.__class__ = cls
+        ram.shared = shared
+        ram.sync()
+
+        return ram
+
+    @staticmethod
+    def revert(ram):
+        ram.__class__ = RAM
+
+    def sync(self):
+        '''
+        Copies the whole of RAM to the shared words
+        '''
+
+        words = self.shared.words
+        ctypes.memset(words, 0, ctypes.sizeof(words))
+
+        for (address, value) in dict.iteritems(self):
+            words[address] = value
+
+    def __setitem__(self, key, val):
+        super(SharedRAM, self).__setitem__(key, val)
+        self.shared.words[key] = dict.__getitem__(self, key)
+
+    def clear(self):
+        super(SharedRAM, self).clear()
+        ctypes.memset(self.shared.words, 0, ctypes.sizeof(self.shared.words))
+
+    def load_words(self, words):
+        super(SharedRAM, self).load_words(words)
+        self.shared.words[:len(words)] = words
+
+    def write_words(self, address, words):
+        super(SharedRAM, self).write_words(address, words)
+        self.shared.words[address:address + len(words)] = words
+
+    def restore_page(self, page):
+        super(SharedRAM, self).restore_page(page)
+
+        start = page << self.PAGE_BITS
+        for address in xrange(start, min(start + (1 << self.PAGE_BITS), self.max_address + 1)):
+            self.shared.words[address] = dict.get(self, address, 0x0)
+
+class Publisher(object):
+    '''
+    Runs a DCPU whose state is shared, publishing its registers and cycle
+    count at block boundaries: whenever an instruction doesn't fall
+    through to the next one, and when the run ends
+
+    Straight-line code only changes memory, which is already shared as it
+    is written, so the header is written once per jump, skip or call
+    rather than once per instruction
+    '''
+
+    PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.publishes = 0
+
+    def publish(self, cpu):
+        self.shared.publish(cpu.registers, cpu.cycles_ran)
+        self.publishes += 1
+
+    def run(self, cpu, max_instructions=None, on_slice=None):
+        '''
+        Executes the program loaded in cpu until it stops or max_instructions
+        have been executed. Returns the number of instructions executed
+
+        As with DCPU.run, the run counters are updated and on_slice(cpu)
+        called every STATS_SLICE instructions
+        '''
+
+        registers = cpu.registers
+        ram = cpu.RAM
+        execute = cpu.execute_next_instruction
+        pc_code = self.PC_CODE
+        stats_slice = cpu.STATS_SLICE
+
+        count = 0
+        sliced = 0
+        start = time.time()
+        self.publish(cpu)
+
+        while max_instructions is None or count < max_instructions:
+            pc = dict.get(registers, pc_code, 0)
+            word = dict.get(ram, pc, 0)
+
+            if not execute():
+                break
+
+            count += 1
+
+            if dict.get(registers, pc_code, 0) != pc + get_word_length(word):
+                self.publish(cpu)
+
+            if count - sliced == stats_slice:
+                start = cpu.add_stats(stats_slice, start)
+                sliced = count
+
+                if on_slice is not None:
+                    on_slice(cpu)
+
+        cpu.add_stats(count - sliced, start)
+        self.publish(cpu)
+
+        return count
+
+class InvalidSharedMemory(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Not a DCPU shared memory block: %s" % self.path
+
+class StaleSharedState(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Shared memory block left half published, its publisher may have died: %s" % self.path
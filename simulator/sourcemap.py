@@ -0,0 +1,197 @@
+import json
+from array import array
+from bisect import bisect_right
+
+SOURCE_MAP_FORMAT_VERSION = 1
+
+class SourceMap(object):
+    '''
+    Maps the addresses of a program back to the file and line they were
+    assembled from and to the closest preceding label
+
+    Each source line that produced words is an entry in arrays sorted by
+    address, so looking up an address is a bisect and totalling per-address
+    counts by line only walks the entries
+    '''
+
+    def __init__(self):
+        self.paths = []
+        self.addresses = array('L')
+        self.path_indexes = array('H')
+        self.lines = array('L')
+        self.label_addresses = array('L')
+        self.label_names = []
+        self.size = 0
+
+    def add_line(self, address, path, line):
+        '''
+        Records that the words from address on come from line of path,
+        addresses must be added in increasing order
+        '''
+
+        if path not in self.paths:
+            self.paths.append(path)
+
+        self.addresses.append(address)
+        self.path_indexes.append(self.paths.index(path))
+        self.lines.append(line)
+
+    def set_labels(self, labels):
+        '''
+        Sets the label addresses from a mapping of label to address
+        '''
+
+        labels = sorted((address, label) for (label, address) in labels.iteritems())
+
+        self.label_addresses = array('L', (address for (address, _) in labels))
+        self.label_names = [label for (_, label) in labels]
+
+    def get_symbols(self):
+        '''
+        Returns a dictionary mapping each label to its address
+        '''
+
+        return dict(zip(self.label_names, self.label_addresses))
+
+    def find_entry(self, address):
+        '''
+        Returns the index of the entry holding address, None if it isn't part of the program
+        '''
+
+        if address >= self.size:
+            return None
+
+        index = bisect_right(self.addresses, address) - 1
+
+        return index if index >= 0 else None
+
+    def lookup(self, address):
+        '''
+        Returns the (path, line) the word at address was assembled from,
+        None if it isn't part of the program
+        '''
+
+        index = self.find_entry(address)
+
+        if index is None:
+            return None
+
+        return (self.paths[self.path_indexes[index]], self.lines[index])
+
+    def get_label(self, address):
+        '''
+        Returns the closest label at or before address and the offset from it,
+        None if there is none
+        '''
+
+        index = bisect_right(self.label_addresses, address) - 1
+
+        if index < 0:
+            return None
+
+        return (self.label_names[index], address - self.label_addresses[index])
+
+    def describe(self, address):
+        '''
+        Formats the source location of an address
+
+        Ex.
+            fib.dasm16:7 (loop+2)
+        '''
+
+        location = self.lookup(address)
+        label = self.get_label(address)
+
+        if location is None:
+            description = "%#06x" % address
+        else:
+            description = "%s:%d" % location
+
+        if label is not None:
+            (name, offset) = label
+            description += " (%s%s)" % (name, "+%d" % offset if offset else "")
+
+        return description
+
+    def get_entry_end(self, index):
+        return self.addresses[index + 1] if index + 1 < len(self.addresses) else self.size
+
+    def total_by_line(self, counts):
+        '''
+        Adds up counts indexed by address for every source line, returning
+        a dictionary mapping (path, line) to its total
+        '''
+
+        totals = {}
+
+        for index in xrange(len(self.addresses)):
+            total = sum(counts[self.addresses[index]:self.get_entry_end(index)])
+
+            if total:
+                key = (self.paths[self.path_indexes[index]], self.lines[index])
+                totals[key] = totals.get(key, 0) + total
+
+        return totals
+
+    def get_line_addresses(self, path, line_count):
+        '''
+        Returns the address of each of line_count lines of path, None for
+        lines that didn't produce words
+        '''
+
+        addresses = [None] * line_count
+
+        if path not in self.paths:
+            return addresses
+
+        path_index = self.paths.index(path)
+
+        for (address, index, line) in zip(self.addresses, self.path_indexes, self.lines):
+            if index == path_index and line <= line_count:
+                addresses[line - 1] = address
+
+        return addresses
+
+    def save(self, path):
+        f = open(path, 'w')
+        json.dump({
+            'version': SOURCE_MAP_FORMAT_VERSION,
+            'size': self.size,
+            'paths': self.paths,
+            'entries': zip(self.addresses, self.path_indexes, self.lines),
+            'labels': zip(self.label_addresses, self.label_names),
+        }, f)
+        f.close()
+
+    @classmethod
+    def load(cls, path):
+        f = open(path)
+        try:
+            data = json.load(f)
+        except ValueError:
+            raise InvalidSourceMap(path)
+        finally:
+            f.close()
+
+        if data.get('version') != SOURCE_MAP_FORMAT_VERSION:
+            raise InvalidSourceMap(path)
+
+        source_map = cls()
+        source_map.size = data['size']
+        source_map.paths = [str(source) if source is not None else None for source in data['paths']]
+
+        for (address, path_index, line) in data['entries']:
+            source_map.addresses.append(address)
+            source_map.path_indexes.append(path_index)
+            source_map.lines.append(line)
+
+        source_map.set_labels(dict((str(label), address) for (address, label) in data['labels']))
+
+        return source_map
+
+class InvalidSourceMap(Exception):
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return "Not a valid source map: %s" % self.path
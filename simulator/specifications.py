@@ -6,6 +6,8 @@ DCPU_VERSION = '1.1'
 
 ASSEMBLER_FILE_EXT = 'dasm16'
 MACHINE_FILE_EXT = 'dcpu'
+OBJECT_FILE_EXT = 'dobj'
+BINARY_FILE_EXT = 'bin'
 
 
 BASIC_OP_CODE_LENGTH = 4
@@ -64,5 +66,13 @@ class BasicOperations:
     IFG = 0xe
     IFB = 0xf
 
+# The basic operations that skip the next instruction when their test fails
+IF_OPERATIONS = frozenset([
+    BasicOperations.IFE,
+    BasicOperations.IFN,
+    BasicOperations.IFG,
+    BasicOperations.IFB,
+])
+
 class NonBasicOperations:
     JSR = 0x01
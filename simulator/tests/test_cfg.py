@@ -0,0 +1,97 @@
+import unittest
+from simulator.dcpu import DCPU
+from simulator.cfg import ControlFlowGraph, EdgeKind, Exit
+
+# SET A, 0x1 / JSR double / IFE A, 0x2 / SET PC, skip / SET B, 0x1000
+# :skip SET C, A / SET PC, end / :double SHL A, 0x1 / SET PC, POP / :end SET X, 0x1
+BRANCH_PROGRAM = [0x8401, 0x7c10, 0x000b, 0x880c, 0x7dc1, 0x0008, 0x7c11, 0x1000, 0x0021,
+                  0x7dc1, 0x000d, 0x8407, 0x61c1, 0x8431]
+
+# SET J, 0x2 / :outer SET I, 0x3 / :inner SUB I, 0x1 / IFN I, 0x0 / SET PC, inner
+# SUB J, 0x1 / IFN J, 0x0 / SET PC, outer / :halt SET PC, halt
+NESTED_LOOP_PROGRAM = [0x8871, 0x8c61, 0x8463, 0x806d, 0x7dc1, 0x0002, 0x8473, 0x807d, 0x7dc1, 0x0001,
+                       0x7dc1, 0x000a]
+
+# SET PC, code / DAT 0xffff / :code JSR [A] / SET PC, A
+INDIRECT_PROGRAM = [0x7dc1, 0x0003, 0xffff, 0x2010, 0x01c1]
+
+class TestControlFlowGraph(unittest.TestCase):
+
+    def test_blocks(self):
+        graph = ControlFlowGraph(BRANCH_PROGRAM)
+
+        self.assertEqual(sorted(graph.blocks), [0x0, 0x3, 0x4, 0x6, 0x8, 0xb, 0xd])
+
+        ife = graph.blocks[0x3]
+        self.assertEqual([(edge.kind, edge.target, edge.cycles) for edge in ife.successors],
+                         [(EdgeKind.NEXT, 0x4, 0), (EdgeKind.SKIP, 0x6, 1)])
+
+        self.assertEqual(graph.blocks[0x0].calls, [0xb])
+        self.assertEqual(graph.blocks[0x0].successors[0].kind, EdgeKind.RETURN)
+        self.assertEqual(graph.blocks[0xb].exit, Exit.RETURN)
+        self.assertEqual(graph.blocks[0xd].exit, Exit.STOP)
+
+        # SET C, A runs into SET PC, end
+        self.assertEqual(graph.blocks[0x8].instructions, [(0x8, 0x0021), (0x9, 0x7dc1)])
+        self.assertEqual(graph.blocks[0x8].end, 0xb)
+
+    def test_subroutines(self):
+        graph = ControlFlowGraph(BRANCH_PROGRAM)
+
+        self.assertEqual(sorted(graph.subroutines), [0x0, 0xb])
+        self.assertEqual(graph.subroutines[0x0].calls, set([0xb]))
+        self.assertEqual(graph.subroutines[0xb].blocks, [0xb])
+
+        self.assertEqual(graph.subroutines[0xb].worst_case_cycles, 5)
+
+    def test_worst_case_matches_execution(self):
+        graph = ControlFlowGraph(BRANCH_PROGRAM)
+
+        cpu = DCPU()
+        cpu.load_words(BRANCH_PROGRAM)
+        cpu.run()
+
+        # The IFE holds at run time, the worst case skips the jump and runs the longer SET B, 0x1000
+        self.assertEqual(graph.subroutines[0x0].worst_case_cycles, cpu.cycles_ran + 1)
+
+    def test_nested_loops(self):
+        graph = ControlFlowGraph(NESTED_LOOP_PROGRAM)
+        subroutine = graph.subroutines[0x0]
+
+        loops = dict((loop.header, loop) for loop in subroutine.loops)
+        self.assertEqual(sorted(loops), [0x1, 0x2, 0xa])
+
+        self.assertEqual(loops[0x2].depth, 2)
+        self.assertEqual(loops[0x1].depth, 1)
+        self.assertEqual(loops[0x1].blocks, set([0x1, 0x2, 0x4, 0x6, 0x8]))
+
+        # SUB I, IFN I and SET PC, inner
+        self.assertEqual(loops[0x2].iteration_cycles, 3 + 3 + 3)
+
+        # SET I, the inner loop once, its exit through the skip, SUB J, IFN J and SET PC, outer
+        self.assertEqual(loops[0x1].iteration_cycles, 2 + 9 + (6 + 1) + 6 + 3)
+
+        self.assertFalse(loops[0xa].has_exit)
+        self.assertTrue(loops[0x1].has_exit)
+
+        # SET J, both loops once and their exits, then the halt loop once
+        self.assertEqual(subroutine.worst_case_cycles, 2 + 27 + 2 + 9 + (6 + 1) + (6 + 1) + 3)
+
+    def test_indirect_flow(self):
+        graph = ControlFlowGraph(INDIRECT_PROGRAM)
+
+        # The data word after the jump isn't decoded
+        self.assertEqual(sorted(graph.blocks), [0x0, 0x3, 0x4])
+        self.assertEqual(graph.blocks[0x3].calls, [None])
+        self.assertEqual(graph.blocks[0x4].exit, Exit.INDIRECT)
+        self.assertTrue(graph.subroutines[0x0].has_indirect_flow)
+
+    def test_recursion(self):
+        # :recurse JSR recurse / SET PC, POP
+        graph = ControlFlowGraph([0x7c10, 0x0000, 0x61c1])
+
+        self.assertTrue(graph.subroutines[0x0].is_recursive)
+        self.assertEqual(graph.subroutines[0x0].worst_case_cycles, 4 + 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+import os
+import unittest
+from simulator import cluster as cluster_module
+from simulator.dcpu import DCPU
+from simulator.cluster import (Cluster, Mailbox, MailboxRAM, MessageQueues, MailboxRegisters, WorkerDied,
+                               MAILBOX_ADDRESS, SEND_OK, SEND_DROPPED)
+from assembler import assembler
+
+# Each CPU sends its number to the next one round, waits for the word
+# from the one before and keeps who sent it in X and the word in Y
+RING_PROGRAM = '''
+SET A, [0x9100]
+SET B, A
+ADD B, 1
+MOD B, [0x9101]
+SET [0x9102], B
+SET [0x9103], A
+:wait IFE [0x9105], 0
+SET PC, wait
+SET X, [0x9106]
+SET Y, [0x9107]
+SET [0x9107], 0
+'''
+
+# Counts up in I, sending I to CPU 0 until STATUS says it was dropped
+FLOOD_PROGRAM = '''
+SET [0x9102], 0
+:loop ADD I, 1
+SET [0x9103], I
+IFE [0x9104], 0
+SET PC, loop
+'''
+
+def register(name):
+    return MAILBOX_ADDRESS + getattr(MailboxRegisters, name)
+
+class TestMessageQueues(unittest.TestCase):
+
+    def test_put_and_take(self):
+        queues = MessageQueues(3, capacity=4)
+
+        self.assertTrue(queues.put(2, 0, 0x20))
+        self.assertTrue(queues.put(1, 0, 0x10))
+        self.assertTrue(queues.put(1, 0, 0x11))
+
+        self.assertEqual(queues.take(0), [(1, 0x10), (1, 0x11), (2, 0x20)])
+        self.assertEqual(queues.take(0), [])
+
+    def test_full(self):
+        queues = MessageQueues(2, capacity=2)
+
+        self.assertTrue(queues.put(0, 1, 0x1))
+        self.assertTrue(queues.put(0, 1, 0x2))
+        self.assertFalse(queues.put(0, 1, 0x3))
+        self.assertTrue(queues.put(1, 0, 0x4))
+
+        queues.take(1)
+        self.assertTrue(queues.put(0, 1, 0x5))
+        self.assertEqual(queues.take(1), [(0, 0x5)])
+
+    def test_take_leaves_current_quantum(self):
+        queues = MessageQueues(2)
+
+        queues.put(0, 1, 0x1, quantum=4)
+        queues.put(0, 1, 0x2, quantum=5)
+
+        self.assertEqual(queues.take(1, 5), [(0, 0x1)])
+        self.assertEqual(queues.take(1, 6), [(0, 0x2)])
+
+class TestMailbox(unittest.TestCase):
+
+    def setUp(self):
+        self.queues = MessageQueues(2, capacity=4)
+        self.cpus = [DCPU(), DCPU()]
+        self.mailboxes = [Mailbox(number, self.queues) for number in xrange(2)]
+
+        for (cpu, mailbox) in zip(self.cpus, self.mailboxes):
+            MailboxRAM.convert(cpu.RAM, mailbox)
+
+    def test_registers(self):
+        ram = self.cpus[1].RAM
+
+        self.assertEqual(ram[register('ID')], 1)
+        self.assertEqual(ram[register('CPUS')], 2)
+
+        ram[register('ID')] = 5
+        self.assertEqual(ram[register('ID')], 1)
+
+    def test_send_and_receive(self):
+        (sender, receiver) = [cpu.RAM for cpu in self.cpus]
+
+        sender[register('TO')] = 1
+        sender[register('SEND')] = 0xbeef
+        sender[register('SEND')] = 0xcafe
+        self.assertEqual(sender[register('STATUS')], SEND_OK)
+
+        self.assertEqual(receiver[register('PENDING')], 0)
+        self.mailboxes[1].receive()
+
+        self.assertEqual(receiver[register('PENDING')], 2)
+        self.assertEqual(receiver[register('FROM')], 0)
+        self.assertEqual(receiver[register('DATA')], 0xbeef)
+
+        receiver[register('DATA')] = 0
+        self.assertEqual(receiver[register('PENDING')], 1)
+        self.assertEqual(receiver[register('DATA')], 0xcafe)
+
+        receiver[register('DATA')] = 0
+        receiver[register('DATA')] = 0
+        self.assertEqual(receiver[register('PENDING')], 0)
+
+    def test_dropped(self):
+        sender = self.cpus[0].RAM
+
+        sender[register('TO')] = 2
+        sender[register('SEND')] = 0x1
+        self.assertEqual(sender[register('STATUS')], SEND_DROPPED)
+
+        sender[register('TO')] = 1
+        for word in xrange(5):
+            sender[register('SEND')] = word
+
+        self.assertEqual(sender[register('STATUS')], SEND_DROPPED)
+        self.assertEqual((self.mailboxes[0].sent, self.mailboxes[0].dropped), (4, 2))
+
+    def test_deterministic_limit(self):
+        mailbox = Mailbox(0, self.queues, deterministic=True)
+        ram = MailboxRAM.convert(DCPU().RAM, mailbox)
+
+        ram[register('TO')] = 1
+        for word in xrange(3):
+            ram[register('SEND')] = word
+
+        self.assertEqual(ram[register('STATUS')], SEND_DROPPED)
+
+        mailbox.start_quantum(1)
+        ram[register('SEND')] = 0x3
+        self.assertEqual(ram[register('STATUS')], SEND_OK)
+
+class TestCluster(unittest.TestCase):
+
+    def test_deterministic(self):
+        words = assembler.assemble_binary(RING_PROGRAM.splitlines())
+
+        results = []
+        for _ in xrange(2):
+            cluster = Cluster([words] * 3, quantum=20)
+            cluster.run()
+
+            results.append([(dict(cpu.registers), cpu.cycles_ran) for cpu in cluster.cpus])
+
+            self.assertEqual([(cpu.registers[0x3], cpu.registers[0x4]) for cpu in cluster.cpus],
+                             [(2, 2), (0, 0), (1, 1)])
+            self.assertEqual(cluster.messages, [(1, 0, 1)] * 3)
+            self.assertEqual(cluster.errors, {})
+
+        self.assertEqual(results[0], results[1])
+
+    def test_relaxed(self):
+        words = assembler.assemble_binary(RING_PROGRAM.splitlines())
+
+        cluster = Cluster([words] * 2, quantum=20, deterministic=False)
+        cluster.run()
+
+        self.assertEqual([(cpu.registers[0x3], cpu.registers[0x4]) for cpu in cluster.cpus], [(1, 1), (0, 0)])
+
+    def test_dropped_in_quantum(self):
+        # CPU 1 tries to send about 8 words a quantum, only half a queue gets through
+        words = [assembler.assemble_binary(RING_PROGRAM.splitlines()),
+                 assembler.assemble_binary(FLOOD_PROGRAM.splitlines())]
+
+        cluster = Cluster(words, quantum=100, capacity=8)
+        cluster.run()
+
+        self.assertEqual(cluster.messages[1][:2], (4, 1))
+        self.assertEqual(cluster.cpus[1].registers[0x6], 5)
+
+    def test_max_cycles(self):
+        words = assembler.assemble_binary([':loop SET PC, loop'])
+
+        cluster = Cluster([words] * 2, quantum=300, max_cycles=1000)
+        cluster.run()
+
+        # The loop takes 3 cycles, an instruction is never cut short
+        self.assertEqual([cpu.cycles_ran for cpu in cluster.cpus], [1002, 1002])
+        self.assertEqual(cluster.quanta, 4)
+
+    def test_worker_died(self):
+        words = assembler.assemble_binary([':loop SET PC, loop'])
+        run_slice = cluster_module.run_slice
+
+        # Workers are forked, so they pick up the patched run_slice; the
+        # one running CPU 1 dies without reporting while CPU 0 waits on it
+        def dying_slice(cpu, cycles):
+            if cpu.RAM[MAILBOX_ADDRESS + MailboxRegisters.ID] == 1:
+                os._exit(3)
+
+            return run_slice(cpu, cycles)
+
+        cluster_module.run_slice = dying_slice
+        try:
+            for deterministic in (True, False):
+                cluster = Cluster([words] * 2, quantum=300, max_cycles=10 ** 9, deterministic=deterministic)
+
+                with self.assertRaises(WorkerDied) as raised:
+                    cluster.run()
+
+                self.assertEqual((raised.exception.number, raised.exception.exitcode), (1, 3))
+        finally:
+            cluster_module.run_slice = run_slice
+
+if __name__ == '__main__':
+    unittest.main()
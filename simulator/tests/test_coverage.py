@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+from simulator.dcpu import DCPU
+from simulator.coverage import Coverage, InvalidCoverageFile, BITMAP_SIZE
+
+# SET I, 2 / :loop SUB I, 1 / IFN I, 0 / SET PC, loop / SET A, 1
+LOOP_PROGRAM = [0x8861, 0x8463, 0x806d, 0x7dc1, 0x0001, 0x8401]
+
+class TestCoverage(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.cpu.load_program(LOOP_PROGRAM)
+
+    def test_run(self):
+        coverage = Coverage()
+
+        self.assertEqual(coverage.run(self.cpu), 8)
+        self.assertEqual(self.cpu.registers[0x0], 1)
+        self.assertEqual(coverage.get_executed_addresses(), [0x0, 0x1, 0x2, 0x3, 0x5, 0x6])
+
+        self.assertEqual(coverage.get_marker(0x2), "+TN")
+        self.assertEqual(coverage.get_marker(0x3), "+")
+        self.assertEqual(coverage.get_marker(0x4), "-")
+
+    def test_max_instructions(self):
+        coverage = Coverage()
+
+        self.assertEqual(coverage.run(self.cpu, max_instructions=3), 3)
+        self.assertEqual(coverage.get_executed_addresses(), [0x0, 0x1, 0x2])
+        self.assertEqual(coverage.get_marker(0x2), "+T")
+
+    def test_halt_loop(self):
+        # SET A, 1 / :crash SET PC, crash
+        self.cpu.load_program([0x8401, 0x7dc1, 0x0001])
+        coverage = Coverage()
+
+        self.assertEqual(coverage.run(self.cpu), 2)
+        self.assertEqual(coverage.get_executed_addresses(), [0x0, 0x1])
+
+    def test_merge(self):
+        first = Coverage()
+        first.run(self.cpu, max_instructions=2)
+
+        second = Coverage()
+        self.cpu.load_program([0x8401] * 6)
+        self.cpu.PC = 0x5
+        second.run(self.cpu)
+
+        first.merge(second)
+        self.assertEqual(first.get_executed_addresses(), [0x0, 0x1, 0x5, 0x6])
+        self.assertEqual(len(first.executed), BITMAP_SIZE)
+
+    def test_save_and_load(self):
+        coverage = Coverage()
+        coverage.run(self.cpu)
+
+        (handle, path) = tempfile.mkstemp()
+        os.close(handle)
+
+        try:
+            coverage.save(path)
+            loaded = Coverage.load(path)
+
+            self.assertEqual(loaded.executed, coverage.executed)
+            self.assertEqual(loaded.not_taken, coverage.not_taken)
+
+            f = open(path, 'wb')
+            f.write('foo')
+            f.close()
+
+            self.assertRaises(InvalidCoverageFile, Coverage.load, path)
+        finally:
+            os.remove(path)
+
+    def test_annotate(self):
+        coverage = Coverage()
+        coverage.run(self.cpu, max_instructions=3)
+
+        source = ['; comment\n', 'SET I, 2\n', 'SET A, 1\n', 'IFN I, 0\n']
+        self.assertEqual(coverage.annotate(source, [None, 0x0, 0x5, 0x2]), [
+            "         ; comment",
+            "0000 +   SET I, 2",
+            "0005 -   SET A, 1",
+            "0002 +T  IFN I, 0",
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
+from array import array
 import os
 import glob
-from simulator.dcpu import DCPU, read_instruction, parse_instruction, get_word_length, OpCodeNotImplemented, InvalidInstruction, InvalidValueCode, InfiniteLoopDetected
+from simulator.dcpu import DCPU, get_cycles, read_instruction, parse_instruction, get_word_length, is_halt_loop, OpCodeNotImplemented, InvalidInstruction, InvalidValueCode, InfiniteLoopDetected
+from simulator.memory import InvalidMemoryAccess
 from simulator import specifications as specs
 
 class TestDCPU(unittest.TestCase):
@@ -456,6 +458,19 @@ class TestDCPU(unittest.TestCase):
         self.assert_instructions_loaded([2,4,8,16])
         self.assert_instructions_loaded([0x73, 0xaa])
 
+    def test_load_words(self):
+        self.cpu.RAM[0x1000] = 0xff
+        self.cpu.load_words(array('H', [0x7c01, 0x0030, 0x0]))
+
+        self.assertEqual(sorted(self.cpu.RAM.items()), [(0x0, 0x7c01), (0x1, 0x0030), (0x2, 0x0)])
+        self.assertRaises(InvalidMemoryAccess, self.cpu.load_words, [0x0] * (specs.MAX_RAM_ADDRESS + 2))
+
+    def test_run(self):
+        self.cpu.load_words([0x9031, 0x9037])
+        self.cpu.run()
+
+        self.assertEqual(self.cpu.registers[0x03], 0x40)
+
     def assert_instructions_loaded(self, instructions):
         self.cpu.load_program(instructions)
 
@@ -464,6 +479,78 @@ class TestDCPU(unittest.TestCase):
         for address in sorted(self.cpu.RAM):
             self.assertEqual(self.cpu.RAM[address], instructions[address])
 
+    def test_get_cycles(self):
+        # SET A, 0x1000; ADD [0x10+A], 0x1; JSR 0x4; DIV A, B
+        for instruction in [[0x7c01, 0x1000], [0x8502, 0x10], [0x7c10, 0x4], [0x0405]]:
+            self.cpu.load_words(instruction)
+            self.cpu.execute_next_instruction()
+
+            self.assertEqual(get_cycles(instruction[0]), self.cpu.cycles_ran)
+
+    def test_reload_words(self):
+        # ADD [0x8000], 1
+        words = array('H', [0x85e2, 0x8000])
+
+        for _ in range(3):
+            self.cpu.load_words(words)
+            self.cpu.execute_next_instruction()
+
+        self.assertEqual(self.cpu.RAM[0x8000], 0x1)
+        self.assertEqual(self.cpu.cycles_ran, 4)
+        self.assertEqual(self.cpu.RAM.dirty_pages, set([0x80]))
+
+        # Loading other words starts from empty RAM again
+        self.cpu.load_words(array('H', [0x85e2, 0x8000]))
+        self.assertEqual(dict(self.cpu.RAM), {0x0: 0x85e2, 0x1: 0x8000})
+
+        self.cpu.load_program(['85e2'])
+        self.assertEqual(dict(self.cpu.RAM), {0x0: 0x85e2})
+
+    def test_is_halt_loop(self):
+        # SET PC, 0x1 short and long, SET PC, A
+        self.assertTrue(is_halt_loop(0x85c1, 0x1, 0x1))
+        self.assertTrue(is_halt_loop(0x7dc1, 0x1, 0x1))
+        self.assertTrue(is_halt_loop(0x01c1, 0x1, 0x1))
+
+        # Elsewhere, SET PC, POP moving SP, ADD PC, 0x0 setting O
+        self.assertFalse(is_halt_loop(0x85c1, 0x1, 0x2))
+        self.assertFalse(is_halt_loop(0x61c1, 0x1, 0x1))
+        self.assertFalse(is_halt_loop(0x81c2, 0x1, 0x1))
+
+    def test_get_stats(self):
+        # SET I, 2 / :loop SUB I, 1 / IFN I, 0 / SET PC, loop
+        self.cpu.load_words([0x8861, 0x8463, 0x806d, 0x7dc1, 0x0001])
+        self.cpu.RAM[0x1000] = 0x1
+        self.cpu.RAM[0x1001] = 0x0
+        self.cpu.RAM[0x2] = 0x806d
+        self.cpu.run()
+
+        stats = self.cpu.get_stats()
+
+        self.assertEqual(stats['instructions'], 6)
+        self.assertEqual(stats['cycles'], self.cpu.cycles_ran)
+        self.assertEqual((stats['pages_written'], stats['words_changed']), (2, 1))
+        self.assertEqual(stats['caches'], {})
+        self.assertTrue(stats['wall_time'] > 0)
+
+        self.cpu.reset()
+        self.assertEqual(self.cpu.get_stats()['instructions'], 0)
+        self.assertEqual(self.cpu.get_stats()['words_changed'], 0)
+
+    def test_stats_slices(self):
+        slices = []
+
+        # :loop ADD A, 1 / AND A, 0x3f / SET PC, loop, a new state each
+        # instruction until A wraps around
+        self.cpu.load_words([0x8402, 0x7c09, 0x3f, 0x81c1])
+        self.cpu.STATS_SLICE = 0x10
+
+        self.assertRaises(InfiniteLoopDetected, self.cpu.run,
+                          lambda cpu: slices.append(cpu.instructions_ran))
+
+        self.assertEqual(slices, range(0x10, self.cpu.instructions_ran + 1, 0x10))
+        self.assertEqual(self.cpu.instructions_ran, 3 * 0x40 + 1)
+
     def test_parse_instruction(self):
         self.assert_parsed_instruction(0b0001111000000011, op_code=3, a=32, b=7)
         self.assert_parsed_instruction(0b0001111000000000, op_code=32, a=7, b=None)
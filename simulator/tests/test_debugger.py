@@ -0,0 +1,106 @@
+import unittest
+from StringIO import StringIO
+from simulator.dcpu import DCPU
+from simulator.debugger import Debugger, DebuggerShell, StopReason, UnknownLocation, DebuggerError
+from simulator.history import History
+from simulator.memory import RAM, WatchedRAM
+from simulator.sourcemap import SourceMap
+
+# SET I, 10 / :loop SET [0x2000+I], I / SUB I, 1 / IFN I, 0 / SET PC, loop
+LOOP_PROGRAM = [0xa861, 0x1961, 0x2000, 0x8463, 0x806d, 0x7dc1, 0x0001]
+SYMBOLS = {'loop': 0x1}
+
+class TestDebugger(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.cpu.load_program(LOOP_PROGRAM)
+        self.debugger = Debugger(self.cpu, SYMBOLS)
+
+    def test_resolve(self):
+        self.assertEqual(self.debugger.resolve('loop'), 0x1)
+        self.assertEqual(self.debugger.resolve('0x2000'), 0x2000)
+        self.assertEqual(self.debugger.resolve('12'), 12)
+
+        self.assertRaisesRegexp(UnknownLocation, 'foo', self.debugger.resolve, 'foo')
+        self.assertRaises(UnknownLocation, self.debugger.resolve, '0x10000')
+
+    def test_describe(self):
+        self.assertEqual(self.debugger.describe(0x0), "0x0000")
+        self.assertEqual(self.debugger.describe(0x1), "0x0001 (loop)")
+        self.assertEqual(self.debugger.describe(0x3), "0x0003 (loop+2)")
+
+    def test_describe_with_source_map(self):
+        source_map = SourceMap()
+        source_map.add_line(0x0, '/examples/loop.dasm16', 1)
+        source_map.add_line(0x1, '/examples/loop.dasm16', 2)
+        source_map.size = 0x3
+
+        debugger = Debugger(self.cpu, SYMBOLS, source_map=source_map)
+        self.assertEqual(debugger.describe(0x2), "0x0002 (loop+1) at loop.dasm16:2")
+        self.assertEqual(debugger.describe(0x3), "0x0003 (loop+2)")
+
+    def test_breakpoints(self):
+        self.debugger.add_breakpoint('loop')
+
+        self.assertEqual(self.debugger.cont(), StopReason.BREAKPOINT)
+        self.assertEqual(self.cpu.PC, 0x1)
+        self.assertEqual(self.cpu.registers[0x06], 10)
+
+        self.assertEqual(self.debugger.cont(), StopReason.BREAKPOINT)
+        self.assertEqual(self.cpu.registers[0x06], 9)
+
+        self.debugger.remove_breakpoint('loop')
+        self.assertEqual(self.debugger.cont(), StopReason.STOPPED)
+        self.assertEqual(self.cpu.registers[0x06], 0)
+
+    def test_watchpoints(self):
+        self.debugger.add_watchpoint('0x2005')
+        self.assertTrue(isinstance(self.cpu.RAM, WatchedRAM))
+
+        self.assertEqual(self.debugger.cont(), StopReason.WATCHPOINT)
+        self.assertEqual(self.debugger.watch_hits, [(0x2005, 5, True)])
+        self.assertEqual(self.cpu.registers[0x06], 5)
+
+        self.debugger.add_watchpoint('0x2003', on_read=True, on_write=False)
+        self.debugger.remove_watchpoint('0x2005')
+        self.assertEqual(self.debugger.cont(), StopReason.STOPPED)
+
+        self.debugger.remove_watchpoint('0x2003')
+        self.assertEqual(type(self.cpu.RAM), RAM)
+
+    def test_step(self):
+        self.assertEqual(self.debugger.step(2), StopReason.STEPPED)
+        self.assertEqual(self.cpu.PC, 0x3)
+
+        self.assertRaises(DebuggerError, self.debugger.step_back)
+
+    def test_step_back(self):
+        debugger = Debugger(self.cpu, SYMBOLS, History(self.cpu))
+        debugger.step(3)
+        debugger.step_back(2)
+
+        self.assertEqual(self.cpu.PC, 0x1)
+        self.assertEqual(self.cpu.RAM[0x200a], 0)
+
+    def test_read_memory(self):
+        self.assertEqual(self.debugger.read_memory('0x0', 3), LOOP_PROGRAM[:3])
+        self.assertEqual(len(self.debugger.read_memory('0xffff', 8)), 1)
+
+    def test_shell(self):
+        output = StringIO()
+        shell = DebuggerShell(self.debugger, stdout=output)
+
+        for line in ['break loop', 'continue', 'memory 0x0 2', 'watch foo']:
+            shell.onecmd(line)
+
+        self.assertEqual(output.getvalue().splitlines(), [
+            "Breakpoint set at 0x0001 (loop)",
+            "Breakpoint",
+            "PC: 0x0001 (loop)",
+            "0000: a861 1961",
+            "Unrecognized address or label: foo",
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
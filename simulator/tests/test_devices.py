@@ -0,0 +1,71 @@
+import unittest
+from simulator.dcpu import DCPU
+from simulator.devices import EventQueue, run_with_devices
+
+# :loop ADD A, 0x1 / SET PC, loop
+LOOP_PROGRAM = [0x8402, 0x81c1]
+
+class Recorder(object):
+    '''
+    A device that records the cycle counts it was updated at, asking to
+    be updated again every interval cycles
+    '''
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.updates = []
+
+    def update(self, cpu):
+        self.updates.append(cpu.cycles_ran)
+
+        return cpu.cycles_ran + self.interval if self.interval else None
+
+class TestDevices(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.cpu.load_program(LOOP_PROGRAM)
+
+    def test_batches(self):
+        device = Recorder()
+
+        self.assertEqual(run_with_devices(self.cpu, [device], max_instructions=10, batch=4), 10)
+
+        # Before running and after each batch, a round of the loop taking 5 cycles
+        self.assertEqual(device.updates, [0, 10, 20, 25])
+        self.assertEqual(self.cpu.instructions_ran, 10)
+
+    def test_due(self):
+        devices = [Recorder(), Recorder(interval=6)]
+
+        run_with_devices(self.cpu, devices, max_instructions=10, batch=100)
+
+        # The first instruction to end at or after each due cycle ends the batch
+        self.assertEqual(devices[1].updates, [0, 8, 15, 23, 25])
+        self.assertEqual(devices[0].updates, devices[1].updates)
+
+    def test_event_queue(self):
+        events = EventQueue()
+        calls = []
+
+        events.schedule(20, calls.append, 'late')
+        events.schedule(10, calls.append, 'first')
+        events.schedule(10, calls.append, 'second')
+
+        self.assertEqual(events.next_cycle(), 10)
+
+        events.run_due(15)
+        self.assertEqual(calls, ['first', 'second'])
+        self.assertEqual((len(events), events.next_cycle()), (1, 20))
+
+        events.run_due(20)
+        self.assertEqual(calls[-1], 'late')
+        self.assertEqual(events.next_cycle(), None)
+
+    def test_stop(self):
+        self.cpu.load_program([0x8401])
+
+        self.assertEqual(run_with_devices(self.cpu, [Recorder()]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
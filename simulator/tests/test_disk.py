@@ -0,0 +1,211 @@
+import unittest
+import os
+import shutil
+import tempfile
+from array import array
+from simulator.dcpu import DCPU
+from simulator.devices import run_with_devices
+from simulator.threaded import ThreadedEngine, ThreadedRAM
+from simulator.disk import (Disk, DiskRAM, DiskRegisters, DiskCommands, DiskStatus, InvalidDisk,
+                            DISK_ADDRESS, SECTOR_WORDS, SECTOR_BYTES)
+from simulator.image import write_image
+from assembler import assembler
+
+# Adds up the first word of every sector into X, reading 4 sectors at a time into 0x1000
+SUM_PROGRAM = [
+    'SET Z, [0x9207]',
+    ':next SET [0x9203], I',
+    'SET [0x9204], 0x1000',
+    'SET [0x9205], 0x4',
+    'SET [0x9200], 0x1',
+    ':wait IFN [0x9200], 0x0',
+    'SET PC, wait',
+    'IFE [0x9201], 0x1',
+    'SET PC, wait',
+    'ADD X, [0x1000]',
+    'ADD X, [0x1200]',
+    'ADD X, [0x1400]',
+    'ADD X, [0x1600]',
+    'ADD I, 0x4',
+    'IFG Z, I',
+    'SET PC, next',
+]
+
+# Reads sector 2 and only polls STATUS before using it
+POLL_PROGRAM = [
+    'SET [0x9203], 0x2',
+    'SET [0x9204], 0x1000',
+    'SET [0x9205], 0x1',
+    'SET [0x9200], 0x1',
+    ':wait IFE [0x9201], 0x1',
+    'SET PC, wait',
+    'SET A, [0x1000]',
+    'SET B, [0x1001]',
+]
+
+def register(name):
+    return DISK_ADDRESS + getattr(DiskRegisters, name)
+
+class TestDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'disk')
+
+        # Sector n starts with n + 1, the rest is 0xbeef, then half a sector left over
+        words = array('H', [0xbeef]) * (SECTOR_WORDS * 8 + SECTOR_WORDS / 2)
+        for sector in xrange(8):
+            words[sector * SECTOR_WORDS] = sector + 1
+
+        f = open(self.path, 'wb')
+        write_image(words, f)
+        f.close()
+
+        self.disk = Disk(self.path, seek_cycles=100, sector_cycles=10)
+
+        self.cpu = DCPU()
+        self.cpu.load_words(array('H', [0x0]))
+
+    def tearDown(self):
+        self.disk.close()
+        shutil.rmtree(self.directory)
+
+    def command(self, command, sector, address, count):
+        ram = self.cpu.RAM
+
+        ram[register('SECTOR_HIGH')] = sector >> 16
+        ram[register('SECTOR_LOW')] = sector & 0xffff
+        ram[register('ADDRESS')] = address
+        ram[register('COUNT')] = count
+        ram[register('COMMAND')] = command
+
+    def test_registers(self):
+        self.assertEqual(self.disk.sectors, 8)
+        self.assertEqual(self.disk.update(self.cpu), None)
+
+        self.assertEqual(self.cpu.RAM[register('STATUS')], DiskStatus.READY)
+        self.assertEqual(self.cpu.RAM[register('SECTORS_HIGH')], 0)
+        self.assertEqual(self.cpu.RAM[register('SECTORS_LOW')], 8)
+
+    def test_read(self):
+        ram = self.cpu.RAM
+        self.command(DiskCommands.READ, 2, 0x1000, 2)
+
+        # Started, due after the seek and two sectors
+        self.assertEqual(self.disk.update(self.cpu), 120)
+        self.assertEqual(ram[register('COMMAND')], 0x0)
+        self.assertEqual(ram[register('STATUS')], DiskStatus.BUSY)
+
+        self.cpu.cycles_ran = 119
+        self.disk.update(self.cpu)
+        self.assertEqual(ram[0x1000], 0x0)
+
+        self.cpu.cycles_ran = 120
+        self.assertEqual(self.disk.update(self.cpu), None)
+
+        self.assertEqual(ram[register('STATUS')], DiskStatus.READY)
+        self.assertEqual((ram[0x1000], ram[0x1001], ram[0x1000 + SECTOR_WORDS]), (3, 0xbeef, 4))
+        self.assertEqual(ram[0x1000 + 2 * SECTOR_WORDS], 0x0)
+        self.assertEqual(self.disk.reads, 2)
+
+    def test_write(self):
+        ram = self.cpu.RAM
+        ram[0x2000] = 0x1234
+        ram[0x2001 + SECTOR_WORDS] = 0x5678
+
+        self.command(DiskCommands.WRITE, 6, 0x2000, 2)
+        self.cpu.cycles_ran = self.disk.update(self.cpu)
+        self.disk.update(self.cpu)
+        self.disk.close()
+
+        f = open(self.path, 'rb')
+        f.seek(6 * SECTOR_BYTES)
+        data = f.read(2 * SECTOR_BYTES + 2)
+        f.close()
+
+        self.assertEqual(data[:4], '\x12\x34\x00\x00')
+        self.assertEqual(data[SECTOR_BYTES + 2:SECTOR_BYTES + 4], '\x56\x78')
+        self.assertEqual(data[-2:], '\xbe\xef')
+
+        self.disk = Disk(self.path)
+
+    def test_queued_command(self):
+        self.command(DiskCommands.READ, 0, 0x1000, 1)
+        self.disk.update(self.cpu)
+        self.command(DiskCommands.READ, 1, 0x3000, 1)
+
+        # The second command waits for the first to be done
+        self.cpu.cycles_ran = 50
+        self.assertEqual(self.disk.update(self.cpu), 110)
+        self.assertEqual(self.cpu.RAM[register('COMMAND')], DiskCommands.READ)
+
+        self.cpu.cycles_ran = 110
+        self.assertEqual(self.disk.update(self.cpu), 220)
+        self.assertEqual(self.cpu.RAM[0x1000], 1)
+
+    def test_errors(self):
+        for (command, sector, address, count) in [(0x3, 0, 0x1000, 1),
+                                                  (DiskCommands.READ, 0, 0x1000, 0),
+                                                  (DiskCommands.READ, 7, 0x1000, 2),
+                                                  (DiskCommands.READ, 0x10000, 0x1000, 1),
+                                                  (DiskCommands.READ, 0, 0xff00, 1)]:
+            self.command(command, sector, address, count)
+
+            self.assertEqual(self.disk.update(self.cpu), None)
+            self.assertEqual(self.cpu.RAM[register('STATUS')], DiskStatus.ERROR)
+
+        self.assertEqual(self.disk.errors, 5)
+
+        self.command(DiskCommands.READ, 7, 0x1000, 1)
+        self.disk.update(self.cpu)
+        self.assertEqual(self.cpu.RAM[register('STATUS')], DiskStatus.BUSY)
+
+    def test_read_only(self):
+        disk = Disk(self.path, read_only=True)
+
+        self.command(DiskCommands.WRITE, 0, 0x1000, 1)
+        disk.update(self.cpu)
+        self.assertEqual(self.cpu.RAM[register('STATUS')], DiskStatus.ERROR)
+
+        disk.close()
+
+    def test_run(self):
+        self.cpu.load_words(assembler.assemble_binary(SUM_PROGRAM))
+
+        run_with_devices(self.cpu, [self.disk])
+
+        self.assertEqual(self.cpu.registers[0x3], sum(xrange(1, 9)))
+        self.assertEqual(self.disk.reads, 8)
+
+    def test_busy_once_written(self):
+        DiskRAM.convert(self.cpu.RAM, self.disk)
+        self.disk.update(self.cpu)
+
+        self.cpu.RAM[register('COMMAND')] = DiskCommands.READ
+        self.assertEqual(self.cpu.RAM[register('STATUS')], DiskStatus.BUSY)
+
+        DiskRAM.revert(self.cpu.RAM)
+        self.assertEqual(type(self.cpu.RAM), type(DCPU().RAM))
+
+    def test_poll_status(self):
+        for threaded in (False, True):
+            cpu = DCPU()
+            cpu.load_words(assembler.assemble_binary(POLL_PROGRAM))
+            execute = ThreadedEngine(cpu).execute_next_instruction if threaded else None
+            DiskRAM.convert(cpu.RAM, self.disk)
+
+            run_with_devices(cpu, [self.disk], execute=execute)
+
+            self.assertEqual((cpu.registers[0x0], cpu.registers[0x1]), (3, 0xbeef))
+            self.assertEqual(isinstance(cpu.RAM, ThreadedRAM), threaded)
+
+    def test_invalid(self):
+        path = os.path.join(self.directory, 'small')
+        f = open(path, 'wb')
+        f.write('\x00' * (SECTOR_BYTES - 2))
+        f.close()
+
+        self.assertRaises(InvalidDisk, Disk, path)
+
+if __name__ == '__main__':
+    unittest.main()
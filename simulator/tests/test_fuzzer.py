@@ -0,0 +1,82 @@
+import unittest
+from simulator.dcpu import DCPU
+from simulator.fuzzer import Fuzzer, fuzz
+
+# SET A, [0x1000] / IFE A, 0x10 / SET PC, crash / SET PC, 0xffff
+# :crash SET B, [0x1001] / SET C, [0xf000+B] / SET PC, 0xffff
+CRASH_PROGRAM = [0x7801, 0x1000, 0xc00c, 0x7dc1, 0x7, 0x7dc1, 0xffff,
+                 0x7811, 0x1001, 0x4421, 0xf000, 0x7dc1, 0xffff]
+
+# :loop ADD [0x1000], 1 / SET PC, loop
+LOOP_PROGRAM = [0x85e2, 0x1000, 0x7dc1, 0x0]
+
+class TestFuzzer(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.cpu.load_words(CRASH_PROGRAM)
+
+    def test_execute_restores(self):
+        fuzzer = Fuzzer(self.cpu, [(0x1000, 2)], [0x0])
+        registers = dict(self.cpu.registers)
+        ram = dict(self.cpu.RAM)
+
+        (edges, crash) = fuzzer.execute([0x5, 0x10, 0x0])
+
+        self.assertEqual(crash, None)
+        self.assertEqual(len(edges), 6)
+        self.assertEqual(dict(self.cpu.registers), registers)
+        self.assertEqual(dict(self.cpu.RAM), ram)
+        self.assertEqual(self.cpu.cycles_ran, 0)
+        self.assertEqual(fuzzer.log, [])
+
+    def test_execute_crash(self):
+        fuzzer = Fuzzer(self.cpu, [(0x1000, 2)])
+
+        (edges, crash) = fuzzer.execute([0x10, 0x1000])
+
+        self.assertEqual(crash.error, 'InvalidMemoryAccess')
+        self.assertEqual(crash.pc, 0x9)
+        self.assertEqual(crash.values, [0x10, 0x1000])
+        self.assertEqual(dict(self.cpu.RAM), dict((address, word) for (address, word) in enumerate(CRASH_PROGRAM)))
+
+    def test_max_cycles(self):
+        self.cpu.load_words(LOOP_PROGRAM)
+        fuzzer = Fuzzer(self.cpu, [(0x1000, 1)], max_cycles=100)
+
+        (edges, crash) = fuzzer.execute([0x0])
+
+        self.assertEqual(crash, None)
+        self.assertEqual(fuzzer.timeouts, 1)
+        self.assertEqual(self.cpu.RAM[0x1000], 0x0)
+
+    def test_run(self):
+        fuzzer = Fuzzer(self.cpu, [(0x1000, 2)], seed=1)
+        fuzzer.run(500)
+
+        self.assertEqual(fuzzer.executions, 501)
+        self.assertEqual(fuzzer.crashes.keys(), [('InvalidMemoryAccess', 0x9)])
+
+        # The input that first took the IFE is kept for the inputs after it
+        self.assertTrue(any(values[0] == 0x10 for values in fuzzer.corpus))
+
+    def test_mutate(self):
+        fuzzer = Fuzzer(self.cpu, [(0x1000, 4)])
+        values = [0x0, 0x1, 0x2, 0x3]
+
+        mutated = fuzzer.mutate(values)
+
+        self.assertEqual(values, [0x0, 0x1, 0x2, 0x3])
+        self.assertNotEqual(mutated, values)
+        self.assertTrue(all(0x0 <= value <= 0xffff for value in mutated))
+
+    def test_fuzz(self):
+        (corpus, coverage, crashes, executions, timeouts) = fuzz(CRASH_PROGRAM, [(0x1000, 2)], iterations=400,
+                                                                 jobs=2, rounds=2, seed=1)
+
+        self.assertEqual(crashes.keys(), [('InvalidMemoryAccess', 0x9)])
+        self.assertTrue(executions >= 400)
+        self.assertEqual(timeouts, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+from StringIO import StringIO
+from simulator.dcpu import DCPU
+from simulator.heatmap import Heatmap, HEATMAP_MAX_VALUE
+from simulator.memory import RAM
+from assembler import assembler
+
+PROGRAM = [
+    'SET A, 0x3',
+    ':loop JSR store',
+    'SUB A, 0x1',
+    'IFN A, 0x0',
+    'SET PC, loop',
+    'DAT 0x0',
+    ':store SET [0x1000+A], A',
+    'SET PC, POP',
+]
+
+class TestHeatmap(unittest.TestCase):
+
+    def setUp(self):
+        (words, self.source_map) = assembler.assemble_with_source_map(PROGRAM, 'store.dasm16')
+
+        self.cpu = DCPU()
+        self.cpu.load_words(words)
+
+        self.heatmap = Heatmap(window=4)
+
+    def test_run(self):
+        self.assertEqual(self.heatmap.run(self.cpu), 18)
+        self.assertEqual(self.cpu.RAM.__class__, RAM)
+
+        self.assertEqual(list(self.heatmap.writes[0x1000:0x1005]), [0, 1, 1, 1, 0])
+        self.assertEqual((self.heatmap.reads[0xfffe], self.heatmap.writes[0xfffe]), (3, 3))
+
+        # Instructions and their next words are fetched, not read
+        self.assertEqual(list(self.heatmap.fetches[:0x3]), [1, 3, 3])
+        self.assertEqual(sum(self.heatmap.reads[:0x10]), 0)
+
+    def test_max_instructions(self):
+        self.assertEqual(self.heatmap.run(self.cpu, max_instructions=2), 2)
+        self.assertEqual(sum(self.heatmap.writes), 1)
+
+    def test_halt_loop(self):
+        self.cpu.load_words(assembler.assemble_binary(['SET [0x1000], 0x1', ':crash SET PC, crash']))
+
+        self.assertEqual(self.heatmap.run(self.cpu), 2)
+        self.assertEqual(list(self.heatmap.fetches[0x2:0x4]), [1, 1])
+
+    def test_working_sets(self):
+        self.heatmap.run(self.cpu)
+
+        # SET A, JSR with its next word and the stack, then SET [0x1000+A] and POP
+        self.assertEqual(self.heatmap.working_sets[:2], [8, 7])
+        self.assertEqual(len(self.heatmap.working_sets), 5)
+
+    def test_stack_depth(self):
+        self.heatmap.run(self.cpu)
+
+        self.assertEqual(self.heatmap.lowest_sp, 0xfffe)
+        self.assertEqual(self.heatmap.stack_depth, 1)
+
+    def test_hot_regions(self):
+        self.heatmap.run(self.cpu)
+
+        self.assertEqual(self.heatmap.get_hot_regions(), [
+            (0x0, 0xb, 0, 0, 28),
+            (0xfffe, 0xffff, 3, 3, 0),
+            (0x1001, 0x1004, 0, 3, 0),
+        ])
+        self.assertEqual(self.heatmap.get_hot_regions(1), [(0x0, 0xb, 0, 0, 28)])
+
+    def test_page_totals(self):
+        self.heatmap.run(self.cpu)
+
+        self.assertEqual(self.heatmap.get_page_totals(), [
+            (0x0, 0, 0, 28, 11),
+            (0x1000, 0, 3, 0, 3),
+            (0xff00, 3, 3, 0, 1),
+        ])
+
+    def test_label_totals(self):
+        self.heatmap.run(self.cpu)
+
+        # The first SET comes before any label, the rest isn't part of the program
+        self.assertEqual(self.heatmap.get_label_totals(self.source_map), {
+            'loop': (0, 0, 18),
+            'store': (0, 0, 9),
+            None: (3, 6, 1),
+        })
+
+    def test_save_heatmap(self):
+        self.heatmap.run(self.cpu)
+
+        f = StringIO()
+        self.heatmap.save_heatmap(f)
+        data = f.getvalue()
+
+        header = "P5\n256 256\n255\n"
+        self.assertTrue(data.startswith(header))
+
+        pixels = data[len(header):]
+        self.assertEqual(len(pixels), 0x10000)
+        self.assertEqual(ord(pixels[0xfffe]), HEATMAP_MAX_VALUE)
+        self.assertEqual(ord(pixels[0x0]), 1)
+        self.assertEqual(ord(pixels[0x2000]), 0)
+
+if __name__ == '__main__':
+    unittest.main()
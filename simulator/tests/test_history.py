@@ -0,0 +1,76 @@
+import unittest
+from simulator.dcpu import DCPU
+from simulator.history import History, HistoryUnavailable
+
+# SET I, 10 / :loop SET [0x2000+I], I / SUB I, 1 / IFN I, 0 / SET PC, loop
+LOOP_PROGRAM = [0xa861, 0x1961, 0x2000, 0x8463, 0x806d, 0x7dc1, 0x0001]
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.cpu.load_program(LOOP_PROGRAM)
+
+    def get_state(self):
+        return (self.cpu.cycles_ran, dict(self.cpu.registers), dict(self.cpu.RAM))
+
+    def record_states(self, history):
+        states = [self.get_state()]
+
+        while history.step():
+            states.append(self.get_state())
+
+        states.append(self.get_state())
+        return states
+
+    def test_step_back_within_segment(self):
+        history = History(self.cpu)
+        states = self.record_states(history)
+
+        for n in [1, 5, 20]:
+            history.step_back(n)
+            self.assertEqual(self.get_state(), states[history.position])
+
+        history.step_back(history.position)
+        self.assertEqual(self.get_state(), states[0])
+
+    def test_step_back_across_snapshots(self):
+        history = History(self.cpu, snapshot_interval=4)
+        states = self.record_states(history)
+
+        self.assertTrue(len(history.segments) > 1)
+
+        history.step_back(history.position - 6)
+        self.assertEqual(history.position, 6)
+        self.assertEqual(self.get_state(), states[6])
+
+        # Execution can resume from the restored state
+        self.assertEqual(self.record_states(history)[-1], states[-1])
+
+    def test_run_back_to(self):
+        history = History(self.cpu, snapshot_interval=3)
+        states = self.record_states(history)
+
+        history.run_back_to(0x1)
+        self.assertEqual(self.cpu.PC, 0x1)
+        self.assertEqual(self.cpu.registers[0x06], 1)
+        self.assertEqual(self.get_state(), states[history.position])
+
+        self.assertRaises(HistoryUnavailable, history.run_back_to, 0x100)
+
+    def test_budget(self):
+        history = History(self.cpu, snapshot_interval=2, budget=40)
+        self.record_states(history)
+
+        self.assertTrue(history.earliest > 0)
+        self.assertRaises(HistoryUnavailable, history.step_back, history.position)
+
+    def test_detach(self):
+        history = History(self.cpu)
+        history.detach()
+
+        self.cpu.execute_next_instruction()
+        self.assertEqual(history.segments[-1].log, [])
+
+if __name__ == '__main__':
+    unittest.main()
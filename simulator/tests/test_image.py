@@ -0,0 +1,57 @@
+import unittest
+import os
+import tempfile
+from StringIO import StringIO
+from array import array
+from simulator.image import map_image, read_image, write_image, to_big_endian, InvalidImage
+
+class TestImage(unittest.TestCase):
+
+    def setUp(self):
+        (handle, self.path) = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write_file(self, path, contents):
+        f = open(path, 'wb')
+        f.write(contents)
+        f.close()
+
+    def test_read_binary_image(self):
+        self.write_file(self.path, '\x7c\x01\x00\x30')
+        self.assertEqual(list(read_image(self.path)), [0x7c01, 0x0030])
+
+    def test_read_machine_code(self):
+        path = self.path + '.dcpu'
+        self.write_file(path, '0x7c01\n0030\n\n0x0\n')
+
+        try:
+            self.assertEqual(list(read_image(path)), [0x7c01, 0x0030, 0x0])
+        finally:
+            os.remove(path)
+
+    def test_map_image(self):
+        self.write_file(self.path, '\x7c\x01\x00\x30')
+        self.assertEqual(map_image(self.path), array('H', [0x7c01, 0x0030]))
+
+        self.write_file(self.path, '')
+        self.assertEqual(map_image(self.path), array('H'))
+
+        self.write_file(self.path, '\x7c\x01\x00')
+        self.assertRaises(InvalidImage, map_image, self.path)
+
+    def test_write_image(self):
+        output = StringIO()
+        write_image([0x7c01, 0x0030], output)
+
+        self.assertEqual(output.getvalue(), '\x7c\x01\x00\x30')
+
+    def test_to_big_endian(self):
+        words = array('H', [0x1234])
+        self.assertEqual(to_big_endian(to_big_endian(words)), words)
+        self.assertEqual(to_big_endian(words).tostring(), '\x12\x34')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import os
+import shutil
+import tempfile
+from simulator.dcpu import DCPU
+from simulator.devices import run_with_devices
+from simulator.keyboard import Keyboard, KeyboardReader, get_keys, load_key_script, InvalidKeyScript, KEYBOARD_ADDRESS
+from assembler import assembler
+
+# Copies keys to 0x1000 on until a new line, taking them in turn from the ring
+ECHO_PROGRAM = [
+    'SET J, 0x1000',
+    ':wait IFE [0x9000+I], 0x0',
+    'SET PC, wait',
+    'SET A, [0x9000+I]',
+    'SET [0x9000+I], 0x0',
+    'ADD I, 0x1',
+    'AND I, 0xf',
+    'SET [J], A',
+    'ADD J, 0x1',
+    'IFN A, 0xa',
+    'SET PC, wait',
+]
+
+class TestKeyboard(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.cpu.load_words(assembler.assemble_binary(ECHO_PROGRAM))
+
+    def get_buffer(self, length=0x10):
+        return [self.cpu.RAM[KEYBOARD_ADDRESS + offset] for offset in xrange(length)]
+
+    def test_type(self):
+        keyboard = Keyboard()
+        keyboard.type(get_keys('ab'))
+
+        self.assertEqual(self.get_buffer(3), [0x0, 0x0, 0x0])
+        self.assertEqual(keyboard.update(self.cpu), None)
+        self.assertEqual(self.get_buffer(3), [0x61, 0x62, 0x0])
+
+    def test_full_buffer(self):
+        keyboard = Keyboard()
+        keyboard.type(range(1, 0x12))
+        keyboard.update(self.cpu)
+
+        self.assertEqual(self.get_buffer(), range(1, 0x11))
+        self.assertEqual(keyboard.typed, 0x10)
+
+        # Freeing the first slot lets the key held back in
+        self.cpu.RAM[KEYBOARD_ADDRESS] = 0x0
+        keyboard.update(self.cpu)
+
+        self.assertEqual(self.get_buffer(1), [0x11])
+
+    def test_run(self):
+        keyboard = Keyboard()
+        keyboard.type(get_keys('hello\n'))
+
+        run_with_devices(self.cpu, [keyboard])
+
+        self.assertEqual([self.cpu.RAM[0x1000 + offset] for offset in xrange(6)], get_keys('hello\n'))
+        self.assertEqual(self.get_buffer(), [0x0] * 0x10)
+
+    def test_script(self):
+        keyboard = Keyboard([(500, get_keys('b\n')), (0, get_keys('a'))])
+
+        self.assertEqual(keyboard.update(self.cpu), 500)
+        self.assertEqual(self.get_buffer(2), [0x61, 0x0])
+
+        run_with_devices(self.cpu, [keyboard])
+
+        self.assertEqual([self.cpu.RAM[0x1000 + offset] for offset in xrange(3)], get_keys('ab\n'))
+        self.assertTrue(self.cpu.cycles_ran >= 500)
+
+        # The same script gives the same run
+        cycles_ran = self.cpu.cycles_ran
+        self.cpu.load_words(self.cpu.RAM.image)
+        run_with_devices(self.cpu, [Keyboard([(0, get_keys('a')), (500, get_keys('b\n'))])])
+
+        self.assertEqual(self.cpu.cycles_ran, cycles_ran)
+
+    def test_reader(self):
+        keyboard = Keyboard()
+        (read_end, write_end) = os.pipe()
+
+        reader = KeyboardReader(keyboard, os.fdopen(read_end)).start()
+        os.write(write_end, 'hi\r\n')
+        os.close(write_end)
+        reader.thread.join(1)
+        reader.f.close()
+
+        run_with_devices(self.cpu, [keyboard])
+
+        self.assertEqual([self.cpu.RAM[0x1000 + offset] for offset in xrange(3)], get_keys('hi\n'))
+
+class TestKeyScript(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'keys')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_script(self, text):
+        f = open(self.path, 'w')
+        f.write(text)
+        f.close()
+
+    def test_load(self):
+        self.write_script('# typed at start up\n0 hello world\\n\n\n0x100 \\x01\n')
+
+        self.assertEqual(load_key_script(self.path), [
+            (0, get_keys('hello world\n')),
+            (0x100, [0x1]),
+        ])
+
+    def test_invalid(self):
+        self.write_script('0 fine\nsoon typed\n')
+
+        self.assertRaises(InvalidKeyScript, load_key_script, self.path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from simulator.memory import Memory,RAM, InvalidMemoryAccess, InvalidMemoryValue
+from simulator.memory import Memory,RAM, WatchedRAM, InvalidMemoryAccess, InvalidMemoryValue
 
 class TestRAM(unittest.TestCase):
 
@@ -44,6 +44,78 @@ class TestRAM(unittest.TestCase):
         self.assertEqual(ram.get_memory_dump(), expected_dump)
         self.assertEqual(str(ram), "\n".join(expected_dump))
 
+    def test_write_log(self):
+        memory = Memory(16)
+        memory[0x1] = 0xaa
+
+        memory.write_log = []
+        memory[0x1] = 0xbb
+        memory[0x2] = 0xcc
+
+        self.assertEqual(memory.write_log, [(memory, 0x1, 0xaa), (memory, 0x2, None)])
+
+    def test_reset_dirty_pages(self):
+        ram = RAM(16, 0xffff)
+        image = [0x1, 0x2, 0x3]
+
+        ram.load_words(image)
+        self.assertEqual(ram.dirty_pages, set())
+
+        ram[0x1] = 0x7
+        ram[0x1000] = 0x8
+        self.assertEqual(ram.dirty_pages, set([0x0, 0x10]))
+
+        ram.reset()
+
+        self.assertEqual(dict(ram), {0x0: 0x1, 0x1: 0x2, 0x2: 0x3})
+        self.assertEqual(ram.dirty_pages, set())
+
+        # Without an image reset clears everything
+        ram.clear()
+        ram[0x1] = 0x7
+        ram.reset()
+
+        self.assertEqual(dict(ram), {})
+        self.assertEqual(ram.image, None)
+
+    def test_write_words(self):
+        ram = RAM(16, 0xffff)
+        ram.load_words([0x1])
+        ram.write_log = []
+
+        ram.write_words(0xff, [0x2, 0x3])
+
+        self.assertEqual(list(ram.read_words(0xfe, 4)), [0x0, 0x2, 0x3, 0x0])
+        self.assertEqual(ram.dirty_pages, set([0x0, 0x1]))
+        self.assertEqual(ram.write_log, [(ram, 0xff, None), (ram, 0x100, None)])
+
+        self.assertRaises(InvalidMemoryAccess, ram.write_words, 0xffff, [0x1, 0x2])
+        self.assertRaises(InvalidMemoryAccess, ram.read_words, 0xffff, 2)
+
+        ram.reset()
+        self.assertEqual(dict(ram), {0x0: 0x1})
+
+    def test_watched_ram(self):
+        ram = RAM(16, 0xffff)
+        ram[0x1000] = 0x1
+
+        watched = WatchedRAM.convert(ram)
+        self.assertTrue(watched is ram)
+        self.assertEqual(ram[0x1000], 0x1)
+
+        ram.watch(0x1000, on_read=True, on_write=True)
+        ram[0x1001] = 0x2
+        ram[0x1000] = 0x3
+        ram[0x1000]
+
+        self.assertEqual(ram.hits, [(0x1000, 0x3, True), (0x1000, 0x3, False)])
+
+        ram.write_words(0xfff, [0x4, 0x5])
+        self.assertEqual(ram.hits[-1], (0x1000, 0x5, True))
+
+        WatchedRAM.revert(ram)
+        self.assertEqual(type(ram), RAM)
+        self.assertEqual(ram[0x1001], 0x2)
 
 
 if __name__ == '__main__':
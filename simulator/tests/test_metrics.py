@@ -0,0 +1,64 @@
+import unittest
+import os
+import shutil
+import tempfile
+from simulator.dcpu import DCPU
+from simulator.metrics import format_openmetrics, MetricsFile
+
+class Cache(object):
+    def __init__(self, hits, misses, invalidations):
+        self.hits = hits
+        self.misses = misses
+        self.invalidations = invalidations
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        # SET I, 2 / :loop SUB I, 1 / IFN I, 0 / SET PC, loop
+        self.cpu = DCPU()
+        self.cpu.load_words([0x8861, 0x8463, 0x806d, 0x7dc1, 0x0001])
+        self.cpu.run()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_format(self):
+        text = format_openmetrics(self.cpu.get_stats())
+        lines = text.splitlines()
+
+        self.assertTrue('# TYPE dcpu_instructions counter' in lines)
+        self.assertTrue('dcpu_instructions_total 6' in lines)
+        self.assertTrue('dcpu_cycles_total %d' % self.cpu.cycles_ran in lines)
+        self.assertTrue('dcpu_memory_words_changed 0' in lines)
+        self.assertFalse('cache' in text)
+        self.assertEqual(lines[-1], '# EOF')
+
+    def test_caches(self):
+        self.cpu.caches['decode'] = Cache(10, 2, 1)
+
+        lines = format_openmetrics(self.cpu.get_stats()).splitlines()
+
+        self.assertTrue('dcpu_cache_hits_total{cache="decode"} 10' in lines)
+        self.assertTrue('dcpu_cache_misses_total{cache="decode"} 2' in lines)
+        self.assertTrue('dcpu_cache_invalidations_total{cache="decode"} 1' in lines)
+
+    def test_metrics_file(self):
+        path = os.path.join(self.directory, 'dcpu.prom')
+        metrics = MetricsFile(path, interval=60)
+
+        metrics.update(self.cpu)
+        self.assertTrue('dcpu_instructions_total 6\n' in open(path).read())
+
+        # Not rewritten until the interval has passed
+        self.cpu.instructions_ran = 7
+        metrics.update(self.cpu)
+        self.assertTrue('dcpu_instructions_total 6\n' in open(path).read())
+
+        metrics.write(self.cpu)
+        self.assertTrue('dcpu_instructions_total 7\n' in open(path).read())
+        self.assertEqual(os.listdir(self.directory), ['dcpu.prom'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from simulator.dcpu import DCPU
+from simulator.profiler import Profiler
+from simulator.sourcemap import SourceMap
+
+# SET I, 2 / :loop SUB I, 1 / IFN I, 0 / SET PC, loop
+LOOP_PROGRAM = [0x8861, 0x8463, 0x806d, 0x7dc1, 0x0001]
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.cpu.load_program(LOOP_PROGRAM)
+        self.profiler = Profiler()
+
+    def test_run(self):
+        self.assertEqual(self.profiler.run(self.cpu), 6)
+
+        self.assertEqual(list(self.profiler.executions[:5]), [1, 2, 2, 1, 0])
+
+        # The IFN costs an extra cycle when it skips
+        self.assertEqual(list(self.profiler.cycles[:5]), [2, 6, 7, 3, 0])
+        self.assertEqual(sum(self.profiler.cycles), self.cpu.cycles_ran - 1)
+
+    def test_max_instructions(self):
+        self.assertEqual(self.profiler.run(self.cpu, max_instructions=2), 2)
+        self.assertEqual(sum(self.profiler.executions), 2)
+
+    def test_halt_loop(self):
+        # SET A, 1 / :crash SET PC, crash
+        self.cpu.load_program([0x8401, 0x7dc1, 0x0001])
+
+        self.assertEqual(self.profiler.run(self.cpu), 2)
+        self.assertEqual(list(self.profiler.executions[:2]), [1, 1])
+
+    def test_interrupted(self):
+        execute = self.cpu.execute_next_instruction
+
+        def interrupt_third():
+            if self.cpu.cycles_ran >= 4:
+                raise KeyboardInterrupt()
+
+            return execute()
+
+        self.cpu.execute_next_instruction = interrupt_third
+
+        self.assertRaises(KeyboardInterrupt, self.profiler.run, self.cpu)
+        self.assertEqual(self.cpu.instructions_ran, 2)
+        self.assertEqual(list(self.profiler.executions[:3]), [1, 1, 0])
+
+    def test_hot_spots(self):
+        self.profiler.run(self.cpu)
+
+        # Lines 1, 3, 4 and 5 hold SET I, SUB I, IFN I and SET PC
+        source_map = SourceMap()
+        for (address, line) in [(0x0, 1), (0x1, 3), (0x2, 4), (0x3, 5)]:
+            source_map.add_line(address, 'loop.dasm16', line)
+        source_map.size = 0x5
+        source_map.set_labels({'loop': 0x1})
+
+        self.assertEqual(self.profiler.get_hot_spots(source_map), [
+            (7, 2, 'loop.dasm16', 4),
+            (6, 2, 'loop.dasm16', 3),
+            (3, 1, 'loop.dasm16', 5),
+            (2, 1, 'loop.dasm16', 1),
+        ])
+        self.assertEqual(self.profiler.get_hot_spots(source_map, 1), [(7, 2, 'loop.dasm16', 4)])
+
+        self.assertEqual(self.profiler.get_label_totals(source_map), {None: 2, 'loop': 16})
+
+if __name__ == '__main__':
+    unittest.main()
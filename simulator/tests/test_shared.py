@@ -0,0 +1,122 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from array import array
+from simulator.dcpu import DCPU
+from simulator.memory import RAM
+from simulator.shared import SharedMemory, SharedRAM, Publisher, InvalidSharedMemory, StaleSharedState
+
+# SET I, 2 / :loop SUB I, 1 / IFN I, 0 / SET PC, loop
+LOOP_PROGRAM = [0x8861, 0x8463, 0x806d, 0x7dc1, 0x0001]
+
+READ_STATE = '''
+import sys
+from simulator.shared import SharedMemory
+shared = SharedMemory(sys.argv[1])
+(registers, cycles_ran) = shared.read_state()
+print registers[0x6], registers[0x1c], cycles_ran, shared.words[0x1000]
+shared.close()
+'''
+
+class TestShared(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dcpu')
+
+        self.shared = SharedMemory(self.path, create=True)
+        self.cpu = DCPU()
+        SharedRAM.convert(self.cpu.RAM, self.shared)
+
+    def tearDown(self):
+        self.shared.close()
+        shutil.rmtree(self.directory)
+
+    def test_writes_are_shared(self):
+        self.cpu.RAM[0x8000] = 0x1f
+        self.cpu.RAM[0x8001] = 0x10000 + 0x2
+
+        self.assertEqual(self.shared.words[0x8000], 0x1f)
+        self.assertEqual(self.shared.words[0x8001], 0x2)
+
+        self.cpu.reset()
+        self.assertEqual(self.shared.words[0x8000], 0x0)
+
+    def test_load_words(self):
+        self.cpu.load_words(array('H', LOOP_PROGRAM))
+
+        self.assertEqual(list(self.shared.words[:len(LOOP_PROGRAM) + 1]), LOOP_PROGRAM + [0x0])
+
+    def test_reset_restores_pages(self):
+        self.cpu.load_words(array('H', LOOP_PROGRAM))
+        self.cpu.RAM[0x1] = 0x0
+        self.cpu.RAM[0x8000] = 0x5
+
+        self.cpu.reset()
+
+        self.assertEqual(self.shared.words[0x1], LOOP_PROGRAM[1])
+        self.assertEqual(self.shared.words[0x8000], 0x0)
+
+    def test_write_words(self):
+        self.cpu.RAM.write_words(0x8000, [0x1, 0x2])
+
+        self.assertEqual(list(self.shared.words[0x8000:0x8003]), [0x1, 0x2, 0x0])
+
+    def test_convert(self):
+        ram = RAM(16, 0xffff)
+        ram[0x10] = 0x5
+
+        SharedRAM.convert(ram, self.shared)
+        self.assertEqual(self.shared.words[0x10], 0x5)
+
+        SharedRAM.revert(ram)
+        ram[0x10] = 0x6
+        self.assertEqual(self.shared.words[0x10], 0x5)
+
+    def test_publisher(self):
+        self.cpu.load_words(array('H', LOOP_PROGRAM))
+
+        publisher = Publisher(self.shared)
+        self.assertEqual(publisher.run(self.cpu), 6)
+
+        # Before and after the run, the jump back to the loop and the IFN skipping
+        self.assertEqual(publisher.publishes, 4)
+
+        (registers, cycles_ran) = self.shared.read_state()
+        self.assertEqual(registers[0x1c], self.cpu.PC)
+        self.assertEqual(registers[0x1b], 0xffff)
+        self.assertEqual(cycles_ran, self.cpu.cycles_ran)
+        self.assertEqual(self.shared.header.sequence % 2, 0)
+
+    def test_other_process(self):
+        self.cpu.load_words(array('H', LOOP_PROGRAM))
+        self.cpu.RAM[0x1000] = 0xbeef
+        Publisher(self.shared).run(self.cpu)
+
+        environment = dict(os.environ, PYTHONPATH=os.getcwd())
+        output = subprocess.check_output([sys.executable, '-c', READ_STATE, self.path], env=environment)
+
+        self.assertEqual(output.split(), ['0', '6', str(self.cpu.cycles_ran), str(0xbeef)])
+
+    def test_half_published(self):
+        # As left by a publisher that died while publishing
+        self.shared.header.sequence += 1
+
+        self.assertRaises(StaleSharedState, self.shared.read_state, 0.01)
+
+        self.shared.header.sequence += 1
+        self.assertEqual(self.shared.read_state()[1], 0)
+
+    def test_invalid(self):
+        path = os.path.join(self.directory, 'other')
+        f = open(path, 'w')
+        f.write('not shared memory')
+        f.close()
+
+        self.assertRaises(InvalidSharedMemory, SharedMemory, path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import tempfile
+from array import array
+from simulator.sourcemap import SourceMap, InvalidSourceMap
+
+def get_source_map():
+    # SET I, 2 on line 1, :loop SUB I, 1 on line 3, a two word SET PC, loop on line 4
+    source_map = SourceMap()
+    source_map.add_line(0x0, 'loop.dasm16', 1)
+    source_map.add_line(0x1, 'loop.dasm16', 3)
+    source_map.add_line(0x2, 'loop.dasm16', 4)
+    source_map.size = 0x4
+    source_map.set_labels({'loop': 0x1})
+
+    return source_map
+
+class TestSourceMap(unittest.TestCase):
+
+    def setUp(self):
+        self.source_map = get_source_map()
+
+    def test_lookup(self):
+        self.assertEqual(self.source_map.lookup(0x0), ('loop.dasm16', 1))
+        self.assertEqual(self.source_map.lookup(0x2), ('loop.dasm16', 4))
+        self.assertEqual(self.source_map.lookup(0x3), ('loop.dasm16', 4))
+        self.assertEqual(self.source_map.lookup(0x4), None)
+
+    def test_get_label(self):
+        self.assertEqual(self.source_map.get_label(0x0), None)
+        self.assertEqual(self.source_map.get_label(0x1), ('loop', 0))
+        self.assertEqual(self.source_map.get_label(0x3), ('loop', 2))
+        self.assertEqual(self.source_map.get_symbols(), {'loop': 0x1})
+
+    def test_describe(self):
+        self.assertEqual(self.source_map.describe(0x0), "loop.dasm16:1")
+        self.assertEqual(self.source_map.describe(0x3), "loop.dasm16:4 (loop+2)")
+        self.assertEqual(self.source_map.describe(0x10), "0x0010 (loop+15)")
+
+    def test_total_by_line(self):
+        counts = array('L', [1, 3, 2, 0, 7])
+
+        self.assertEqual(self.source_map.total_by_line(counts), {
+            ('loop.dasm16', 1): 1,
+            ('loop.dasm16', 3): 3,
+            ('loop.dasm16', 4): 2,
+        })
+
+    def test_get_line_addresses(self):
+        self.assertEqual(self.source_map.get_line_addresses('loop.dasm16', 5), [0x0, None, 0x1, 0x2, None])
+        self.assertEqual(self.source_map.get_line_addresses('other.dasm16', 2), [None, None])
+
+    def test_save_and_load(self):
+        (handle, path) = tempfile.mkstemp()
+        os.close(handle)
+
+        try:
+            self.source_map.save(path)
+            loaded = SourceMap.load(path)
+
+            self.assertEqual(loaded.size, 0x4)
+            self.assertEqual(loaded.get_symbols(), {'loop': 0x1})
+            self.assertEqual([loaded.lookup(address) for address in range(5)],
+                             [self.source_map.lookup(address) for address in range(5)])
+
+            f = open(path, 'w')
+            f.write('not json')
+            f.close()
+
+            self.assertRaises(InvalidSourceMap, SourceMap.load, path)
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+import random
+from array import array
+from simulator.dcpu import DCPU, OpCodeNotImplemented
+from simulator.memory import InvalidMemoryAccess, InvalidMemoryValue
+from simulator.threaded import ThreadedEngine
+
+# examples/basic.dasm16, ending in :crash SET PC, crash
+BASIC_PROGRAM = [0x7c01, 0x0030, 0x7de1, 0x1000, 0x0020, 0x7803, 0x1000, 0xc00d,
+                 0x7dc1, 0x001a, 0xa861, 0x7c01, 0x2000, 0x2161, 0x2000, 0x8463,
+                 0x806d, 0x7dc1, 0x000d, 0x9031, 0x7c10, 0x0018, 0x7dc1, 0x001a,
+                 0x9037, 0x61c1, 0x7dc1, 0x001a]
+
+def get_state(cpu):
+    return (dict((key, value) for (key, value) in dict(cpu.registers).iteritems() if value),
+            dict((key, value) for (key, value) in dict(cpu.RAM).iteritems() if value),
+            cpu.cycles_ran)
+
+def run(step, count):
+    '''
+    Returns how the run ended and after how many instructions
+    '''
+
+    try:
+        for executed in xrange(count):
+            if not step():
+                return ('stop', executed)
+    except (OpCodeNotImplemented, InvalidMemoryAccess, InvalidMemoryValue), error:
+        return (error.__class__.__name__, executed)
+
+    return ('max', count)
+
+class TestThreadedEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.cpu = DCPU()
+        self.engine = ThreadedEngine(self.cpu)
+
+    def assert_same_as_interpreter(self, words, count, step=None):
+        interpreter = DCPU()
+        interpreter.load_words(array('H', words))
+        self.cpu.load_words(array('H', words))
+
+        self.assertEqual(run(step or self.engine.execute_next_instruction, count),
+                         run(interpreter.execute_next_instruction, count))
+        self.assertEqual(get_state(self.cpu), get_state(interpreter))
+
+    def test_basic_program(self):
+        self.assert_same_as_interpreter(BASIC_PROGRAM, 200)
+        self.assertEqual(self.cpu.registers[0x3], 0x40)
+
+    def test_run(self):
+        self.cpu.load_words(array('H', BASIC_PROGRAM))
+        self.assertEqual(self.engine.run(40), 40)
+
+        # On to :crash SET PC, crash
+        self.assertEqual(self.engine.run(100), 11)
+        self.assertTrue(self.engine.halted)
+
+        # SET A, 0x1 then STOP
+        self.cpu.load_words(array('H', [0x8401]))
+        self.assertEqual(self.engine.run(), 1)
+        self.assertEqual(self.cpu.PC, 0x2)
+        self.assertEqual(self.cpu.cycles_ran, 3)
+
+    def test_random_programs(self):
+        generator = random.Random(0x10c)
+
+        for _ in xrange(300):
+            words = [generator.choice([generator.randint(0x0, 0xffff), generator.randint(0x0, 0x3ff),
+                                       generator.randint(0x0, 0xffff) & 0xfc0f | 0x1c0, 0x61c1])
+                     for _ in xrange(generator.randint(1, 30))]
+
+            self.assert_same_as_interpreter(words, generator.randint(1, 200))
+
+    def test_mixed_with_interpreter(self):
+        steps = [self.engine.execute_next_instruction, self.cpu.execute_next_instruction]
+        generator = random.Random(0)
+
+        self.assert_same_as_interpreter(BASIC_PROGRAM, 200, lambda: generator.choice(steps)())
+
+    def test_self_modifying_code(self):
+        # SET [0x3], 0x8411 / SET A, 0x1 -> SET B, 0x1 once rewritten, twice
+        # through a loop: SET PC, 0x0
+        words = [0x7de1, 0x0004, 0x8811, 0x8401, 0x81c1]
+
+        self.assert_same_as_interpreter(words, 6)
+        self.assertEqual(self.cpu.registers[0x0], 0x1)
+        self.assertEqual(self.cpu.registers[0x1], 0x2)
+        self.assertTrue(self.engine.invalidations > 0)
+
+    def test_block_write(self):
+        # SET A, 0x1 rewritten in one go as SET B, 0x1 before running again
+        self.cpu.load_words(array('H', [0x8401]))
+        self.engine.run()
+
+        self.cpu.RAM.write_words(0x0, [0x8411])
+        self.cpu.PC = 0x0
+        self.engine.run()
+
+        self.assertEqual(self.cpu.registers[0x1], 0x1)
+
+    def test_stats_slices(self):
+        slices = []
+
+        self.cpu.load_words(array('H', BASIC_PROGRAM))
+        self.cpu.STATS_SLICE = 0x10
+
+        self.assertEqual(self.engine.run(0x2a, lambda cpu: slices.append(cpu.instructions_ran)), 0x2a)
+        self.assertEqual(slices, [0x10, 0x20])
+        self.assertEqual(self.cpu.instructions_ran, 0x2a)
+
+        # SET A, 0x1 then STOP, the STOP isn't counted
+        self.cpu.load_words(array('H', [0x8401] * 0x10))
+        self.engine.run(on_slice=lambda cpu: slices.append(cpu.instructions_ran))
+
+        self.assertEqual(slices, [0x10, 0x20, 0x10])
+        self.assertEqual(self.cpu.instructions_ran, 0x10)
+
+    def test_halt_loop(self):
+        # SET A, 0x1 / :crash SET PC, crash, then the same with a short literal
+        for words in ([0x8401, 0x7dc1, 0x0001], [0x8401, 0x85c1]):
+            self.cpu.load_words(array('H', words))
+
+            self.assertEqual(self.engine.run(), 2)
+            self.assertTrue(self.engine.halted)
+            self.assertEqual((self.cpu.PC, self.cpu.instructions_ran), (0x1, 2))
+
+        # Stepping carries on like the interpreter
+        self.assert_same_as_interpreter([0x8401, 0x7dc1, 0x0001], 10)
+
+    def test_run_to_register(self):
+        # SET A, 0x1 / SET PC, A only halts the run if A holds its address
+        self.cpu.load_words(array('H', [0x8401, 0x01c1]))
+        self.assertEqual(self.engine.run(5), 5)
+        self.assertFalse(self.engine.halted)
+
+    def test_cache_counters(self):
+        self.cpu.load_words(array('H', BASIC_PROGRAM))
+        self.assertEqual(self.engine.run(1000), 51)
+
+        stats = self.cpu.get_stats()['caches']['threaded']
+
+        self.assertEqual(stats['hits'] + stats['misses'], 51)
+        self.assertEqual(stats['misses'], 16)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from simulator.utilities import bitmask, to_int
+from simulator.utilities import bitmask, bitwise_or, to_int
 
 class TestUtilities(unittest.TestCase):
 
@@ -17,5 +17,8 @@ class TestUtilities(unittest.TestCase):
     def test_bitmask(self):
         self.assertEqual(bitmask(16), 0xffff)
 
+    def test_bitwise_or(self):
+        self.assertEqual(bitwise_or(bytearray('\x00\x0f\x01'), bytearray('\x00\xf0\x01')), bytearray('\x00\xff\x01'))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,502 @@
+import operator
+import time
+
+import specifications as specs
+
+from dcpu import parse_instruction, get_word_length, BASIC_OP_CYCLES, NON_BASIC_OP_CYCLES, OpCodeNotImplemented
+from memory import RAM
+from utilities import bitmask
+
+MAX_VAL = bitmask(specs.WORD_SIZE)
+RAM_WORDS = specs.MAX_RAM_ADDRESS + 1
+
+PC_CODE = specs.SPECIAL_REGISTER_NAMES['PC']
+SP_CODE = specs.SPECIAL_REGISTER_NAMES['SP']
+O_CODE = specs.SPECIAL_REGISTER_NAMES['O']
+
+REGISTER_CODES = frozenset(specs.REGISTERS.keys() + specs.SPECIAL_REGISTERS.keys())
+
+CONDITIONS = {
+    specs.BasicOperations.IFE: operator.eq,
+    specs.BasicOperations.IFN: operator.ne,
+    specs.BasicOperations.IFG: operator.gt,
+    specs.BasicOperations.IFB: operator.and_,
+}
+
+BOOLEAN_OPERATORS = {
+    specs.BasicOperations.AND: operator.and_,
+    specs.BasicOperations.BOR: operator.or_,
+    specs.BasicOperations.XOR: operator.xor,
+}
+
+class ThreadedEngine(object):
+    '''
+    Runs the program in a DCPU's RAM through a handler per address instead
+    of decoding every instruction as it's executed
+
+    A handler is a closure specialized on the operation and the addressing
+    modes of the instruction at its address, with its next words, length
+    and cycles worked out once, so running is only
+
+        pc = handlers[pc](pc)
+
+    Handlers are decoded the first time their address is executed, and
+    writes to RAM put back the decoder for the addresses whose instruction
+    they may have changed. Registers and RAM are the DCPU's own, so
+    stepping with the engine and with DCPU.execute_next_instruction can be
+    mixed freely, with the same results.
+
+    An instruction that sets PC to a literal holding its own address, like
+    :crash SET PC, crash, would run forever without changing anything, so
+    run stops there and sets halted
+
+    The engine also counts as the DCPU's 'threaded' cache: misses are
+    decodes and hits the executions of an already decoded handler
+    '''
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.handlers = [self.decode_and_execute] * RAM_WORDS
+
+        self.executions = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.halted = False
+
+        ThreadedRAM.convert(cpu.RAM, self)
+        cpu.caches['threaded'] = self
+
+    @property
+    def hits(self):
+        return self.executions - self.misses
+
+    def invalidate(self, address):
+        '''
+        Drops the handlers of the instructions a write to address can
+        change: the one at address and those whose next words it may hold
+        '''
+
+        handlers = self.handlers
+        decode_and_execute = self.decode_and_execute
+
+        handlers[address] = decode_and_execute
+        handlers[(address - 1) & MAX_VAL] = decode_and_execute
+        handlers[(address - 2) & MAX_VAL] = decode_and_execute
+
+        self.invalidations += 1
+
+    def invalidate_range(self, start, end):
+        handlers = self.handlers
+        decode_and_execute = self.decode_and_execute
+
+        for address in xrange(start - 2, end):
+            handlers[address & MAX_VAL] = decode_and_execute
+
+        self.invalidations += 1
+
+    def invalidate_all(self):
+        self.handlers[:] = [self.decode_and_execute] * RAM_WORDS
+        self.invalidations += 1
+
+    def decode_and_execute(self, pc):
+        handler = self.handlers[pc] = self.decode(pc)
+        self.misses += 1
+
+        return handler(pc)
+
+    def execute_next_instruction(self):
+        '''
+        Executes the instruction at PC, returning False if it was
+        STOP_INSTRUCTION as DCPU.execute_next_instruction does
+        '''
+
+        pc = dict.get(self.cpu.registers, PC_CODE, 0)
+        self.executions += 1
+
+        if self.handlers[pc](pc) is not None:
+            return True
+
+        # Stepping goes on through a jump to itself, as the interpreter does
+        halted = self.halted
+        self.halted = False
+
+        return halted
+
+    def run(self, max_instructions=None, on_slice=None):
+        '''
+        Executes the program until it stops, reaches an instruction that
+        jumps to itself or max_instructions have been executed. Returns the
+        number of instructions executed
+
+        As with DCPU.run, the run counters are updated and on_slice(cpu)
+        called every STATS_SLICE instructions
+        '''
+
+        cpu = self.cpu
+        handlers = self.handlers
+        stats_slice = cpu.STATS_SLICE
+
+        pc = dict.get(cpu.registers, PC_CODE, 0)
+        count = 0
+        sliced = 0
+        start = time.time()
+        self.halted = False
+
+        try:
+            while pc is not None and (max_instructions is None or count < max_instructions):
+                end = count + stats_slice
+
+                if max_instructions is not None:
+                    end = min(end, max_instructions)
+
+                while pc is not None and count < end:
+                    pc = handlers[pc](pc)
+                    count += 1
+
+                if pc is not None and count - sliced == stats_slice:
+                    start = cpu.add_stats(stats_slice, start)
+                    sliced = count
+
+                    if on_slice is not None:
+                        on_slice(cpu)
+        finally:
+            stopped = pc is None and not self.halted
+            self.executions += count
+            cpu.add_stats(count - stopped - sliced, start)
+
+        return count - stopped
+
+    def decode(self, pc):
+        '''
+        Returns the handler for the instruction at pc
+        '''
+
+        cpu = self.cpu
+        ram = cpu.RAM
+        registers = cpu.registers
+        set_register = registers.__setitem__
+
+        word = dict.get(ram, pc, 0x0)
+        next_pc = (pc + 1) & MAX_VAL
+
+        if word == specs.STOP_INSTRUCTION:
+            def stop(pc):
+                cpu.cycles_ran += 1
+                set_register(PC_CODE, next_pc)
+
+                return None
+
+            return stop
+
+        (op_code, a, b) = parse_instruction(word)
+        is_basic = b is not None
+
+        if op_code not in (BASIC_OP_CYCLES if is_basic else NON_BASIC_OP_CYCLES):
+            def not_implemented(pc):
+                cpu.cycles_ran += 1
+                set_register(PC_CODE, next_pc)
+
+                raise OpCodeNotImplemented(op_code)
+
+            return not_implemented
+
+        # Operands fetch their next words in order, a first
+        address = next_pc
+        (resolve_a, constant_a, read_a, write_a, address) = self.decode_operand(a, address)
+
+        if is_basic:
+            (resolve_b, constant_b, read_b, write_b, address) = self.decode_operand(b, address)
+            cycles = ((address - pc) & MAX_VAL) + BASIC_OP_CYCLES[op_code]
+        else:
+            (resolve_b, constant_b, read_b, write_b) = (None, None, None, None)
+            cycles = ((address - pc) & MAX_VAL) + NON_BASIC_OP_CYCLES[op_code]
+
+        next_pc = address
+
+        if is_basic and op_code == specs.BasicOperations.SET and a == PC_CODE \
+                and (b == 0x1f or b >= 0x20) and read_b(None) == pc:
+            def halt(pc):
+                cpu.cycles_ran += cycles
+                self.halted = True
+
+                return None
+
+            return halt
+
+        execute = self.decode_operation(op_code, is_basic, read_a, write_a, read_b, write_b, next_pc)
+
+        # The next PC is only known when running if the operation can write it
+        if a == PC_CODE or not is_basic:
+            get = registers.get
+            operation = execute
+
+            def execute(x, y):
+                operation(x, y)
+
+                return get(PC_CODE, 0)
+
+        if resolve_a is None and resolve_b is None:
+            def handler(pc):
+                cpu.cycles_ran += cycles
+                set_register(PC_CODE, next_pc)
+
+                return execute(constant_a, constant_b)
+        elif resolve_b is None:
+            def handler(pc):
+                cpu.cycles_ran += cycles
+                set_register(PC_CODE, next_pc)
+
+                return execute(resolve_a(), constant_b)
+        elif resolve_a is None:
+            def handler(pc):
+                cpu.cycles_ran += cycles
+                set_register(PC_CODE, next_pc)
+
+                return execute(constant_a, resolve_b())
+        else:
+            def handler(pc):
+                cpu.cycles_ran += cycles
+                set_register(PC_CODE, next_pc)
+
+                return execute(resolve_a(), resolve_b())
+
+        return handler
+
+    def decode_operand(self, value_code, address):
+        '''
+        Returns (resolve, constant, read, write, address) for an operand
+        whose next word, if it has one, is at address
+
+        resolve() carries out the operand's side effects and returns what
+        read(x) and write(x, value) take as x, or is None when x is always
+        constant. address is returned moved past the operand's next word
+        '''
+
+        cpu = self.cpu
+        ram = cpu.RAM
+        registers = cpu.registers
+        get = registers.get
+        set_register = registers.__setitem__
+
+        def read_ram(x):
+            return ram[x]
+
+        def write_ram(x, value):
+            ram[x] = value
+
+        if value_code in REGISTER_CODES:
+            def read_register(x):
+                return get(value_code, 0)
+
+            def write_register(x, value):
+                set_register(value_code, value)
+
+            return (None, None, read_register, write_register, address)
+
+        if value_code in specs.GET_WORD_VALUE_CODES:
+            next_word = dict.get(ram, address, 0x0)
+            address = (address + 1) & MAX_VAL
+
+        # [register]
+        if value_code <= 0x0f:
+            register = value_code - 0x08
+            resolve = lambda: get(register, 0)
+
+        # [next word + register]
+        elif value_code <= 0x17:
+            register = value_code - 0x10
+            resolve = lambda: get(register, 0) + next_word
+
+        # POP
+        elif value_code == 0x18:
+            def resolve():
+                sp = get(SP_CODE, 0)
+                set_register(SP_CODE, sp + 1)
+
+                return sp
+
+        # PEEK
+        elif value_code == 0x19:
+            resolve = lambda: get(SP_CODE, 0)
+
+        # PUSH
+        elif value_code == 0x1a:
+            def resolve():
+                set_register(SP_CODE, get(SP_CODE, 0) - 1)
+
+                return get(SP_CODE, 0)
+
+        # [next word]
+        elif value_code == 0x1e:
+            return (None, next_word, read_ram, write_ram, address)
+
+        # Literals, writes to them fail silently
+        else:
+            value = next_word if value_code == 0x1f else value_code - 0x20
+
+            return (None, None, lambda x: value, lambda x, v: None, address)
+
+        return (resolve, None, read_ram, write_ram, address)
+
+    def decode_operation(self, op_code, is_basic, read_a, write_a, read_b, write_b, next_pc):
+        '''
+        Returns execute(x, y) carrying out the operation on resolved operands,
+        as the matching DCPU method does, and returning the next PC
+        '''
+
+        cpu = self.cpu
+        ram = cpu.RAM
+        registers = cpu.registers
+        get = registers.get
+        set_register = registers.__setitem__
+        ops = specs.BasicOperations
+
+        if not is_basic:
+            # JSR
+            def execute(x, y):
+                set_register(SP_CODE, get(SP_CODE, 0) - 1)
+                ram[get(SP_CODE, 0)] = get(PC_CODE, 0)
+                set_register(PC_CODE, read_a(x))
+
+            return execute
+
+        if op_code == ops.SET:
+            def execute(x, y):
+                write_a(x, read_b(y))
+
+                return next_pc
+
+        elif op_code == ops.ADD:
+            def execute(x, y):
+                result = read_a(x) + read_b(y)
+                set_register(O_CODE, 0x0001 if result > MAX_VAL else 0x0)
+                write_a(x, result)
+
+                return next_pc
+
+        elif op_code == ops.SUB:
+            def execute(x, y):
+                a_value = read_a(x)
+                b_value = read_b(y)
+
+                if b_value > a_value:
+                    a_value += MAX_VAL
+                    set_register(O_CODE, 0xffff)
+                else:
+                    set_register(O_CODE, 0x0)
+
+                write_a(x, a_value - b_value)
+
+                return next_pc
+
+        elif op_code == ops.MUL:
+            def execute(x, y):
+                result = read_a(x) * read_b(y)
+                set_register(O_CODE, result >> specs.WORD_SIZE)
+                write_a(x, result)
+
+                return next_pc
+
+        elif op_code == ops.DIV:
+            def execute(x, y):
+                a_value = read_a(x)
+                b_value = read_b(y)
+
+                if b_value == 0:
+                    set_register(O_CODE, 0)
+                    write_a(x, 0)
+                else:
+                    set_register(O_CODE, (a_value << specs.WORD_SIZE) / b_value)
+                    write_a(x, a_value / b_value)
+
+                return next_pc
+
+        elif op_code == ops.MOD:
+            def execute(x, y):
+                b_value = read_b(y)
+
+                if b_value == 0:
+                    write_a(x, 0)
+                else:
+                    write_a(x, read_a(x) % b_value)
+
+                return next_pc
+
+        elif op_code == ops.SHL:
+            def execute(x, y):
+                result = read_a(x) << read_b(y)
+                write_a(x, result)
+                set_register(O_CODE, result >> 16)
+
+                return next_pc
+
+        elif op_code == ops.SHR:
+            def execute(x, y):
+                a_value = read_a(x)
+                b_value = read_b(y)
+
+                write_a(x, a_value >> b_value)
+                set_register(O_CODE, (a_value << 16) >> b_value)
+
+                return next_pc
+
+        elif op_code in BOOLEAN_OPERATORS:
+            boolean_operator = BOOLEAN_OPERATORS[op_code]
+
+            def execute(x, y):
+                write_a(x, boolean_operator(read_a(x), read_b(y)))
+
+                return next_pc
+
+        else:
+            conditional = CONDITIONS[op_code]
+
+            def execute(x, y):
+                if conditional(read_a(x), read_b(y)):
+                    return next_pc
+
+                skipped = (next_pc + get_word_length(ram[next_pc])) & MAX_VAL
+                set_register(PC_CODE, skipped)
+                cpu.cycles_ran += 1
+
+                return skipped
+
+        return execute
+
+class ThreadedRAM(RAM):
+    '''
+    RAM that drops the handlers of a ThreadedEngine its writes may change
+    '''
+
+    @classmethod
+    def convert(cls, ram, engine):
+        ram.__class__ = cls
+        ram.engine = engine
+
+        return ram
+
+    @staticmethod
+    def revert(ram):
+        ram.__class__ = RAM
+
+    def __setitem__(self, key, val):
+        super(ThreadedRAM, self).__setitem__(key, val)
+        self.engine.invalidate(key)
+
+    def clear(self):
+        super(ThreadedRAM, self).clear()
+        self.engine.invalidate_all()
+
+    def load_words(self, words):
+        super(ThreadedRAM, self).load_words(words)
+        self.engine.invalidate_range(0, len(words))
+
+    def write_words(self, address, words):
+        super(ThreadedRAM, self).write_words(address, words)
+        self.engine.invalidate_range(address, address + len(words))
+
+    def restore_page(self, page):
+        super(ThreadedRAM, self).restore_page(page)
+
+        start = page << self.PAGE_BITS
+        self.engine.invalidate_range(start, start + (1 << self.PAGE_BITS))
@@ -1,3 +1,5 @@
+from binascii import hexlify, unhexlify
+
 def bitmask(n):
     '''
     Returns a int with the first n bits set
@@ -25,6 +27,16 @@ def to_int(value, bases_to_try):
 
     return result
 
+def bitwise_or(a, b):
+    '''
+    Returns the bitwise OR of two equally sized bytearrays
+    '''
+
+    size = len(a)
+    value = int(hexlify(a), 16) | int(hexlify(b), 16)
+
+    return bytearray(unhexlify('%0*x' % (2 * size, value)))
+
 def invert(dictionary):
     '''
     Return a dictionary with an inverted mapping